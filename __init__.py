@@ -3,4 +3,22 @@
 #
 
 from . import manson_instrument
+from . import clock
 from . import exceptions
+from . import power_sequencer
+from . import telemetry_logger
+from . import telemetry_ring
+from . import fleet_poller
+from . import fleet_table
+from . import fleet_shards
+from . import mux_client
+from . import mux_daemon
+from . import http_gateway
+from . import port_discovery
+from . import supervised_instrument
+from . import transports
+from . import serial_tuning
+from . import event_engine
+from . import pty_emulator
+from . import load_models
+from . import wire_capture
@@ -0,0 +1,75 @@
+#
+# by TS, Dec 2020
+#
+
+import threading
+import time
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Clocks offer time() (monotonic seconds) and sleep(seconds).
+# VirtualClock makes timing-dependent code (e.g. the wire-timing model of
+# EmulatedInstrumentSerial) run without actually waiting.
+
+class MonotonicClock(object):
+	def time(self):
+		""" Get the current time
+
+		Returns:
+			float: Seconds (see time.monotonic())
+		"""
+		return time.monotonic()
+
+	def sleep(self, seconds):
+		""" Wait
+
+		Parameters:
+			seconds (float): Negative values are treated as 0
+		"""
+		if seconds > 0.0:
+			time.sleep(seconds)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class VirtualClock(object):
+	def __init__(self, startS=0.0):
+		""" Constructor
+
+		Clock that only advances when sleep() or advance() is called.
+
+		Parameters:
+			startS (float): Initial time
+		"""
+		assert isinstance(startS, (int, float)), "startS needs to be int or float"
+		#
+		self._nowS = float(startS)
+		self._lock = threading.Lock()
+
+	def time(self):
+		""" Get the current time
+
+		Returns:
+			float: Seconds
+		"""
+		with self._lock:
+			return self._nowS
+
+	def sleep(self, seconds):
+		""" Advance the time instead of waiting
+
+		Parameters:
+			seconds (float): Negative values are treated as 0
+		"""
+		self.advance(max(0.0, seconds))
+
+	def advance(self, seconds):
+		""" Advance the time
+
+		Parameters:
+			seconds (float)
+		"""
+		assert isinstance(seconds, (int, float)) and seconds >= 0.0, "seconds needs to be >= 0"
+		#
+		with self._lock:
+			self._nowS += seconds
@@ -2,7 +2,12 @@
 # by TS, Dec 2020
 #
 
+import math
+import random
+
 try:
+	from .clock import MonotonicClock
+	from .load_models import solve_operating_point
 	from .mi_commands import *
 	from .exceptions import InvalidModelError, NotConnectedError, UnknownCommandError, UnsupportedModelError
 	from .models import build_spec_dict as models_build_spec_dict, \
@@ -12,6 +17,8 @@ try:
 			MODEL_SUBSERIES_ID_SSP80, MODEL_SUBSERIES_ID_SSP81, MODEL_SUBSERIES_ID_SSP83, MODEL_SUBSERIES_ID_SSP90
 	from .serializer import *
 except (ModuleNotFoundError, ImportError):
+	from clock import MonotonicClock
+	from load_models import solve_operating_point
 	from mi_commands import *
 	from exceptions import InvalidModelError, NotConnectedError, UnknownCommandError, UnsupportedModelError
 	from models import build_spec_dict as models_build_spec_dict, \
@@ -21,39 +28,222 @@ except (ModuleNotFoundError, ImportError):
 			MODEL_SUBSERIES_ID_SSP80, MODEL_SUBSERIES_ID_SSP81, MODEL_SUBSERIES_ID_SSP83, MODEL_SUBSERIES_ID_SSP90
 	from serializer import *
 
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Wire-timing model (see EmulatedInstrumentSerial.set_timing_model()):
+#
+#   byteS        time on the wire per character (8N1 = 10 bits)
+#   turnaroundS  time between receiving the "\r" of a command and sending the reply
+#   cmdDelaysS   additional processing time of specific commands
+#
+# The turnaround times are estimates, the EEPROM write time corresponds to
+# the pause MansonInstrument makes after PROM/SETD on real hardware.
+
+EIS_TIMING_BAUDRATE = 9600
+EIS_TIMING_BITS_PER_BYTE = 10
+
+EIS_TURNAROUND_S = {
+		MODEL_SERIES_ID_HCS: 0.02,
+		MODEL_SERIES_ID_NTP: 0.03,
+		MODEL_SERIES_ID_SSP: 0.02
+	}
+EIS_DEFAULT_TURNAROUND_S = 0.02
+EIS_EEPROM_WRITE_S = 0.8
+
+# time constant of the output's settling (see EmulatedInstrumentSerial.set_load_model())
+EIS_DEFAULT_SETTLING_TAU_S = 0.05
+
+# faults that can be injected into the replies (see EmulatedInstrumentSerial.set_fault_schedule())
+EIS_FAULT_DROP = "drop"  # no reply
+EIS_FAULT_TRUNCATE = "truncate"  # the end of the reply is missing
+EIS_FAULT_CORRUPT = "corrupt"  # one digit of the reply is changed
+EIS_FAULT_EXTRA_CR = "extracr"  # an additional "\r" is inserted into the reply
+EIS_FAULT_DELAY = "delay"  # the reply is sent late
+EIS_FAULT_DISCONNECT = "disconnect"  # the device disappears and comes back later
+
+EIS_FAULTS = [
+		EIS_FAULT_DROP,
+		EIS_FAULT_TRUNCATE,
+		EIS_FAULT_CORRUPT,
+		EIS_FAULT_EXTRA_CR,
+		EIS_FAULT_DELAY,
+		EIS_FAULT_DISCONNECT
+	]
+
+EIS_DEFAULT_FAULT_DELAY_S = 2.0
+EIS_DEFAULT_FAULT_DOWNTIME_S = 1.0
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Compact instances for fleet-scale simulations: the state lives in __slots__,
+# the specs and the Serializer of a model are shared by all of its instances
+# (both are treated as read-only) and the default memory presets are only
+# copied when they are changed.
+
+_EIS_RESP_SUFFIX = b"OK\r"
+
+_EIS_STATE_ATTRS = {
+		"preset_volt": "_stPresetVolt",
+		"preset_curr": "_stPresetCurr",
+		"disp_volt": "_stDispVolt",
+		"disp_curr": "_stDispCurr",
+		"over_volt_prot": "_stOverVoltProt",
+		"over_curr_prot": "_stOverCurrProt",
+		"output_mode": "_stOutputMode",
+		"outp_enabled": "_stOutpEnabled",
+		"active_preset": "_stActivePreset",
+		"active_range": "_stActiveRange"
+	}
+
+# ((volt, curr), ...)
+_EIS_DEFAULT_MEM_PRESETS = ((3.3, 0.2), (5.0, 0.3), (12.0, 0.4))
+
+# {modelId: (specs, Serializer)}
+_EIS_SHARED_MODELS = {}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def build_timing_model(modelId, baudrate=EIS_TIMING_BAUDRATE, turnaroundS=None, cmdDelaysS=None):
+	""" Build a wire-timing model for EmulatedInstrumentSerial.set_timing_model()
+
+	Parameters:
+		modelId (str): Model ID (for the turnaround time)
+		baudrate (int)
+		turnaroundS (float|None): None for the model's turnaround time (see EIS_TURNAROUND_S)
+		cmdDelaysS (dict|None): {cmd: seconds}, None for the EEPROM write time of PROM/SETD
+	Returns:
+		dict: {"byteS": float, "turnaroundS": float, "cmdDelaysS": dict}
+	"""
+	assert isinstance(baudrate, int) and baudrate > 0, "baudrate needs to be int > 0"
+	assert turnaroundS is None or (isinstance(turnaroundS, (int, float)) and turnaroundS >= 0.0), \
+			"turnaroundS needs to be None or >= 0"
+	assert cmdDelaysS is None or isinstance(cmdDelaysS, dict), "cmdDelaysS needs to be None or dict"
+	#
+	if turnaroundS is None:
+		modelSeries = models_get_hw_specs(models_get_hw_model_id(modelId))["modelSeries"]
+		turnaroundS = EIS_TURNAROUND_S.get(modelSeries, EIS_DEFAULT_TURNAROUND_S)
+	if cmdDelaysS is None:
+		cmdDelaysS = {MICMD_PROM: EIS_EEPROM_WRITE_S, MICMD_SETD: EIS_EEPROM_WRITE_S}
+	return {
+			"byteS": EIS_TIMING_BITS_PER_BYTE / float(baudrate),
+			"turnaroundS": float(turnaroundS),
+			"cmdDelaysS": dict(cmdDelaysS)
+		}
+
+def build_fault_schedule(seed, replyCount, faultRates):
+	""" Build a reproducible fault schedule for EmulatedInstrumentSerial.set_fault_schedule()
+
+	Parameters:
+		seed (int): Seed of the random number generator
+		replyCount (int): Amount of replies the schedule covers
+		faultRates (dict): {fault: probability per reply}, fault is one of EIS_FAULTS
+	Returns:
+		dict: {replyIndex: fault}
+	"""
+	assert isinstance(seed, int), "seed needs to be int"
+	assert isinstance(replyCount, int) and replyCount >= 0, "replyCount needs to be int >= 0"
+	assert isinstance(faultRates, dict), "faultRates needs to be dict"
+	for faultId in faultRates:
+		assert faultId in EIS_FAULTS, "invalid fault '%s'" % faultId
+		assert isinstance(faultRates[faultId], (int, float)) and faultRates[faultId] >= 0.0, "fault rates need to be >= 0"
+	assert sum(faultRates.values()) <= 1.0, "sum of fault rates needs to be <= 1"
+	#
+	rngObj = random.Random(seed)
+	resD = {}
+	for replyIx in range(replyCount):
+		tmpR = rngObj.random()
+		# the order of EIS_FAULTS keeps the schedule independent of the order of faultRates
+		for faultId in EIS_FAULTS:
+			tmpR -= faultRates.get(faultId, 0.0)
+			if tmpR < 0.0:
+				resD[replyIx] = faultId
+				break
+	return resD
+
+def _get_shared_model(modelId):
+	""" Get the specs and the Serializer of a model (shared by all instances)
+
+	Parameters:
+		modelId (str|None)
+	Returns:
+		tuple: (dict, Serializer)
+	"""
+	resT = _EIS_SHARED_MODELS.get(modelId)
+	if resT is None:
+		hwSpecs = models_build_spec_dict()
+		if modelId is not None:
+			try:
+				hwSpecs = models_get_hw_specs(models_get_hw_model_id(modelId))
+			except (InvalidModelError, UnsupportedModelError):
+				pass
+		szrObj = Serializer()
+		szrObj.set_hw_specs(hwSpecs)
+		resT = (hwSpecs, szrObj)
+		_EIS_SHARED_MODELS[modelId] = resT
+	return resT
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 
 class EmulatedInstrumentSerial(object):
+	__slots__ = (
+			"timeout", "_isopen", "_bufferIn", "_bufferOut",
+			"_timingModel", "_clockObj", "_pendingOut", "_hostLineFreeT", "_deviceFreeT", "_cmdRxT",
+			"_loadModel", "_loadStartT", "_settlingTauS", "_simT", "_simVolt", "_simCurr", "_simMode", "_protTripped",
+			"_faultSchedule", "_faultRng", "_faultDelayS", "_faultDowntimeS", "_faultLog", "_replyIx", "_downUntilT",
+			"_inpCmdStr", "_inpCargsStr", "_szrObj",
+			"_stPresetVolt", "_stPresetCurr", "_stDispVolt", "_stDispCurr", "_stOverVoltProt", "_stOverCurrProt",
+			"_stOutputMode", "_stOutpEnabled", "_stActivePreset", "_stActiveRange", "_stMemPresets",
+			"_modelSpecs", "_modelSeries", "_modelSubSeries", "_modelHwCmdSupp", "_modelId"
+		)
+
 	def __init__(self, modelId=""):
+		self.timeout = None  # without timing model responses are available immediately
 		self._isopen = True
-		self._bufferIn = None
-		self._bufferOut = None
-		self.flushInput()
-		self.flushOutput()
+		self._bufferIn = bytearray()
+		self._bufferOut = bytearray()
+		#
+		self._timingModel = None
+		self._clockObj = None
+		self._pendingOut = []  # [bytes, time at which the first byte starts], not received yet
+		self._hostLineFreeT = 0.0
+		self._deviceFreeT = 0.0
+		self._cmdRxT = 0.0
+		#
+		self._loadModel = None
+		self._loadStartT = 0.0
+		self._settlingTauS = 0.0
+		self._simT = 0.0
+		self._simVolt = 0.0
+		self._simCurr = 0.0
+		self._simMode = SZR_OUTP_MODE_CV
+		self._protTripped = False
+		#
+		self._faultSchedule = None
+		self._faultRng = None
+		self._faultDelayS = 0.0
+		self._faultDowntimeS = 0.0
+		self._faultLog = None
+		self._replyIx = 0
+		self._downUntilT = None
 		#
 		self._inpCmdStr = None
 		self._inpCargsStr = None
 		#
-		self._szrObj = Serializer()
+		self._szrObj = None
 		#
-		self._states = {
-				"preset_volt": 5.1,
-				"preset_curr": 0.6,
-				"disp_volt": 5.1,
-				"disp_curr": 0.6,
-				"over_volt_prot": 5.0,
-				"over_curr_prot": 1.0,
-				"output_mode": SZR_OUTP_MODE_CV,
-				"outp_enabled": True,
-				"active_preset": 0,
-				"active_range": 0,
-				"mem_presets": [
-						{"volt": 3.3, "curr": 0.2},
-						{"volt": 5.0, "curr": 0.3},
-						{"volt": 12.0, "curr": 0.4},
-					]
-			}
+		self._stPresetVolt = 5.1
+		self._stPresetCurr = 0.6
+		self._stDispVolt = 5.1
+		self._stDispCurr = 0.6
+		self._stOverVoltProt = 5.5  # above the preset, otherwise a load simulation would trip right away
+		self._stOverCurrProt = 1.0
+		self._stOutputMode = SZR_OUTP_MODE_CV
+		self._stOutpEnabled = True
+		self._stActivePreset = 0
+		self._stActiveRange = 0
+		self._stMemPresets = _EIS_DEFAULT_MEM_PRESETS
 		#
 		self._modelSpecs = None
 		self._modelSeries = None
@@ -66,17 +256,10 @@ class EmulatedInstrumentSerial(object):
 
 	def update_model_id(self, modelId):
 		self._modelId = modelId
-		self._modelSpecs = models_build_spec_dict()
-		if modelId is not None:
-			try:
-				modelId = models_get_hw_model_id(modelId)
-				self._modelSpecs = models_get_hw_specs(modelId)
-			except (InvalidModelError, UnsupportedModelError):
-				pass
+		self._modelSpecs, self._szrObj = _get_shared_model(modelId)
 		self._modelSeries = self._modelSpecs["modelSeries"]
 		self._modelSubSeries = self._modelSpecs["modelSubSeries"]
-		self._modelHwCmdSupp = deepcopy(self._modelSpecs["hwCmdSupp"])
-		self._szrObj.set_hw_specs(self._modelSpecs)
+		self._modelHwCmdSupp = self._modelSpecs["hwCmdSupp"]
 		#
 		self._update_state_minmax("preset_volt", "minVolt", "maxVolt")
 		self._update_state_minmax("preset_curr", "minCurr", "maxCurr")
@@ -88,36 +271,401 @@ class EmulatedInstrumentSerial(object):
 			self._update_mempreset_state_minmax(ix, True, "minVolt", "maxVolt")
 			self._update_mempreset_state_minmax(ix, False, "minCurr", "maxCurr")
 
+	def set_timing_model(self, timingModel, clockObj=None):
+		""" Enable/disable the wire-timing model
+
+		With a timing model the replies arrive byte by byte after the commands have
+		been transmitted and processed, and read()/read_until() wait for them
+		(up to self.timeout) using the clock.
+
+		Parameters:
+			timingModel (dict|None): see build_timing_model(), None for immediate replies
+			clockObj (MonotonicClock|VirtualClock|None): None for MonotonicClock
+		"""
+		assert timingModel is None or isinstance(timingModel, dict), "timingModel needs to be None or dict"
+		#
+		self._release_output()
+		self._bufferOut += b"".join([entryT[0] for entryT in self._pendingOut])
+		self._pendingOut.clear()
+		self._timingModel = timingModel
+		self._set_clock(clockObj)
+		nowT = self._clockObj.time()
+		self._hostLineFreeT = nowT
+		self._deviceFreeT = nowT
+
+	def set_load_model(self, loadModel, clockObj=None, settlingTauS=EIS_DEFAULT_SETTLING_TAU_S):
+		""" Enable/disable the simulation of a load
+
+		With a load model the display values (GETD) are computed from the
+		setpoints, the output state and the load (see load_models.py):
+		CV/CC regulation, exponential settling with the time constant settlingTauS
+		and, on models with SOVP/SOCP, tripping of the over-voltage/-current
+		protection (the output is switched off until it is switched on again).
+		On models with SVSH/SISH the setpoints are limited to the upper limits.
+
+		Parameters:
+			loadModel (object|None): e.g. load_models.ResistiveLoad, None for display values == setpoints
+			clockObj (MonotonicClock|VirtualClock|None): None for the clock of the timing model
+					(or MonotonicClock)
+			settlingTauS (float): Time constant of the settling, 0 for immediate changes
+		"""
+		assert loadModel is None or callable(getattr(loadModel, "get_current", None)), "loadModel needs get_current()"
+		assert isinstance(settlingTauS, (int, float)) and settlingTauS >= 0.0, "settlingTauS needs to be >= 0"
+		#
+		self._set_clock(clockObj)
+		self._loadModel = loadModel
+		self._settlingTauS = float(settlingTauS)
+		self._loadStartT = self._clockObj.time()
+		self._simT = self._loadStartT
+		self._simVolt = 0.0
+		self._simCurr = 0.0
+		self._simMode = SZR_OUTP_MODE_CV
+		self._protTripped = False
+		if loadModel is None:
+			self._set_state("disp_volt", self._get_state("preset_volt"))
+			self._set_state("disp_curr", self._get_state("preset_curr"))
+			self._set_state("output_mode", SZR_OUTP_MODE_CV)
+		self._update_load_simulation()
+
+	def get_simulated_output(self):
+		""" Get the simulated output (see set_load_model())
+
+		Returns:
+			dict|None: {"volt": float, "curr": float, "mode": str, "tripped": bool},
+				None without load model
+		"""
+		if self._loadModel is None:
+			return None
+		self._update_load_simulation()
+		return {"volt": self._simVolt, "curr": self._simCurr, "mode": self._simMode, "tripped": self._protTripped}
+
+	def set_fault_schedule(self, faultSchedule, seed=0, delayS=EIS_DEFAULT_FAULT_DELAY_S,
+			downtimeS=EIS_DEFAULT_FAULT_DOWNTIME_S, clockObj=None):
+		""" Enable/disable the injection of faults
+
+		The replies are counted from 0 on and the faults of the schedule
+		are applied to them (see EIS_FAULTS). Where a fault needs random
+		details (e.g. the length of a truncated reply) they are taken from
+		a random number generator with the given seed, so that runs with
+		the same commands are reproducible.
+		While the device has disappeared all reads and writes raise NotConnectedError
+		and the bytes on the wire are lost.
+
+		Parameters:
+			faultSchedule (dict|None): {replyIndex: fault}, see build_fault_schedule(), None for no faults
+			seed (int): Seed for the details of the faults
+			delayS (float): Delay of delayed replies
+			downtimeS (float): Time until a device that has disappeared comes back
+			clockObj (MonotonicClock|VirtualClock|None): None for the clock of the timing model
+					(or MonotonicClock)
+		"""
+		assert faultSchedule is None or isinstance(faultSchedule, dict), "faultSchedule needs to be None or dict"
+		if faultSchedule is not None:
+			for faultId in faultSchedule.values():
+				assert faultId in EIS_FAULTS, "invalid fault '%s'" % faultId
+		assert isinstance(seed, int), "seed needs to be int"
+		assert isinstance(delayS, (int, float)) and delayS >= 0.0, "delayS needs to be >= 0"
+		assert isinstance(downtimeS, (int, float)) and downtimeS >= 0.0, "downtimeS needs to be >= 0"
+		#
+		self._set_clock(clockObj)
+		self._faultSchedule = (dict(faultSchedule) if faultSchedule is not None else None)
+		self._faultRng = random.Random(seed)
+		self._faultDelayS = float(delayS)
+		self._faultDowntimeS = float(downtimeS)
+		self._faultLog = []
+		self._replyIx = 0
+		self._downUntilT = None
+
+	def get_fault_log(self):
+		""" Get the faults that have been injected (see set_fault_schedule())
+
+		Returns:
+			list: [{"reply": int, "fault": str, "time": float}, ...]
+		"""
+		if self._faultLog is None:
+			return []
+		return [dict(entryD) for entryD in self._faultLog]
+
+	def get_pending_count(self):
+		""" Get the amount of reply bytes that are still on the wire (see set_timing_model())
+
+		Returns:
+			int
+		"""
+		return sum([len(entryT[0]) for entryT in self._pendingOut])
+
+	def set_clock(self, clockObj):
+		""" Set the clock of the timing model, the load model and the fault injection
+
+		Pending replies, the simulated load and an injected disconnect continue
+		relative to the new clock's current time.
+		MansonInstrument passes its own clock (see MansonInstrument.set_clock()).
+
+		Parameters:
+			clockObj (MonotonicClock|VirtualClock)
+		"""
+		assert clockObj is not None, "clockObj may not be None"
+		#
+		if self._clockObj is not None:
+			shiftS = clockObj.time() - self._clockObj.time()
+			for entryT in self._pendingOut:
+				entryT[1] += shiftS
+			self._hostLineFreeT += shiftS
+			self._deviceFreeT += shiftS
+			self._cmdRxT += shiftS
+			self._loadStartT += shiftS
+			self._simT += shiftS
+			if self._downUntilT is not None:
+				self._downUntilT += shiftS
+		self._clockObj = clockObj
+
+	def get_clock(self):
+		""" Get the clock of the timing model, the load model and the fault injection
+
+		Returns:
+			MonotonicClock|VirtualClock|None: None if no clock has been set or needed yet
+		"""
+		return self._clockObj
+
 	# --------------------------------------------------------------------------
 
+	@property
+	def in_waiting(self):
+		self._check_present()
+		self._release_output()
+		return len(self._bufferOut)
+
+	# like pySerial's flushInput()/flushOutput() these are named from the
+	# host's point of view: "input" are the responses of the emulated instrument
+
 	def flushInput(self):
-		self._bufferIn = bytes("", encoding="utf-8")
+		# bytes that are still on the wire arrive later
+		self._release_output()
+		self._bufferOut.clear()
 
 	def flushOutput(self):
-		self._bufferOut = bytes("", encoding="utf-8")
+		self._bufferIn.clear()
 
 	def close(self):
 		self._isopen = False
 
 	def write(self, data):
-		if not self._isopen:
-			raise NotConnectedError()
+		""" Send data to the emulated instrument
+
+		Each complete command (terminated by "\r") is processed in the order it
+		has been received, incomplete commands are kept until the rest arrives.
+
+		Returns:
+			int: Amount of bytes written
+		Raises:
+			NotConnectedError, UnknownCommandError
+		"""
+		self._check_connected()
 		if self._modelId is None:
 			raise ValueError("no modelId has been set")
+		if self._timingModel is not None:
+			nowT = self._clockObj.time()
+			self._hostLineFreeT = max(nowT, self._hostLineFreeT) + len(data) * self._timingModel["byteS"]
 		self._bufferIn += data
 		self._handle_input()
+		return len(data)
 
-	def readline(self):
-		if not self._isopen:
-			raise NotConnectedError()
-		resBy = self._bufferOut
-		self.flushOutput()
+	def read(self, size=1):
+		""" Read up to size bytes of the responses
+
+		Like pySerial after a timeout fewer bytes are returned if not enough are available.
+
+		Returns:
+			bytes
+		Raises:
+			NotConnectedError
+		"""
+		self._check_connected()
+		self._wait_for_output(size)
+		resBy = bytes(self._bufferOut[:size])
+		del self._bufferOut[:size]
+		return resBy
+
+	def readline(self, size=None):
+		self._check_connected()
+		resBy = self.read_until(b"\n", size)
 		#print(" -> EIS.rl '%s' -- " % resBy.decode("ascii").replace("\r", "*"))
 		return resBy
 
+	def read_until(self, expected=b"\n", size=None):
+		self._check_connected()
+		if self._pendingOut or self._timingModel is not None:
+			tmpIx = (self._bufferOut + b"".join([entryT[0] for entryT in self._pendingOut])).find(expected)
+			needLen = (None if tmpIx < 0 else tmpIx + len(expected))
+			if size is not None:
+				needLen = (size if needLen is None else min(needLen, size))
+			self._wait_for_output(needLen)
+		tmpIx = self._bufferOut.find(expected)
+		# without the expected bytes everything that is available is returned (like after a timeout)
+		endIx = (len(self._bufferOut) if tmpIx < 0 else tmpIx + len(expected))
+		if size is not None:
+			endIx = min(endIx, size)
+		resBy = bytes(self._bufferOut[:endIx])
+		del self._bufferOut[:endIx]
+		return resBy
+
 	# --------------------------------------------------------------------------
 	# --------------------------------------------------------------------------
 
+	def _check_connected(self):
+		if not self._isopen:
+			raise NotConnectedError()
+		self._check_present()
+
+	def _check_present(self):
+		""" Raise NotConnectedError while the device has disappeared (see set_fault_schedule()) """
+		if self._downUntilT is None:
+			return
+		if self._clockObj.time() < self._downUntilT:
+			raise NotConnectedError()
+		self._downUntilT = None
+
+	def _inject_fault(self, outpBy):
+		""" Apply the scheduled fault to a reply
+
+		Parameters:
+			outpBy (bytes): Complete reply
+		Returns:
+			tuple: (bytes|None, delayS), None if the reply is lost
+		"""
+		replyIx = self._replyIx
+		self._replyIx += 1
+		faultId = (self._faultSchedule.get(replyIx) if self._faultSchedule is not None else None)
+		if faultId is None:
+			return (outpBy, 0.0)
+		delayS = 0.0
+		if faultId == EIS_FAULT_DROP:
+			outpBy = None
+		elif faultId == EIS_FAULT_TRUNCATE:
+			outpBy = outpBy[:self._faultRng.randrange(1, len(outpBy))]
+		elif faultId == EIS_FAULT_CORRUPT:
+			digitIxs = [ix for ix in range(len(outpBy)) if outpBy[ix:ix + 1].isdigit()]
+			if not digitIxs:
+				return (outpBy, 0.0)  # nothing to corrupt
+			tmpIx = self._faultRng.choice(digitIxs)
+			newDigit = self._faultRng.choice([x for x in b"0123456789" if x != outpBy[tmpIx]])
+			outpBy = outpBy[:tmpIx] + bytes([newDigit]) + outpBy[tmpIx + 1:]
+		elif faultId == EIS_FAULT_EXTRA_CR:
+			tmpIx = self._faultRng.randrange(len(outpBy) + 1)
+			outpBy = outpBy[:tmpIx] + b"\r" + outpBy[tmpIx:]
+		elif faultId == EIS_FAULT_DELAY:
+			delayS = self._faultDelayS
+		elif faultId == EIS_FAULT_DISCONNECT:
+			outpBy = None
+			self._bufferIn.clear()
+			self._bufferOut.clear()
+			self._pendingOut.clear()
+			nowT = self._clockObj.time()
+			# the device comes back without anything on the wire
+			self._hostLineFreeT = nowT
+			self._deviceFreeT = nowT
+			self._downUntilT = nowT + self._faultDowntimeS
+		self._faultLog.append({"reply": replyIx, "fault": faultId, "time": self._clockObj.time()})
+		return (outpBy, delayS)
+
+	def _set_clock(self, clockObj):
+		if clockObj is not None:
+			self._clockObj = clockObj
+		elif self._clockObj is None:
+			self._clockObj = MonotonicClock()
+
+	def _update_load_simulation(self):
+		""" Advance the simulated output to the current time """
+		if self._loadModel is None:
+			return
+		nowT = self._clockObj.time()
+		deltaS = max(0.0, nowT - self._simT)
+		self._simT = nowT
+		#
+		voltSet = self._get_state("preset_volt")
+		currSet = self._get_state("preset_curr")
+		if self._modelHwCmdSupp.get(MICMD_SVSH, False):
+			voltSet = min(voltSet, self._get_state("over_volt_prot"))
+			currSet = min(currSet, self._get_state("over_curr_prot"))
+		if self._get_state("outp_enabled"):
+			tgtVolt, tgtCurr, self._simMode = solve_operating_point(voltSet, currSet, self._loadModel, nowT - self._loadStartT)
+		else:
+			tgtVolt, tgtCurr, self._simMode = (0.0, 0.0, SZR_OUTP_MODE_CV)
+		alpha = (1.0 if self._settlingTauS == 0.0 else 1.0 - math.exp(-deltaS / self._settlingTauS))
+		self._simVolt += (tgtVolt - self._simVolt) * alpha
+		self._simCurr += (tgtCurr - self._simCurr) * alpha
+		#
+		if self._modelHwCmdSupp.get(MICMD_SOVP, False) and self._get_state("outp_enabled") and \
+				(self._simVolt > self._get_state("over_volt_prot") or self._simCurr > self._get_state("over_curr_prot")):
+			self._protTripped = True
+			self._set_state("outp_enabled", False)
+			self._simVolt = 0.0
+			self._simCurr = 0.0
+		#
+		self._set_state("disp_volt", self._simVolt)
+		self._set_state("disp_curr", self._simCurr)
+		self._set_state("output_mode", self._simMode)
+
+	def _release_output(self):
+		""" Move the reply bytes that have been received by now to the input buffer """
+		if not self._pendingOut:
+			return
+		byteS = self._get_byte_s()
+		nowT = self._clockObj.time()
+		while self._pendingOut:
+			tmpBy, startT = self._pendingOut[0]
+			if byteS == 0.0:
+				# delayed reply without timing model
+				recvLen = (len(tmpBy) if nowT >= startT else 0)
+			else:
+				# byte n (0-based) is complete at startT + (n + 1) * byteS
+				recvLen = int((nowT - startT) / byteS + 1e-6)
+			if recvLen <= 0:
+				break
+			if recvLen < len(tmpBy):
+				self._bufferOut += tmpBy[:recvLen]
+				self._pendingOut[0] = [tmpBy[recvLen:], startT + recvLen * byteS]
+				break
+			self._bufferOut += tmpBy
+			self._pendingOut.pop(0)
+
+	def _wait_for_output(self, needLen):
+		""" Wait until needLen bytes have been received or until the timeout
+
+		Parameters:
+			needLen (int|None): None for waiting for the timeout
+					(or for all pending bytes if there is no timeout)
+		"""
+		if self._timingModel is None and not self._pendingOut:
+			return
+		self._release_output()
+		if needLen is not None and needLen <= len(self._bufferOut):
+			return
+		nowT = self._clockObj.time()
+		targetT = None
+		pendingIx = (None if needLen is None else needLen - len(self._bufferOut) - 1)
+		for tmpBy, startT in self._pendingOut:
+			if pendingIx is not None and pendingIx < len(tmpBy):
+				targetT = startT + (pendingIx + 1) * self._get_byte_s()
+				break
+			if pendingIx is not None:
+				pendingIx -= len(tmpBy)
+		if targetT is None:
+			if self.timeout is not None:
+				targetT = nowT + self.timeout
+			elif self._pendingOut:
+				tmpBy, startT = self._pendingOut[-1]
+				targetT = startT + len(tmpBy) * self._get_byte_s()
+			else:
+				return
+		if self.timeout is not None:
+			targetT = min(targetT, nowT + self.timeout)
+		self._clockObj.sleep(targetT - nowT)
+		self._release_output()
+
+	def _get_byte_s(self):
+		return (self._timingModel["byteS"] if self._timingModel is not None else 0.0)
+
 	def _update_state_minmax(self, sid, dictKeyMin, dictKeyMax):
 		hwSpecs = self._modelSpecs
 		cval = self._get_state(sid)
@@ -149,39 +697,62 @@ class EmulatedInstrumentSerial(object):
 			self._set_mempreset_state(ix, nvalV, nvalC)
 
 	def _get_state(self, sid):
-		val = self._states[sid]
+		val = getattr(self, _EIS_STATE_ATTRS[sid])
 		#print("  _< EIS:gs(%s=%s) __ " % (sid, str(val)))
 		return val
 
 	def _set_state(self, sid, val):
 		#print("  _> EIS:ss(%s=%s) __ " % (sid, str(val)))
-		self._states[sid] = val
+		setattr(self, _EIS_STATE_ATTRS[sid], val)
 
 	def _get_mempreset_state(self, ix):
-		valD = self._states["mem_presets"][ix]
+		valT = self._stMemPresets[ix]
+		valD = {"volt": valT[0], "curr": valT[1]}
 		#print("  _< EIS:gMPs(%d=%.3f/%.3f) __ " % (ix, valD["volt"], valD["curr"]))
 		return valD
 
 	def _set_mempreset_state(self, ix, valVolt, valCurr):
 		#print("  _> EIS:sMPs(%d=%.3f/%.3f) __ " % (ix, valVolt, valCurr))
-		self._states["mem_presets"][ix]["volt"] = valVolt
-		self._states["mem_presets"][ix]["curr"] = valCurr
+		# copy-on-write, the defaults are shared
+		tmpArr = list(self._stMemPresets)
+		tmpArr[ix] = (valVolt, valCurr)
+		self._stMemPresets = tuple(tmpArr)
 
 	def _handle_input(self):
-		""" Hande input command
+		""" Handle all complete input commands one by one
+
+		Raises:
+			UnknownCommandError
+		"""
+		unknownCmdStr = None
+		while True:
+			tmpIx = self._bufferIn.find(b"\r")
+			if tmpIx < 0:
+				break
+			inpStr = self._bufferIn[:tmpIx].decode("ascii", "replace")
+			del self._bufferIn[:tmpIx + 1]
+			if self._timingModel is not None:
+				# the newest byte has arrived at _hostLineFreeT
+				self._cmdRxT = self._hostLineFreeT - len(self._bufferIn) * self._timingModel["byteS"]
+			try:
+				self._handle_cmd(inpStr)
+			except UnknownCommandError:
+				# the following commands are still processed, like the real hardware would do
+				if unknownCmdStr is None:
+					unknownCmdStr = inpStr[0:4]
+		if unknownCmdStr is not None:
+			raise UnknownCommandError(unknownCmdStr)
+
+	def _handle_cmd(self, inpStr):
+		""" Handle one input command (without the trailing "\r")
 
 		Raises:
 			UnknownCommandError
 		"""
-		inpStr = self._bufferIn.decode("ascii")
-		self.flushInput()
-		if not inpStr.endswith("\r"):
-			return
-		inpStr = inpStr[:-1]
-		if "\r" in inpStr:
-			return
 		cmdStr = inpStr[0:4]
-		if self._modelHwCmdSupp is None or not self._modelHwCmdSupp[cmdStr]:
+		if cmdStr not in self._CMD_HANDLERS:
+			raise UnknownCommandError(cmdStr)
+		if self._modelHwCmdSupp is None or not self._modelHwCmdSupp.get(cmdStr, False):
 			#print(" <- EIS.hi '%s' unsupported -- " % (cmdStr))
 			return
 		#
@@ -189,51 +760,32 @@ class EmulatedInstrumentSerial(object):
 		self._inpCargsStr = inpStr[4:] + SZR_RESP_OK_SUFFIX
 		#print(" <- EIS.hi '%s:%s' -- " % (cmdStr, self._inpCargsStr))
 		#
-		if cmdStr == MICMD_GMOD:
-			self._cmd_gmod()
-		elif cmdStr == MICMD_GVER:
-			self._cmd_gver()
-		elif cmdStr == MICMD_ENDS or cmdStr == MICMD_SESS:
-			self._cmd_ends_or_sess()
-		elif cmdStr == MICMD_VOLT or cmdStr == MICMD_CURR:
-			self._cmd_volt_or_curr()
-		elif cmdStr == MICMD_GETD:
-			self._cmd_getd()
-		elif cmdStr == MICMD_GETS:
-			self._cmd_gets()
-		elif cmdStr == MICMD_GMIN or cmdStr == MICMD_GMAX:
-			self._cmd_gmin_or_gmax()
-		elif cmdStr == MICMD_SOUT:
-			self._cmd_sout()
-		elif cmdStr == MICMD_GOUT:
-			self._cmd_gout()
-		elif cmdStr == MICMD_GETM:
-			self._cmd_getm()
-		elif cmdStr == MICMD_PROM:
-			self._cmd_prom()
-		elif cmdStr == MICMD_GABC:
-			self._cmd_gabc()
-		elif cmdStr == MICMD_RUNM or cmdStr == MICMD_SABC:
-			self._cmd_runm_or_sabc()
-		elif cmdStr == MICMD_SOVP or cmdStr == MICMD_SOCP:
-			self._cmd_sovp_or_socp()
-		elif cmdStr == MICMD_GOVP or cmdStr == MICMD_GOCP:
-			self._cmd_govp_or_gocp()
-		elif cmdStr == MICMD_SVSH or cmdStr == MICMD_SISH:
-			self._cmd_svsh_or_sish()
-		elif cmdStr == MICMD_GVSH or cmdStr == MICMD_GISH:
-			self._cmd_gvsh_or_gish()
-		elif cmdStr == MICMD_SETD:
-			self._cmd_setd()
-		elif cmdStr == MICMD_GCHA:
-			self._cmd_gcha()
-		elif cmdStr == MICMD_SCHA:
-			self._cmd_scha()
-		else:
-			raise UnknownCommandError(cmdStr)
+		self._update_load_simulation()
+		self._CMD_HANDLERS[cmdStr](self)
+		if self._loadModel is not None:
+			# the setpoints might have been changed (the display values follow with the settling)
+			self._update_load_simulation()
 
 	def _append_output(self, outpStr):
-		self._bufferOut += bytes(outpStr + "OK\r", encoding="utf-8")
+		outpBy = outpStr.encode("ascii") + _EIS_RESP_SUFFIX
+		outpBy, delayS = self._inject_fault(outpBy)
+		if outpBy is None:
+			return
+		if self._timingModel is None:
+			if delayS == 0.0 and not self._pendingOut:
+				self._bufferOut += outpBy
+				return
+			startT = self._clockObj.time() + delayS
+			if self._pendingOut:
+				# the replies mustn't overtake a delayed one
+				startT = max(self._pendingOut[-1][1], startT)
+			self._pendingOut.append([outpBy, startT])
+			return
+		# the instrument processes one command at a time
+		startT = max(self._cmdRxT, self._deviceFreeT) + self._timingModel["turnaroundS"] + \
+				self._timingModel["cmdDelaysS"].get(self._inpCmdStr, 0.0) + delayS
+		self._pendingOut.append([outpBy, startT])
+		self._deviceFreeT = startT + len(outpBy) * self._timingModel["byteS"]
 
 	def _cmd_gmod(self):
 		self._szrObj.unserialize_data(self._inpCargsStr, [])
@@ -282,7 +834,8 @@ class EmulatedInstrumentSerial(object):
 		else:
 			return
 		listValueTypes.append(SZR_VTYPE_MODE)
-		outpStr = self._szrObj.serialize_data([valVolt, valCurr, valMode], listValueTypes)
+		outpStr = self._szrObj.serialize_data([valVolt, valCurr, valMode], listValueTypes,
+				checkRange=(self._loadModel is None))
 		self._append_output(outpStr)
 
 	def _cmd_gets(self):
@@ -339,6 +892,8 @@ class EmulatedInstrumentSerial(object):
 		try:
 			valArr = self._szrObj.unserialize_data(self._inpCargsStr, [SZR_VTYPE_STATE])
 			self._set_state("outp_enabled", valArr[0]["val"])
+			if valArr[0]["val"]:
+				self._protTripped = False
 		except InvalidInputDataError:
 			return
 		self._append_output("")
@@ -483,3 +1038,37 @@ class EmulatedInstrumentSerial(object):
 		except InvalidInputDataError:
 			return
 		self._append_output("")
+
+	# --------------------------------------------------------------------------
+
+	# handlers of the commands (pairs of commands share one handler that checks _inpCmdStr)
+	_CMD_HANDLERS = {
+			MICMD_GMOD: _cmd_gmod,
+			MICMD_GVER: _cmd_gver,
+			MICMD_ENDS: _cmd_ends_or_sess,
+			MICMD_SESS: _cmd_ends_or_sess,
+			MICMD_VOLT: _cmd_volt_or_curr,
+			MICMD_CURR: _cmd_volt_or_curr,
+			MICMD_GETD: _cmd_getd,
+			MICMD_GETS: _cmd_gets,
+			MICMD_GMIN: _cmd_gmin_or_gmax,
+			MICMD_GMAX: _cmd_gmin_or_gmax,
+			MICMD_SOUT: _cmd_sout,
+			MICMD_GOUT: _cmd_gout,
+			MICMD_GETM: _cmd_getm,
+			MICMD_PROM: _cmd_prom,
+			MICMD_GABC: _cmd_gabc,
+			MICMD_RUNM: _cmd_runm_or_sabc,
+			MICMD_SABC: _cmd_runm_or_sabc,
+			MICMD_SOVP: _cmd_sovp_or_socp,
+			MICMD_SOCP: _cmd_sovp_or_socp,
+			MICMD_GOVP: _cmd_govp_or_gocp,
+			MICMD_GOCP: _cmd_govp_or_gocp,
+			MICMD_SVSH: _cmd_svsh_or_sish,
+			MICMD_SISH: _cmd_svsh_or_sish,
+			MICMD_GVSH: _cmd_gvsh_or_gish,
+			MICMD_GISH: _cmd_gvsh_or_gish,
+			MICMD_SETD: _cmd_setd,
+			MICMD_GCHA: _cmd_gcha,
+			MICMD_SCHA: _cmd_scha
+		}
@@ -0,0 +1,410 @@
+#
+# by TS, Dec 2020
+#
+
+from collections import deque
+import os
+import selectors
+import time
+
+from serial import Serial as pyser_Serial
+from serial.serialutil import SerialException as pyser_SerialException
+
+try:
+	from .exceptions import CouldNotConnectError, InvalidInputDataError, NotConnectedError, ResponseTimeoutError
+	from .manson_instrument import get_output_values_value_types
+	from .mi_commands import MICMD_GETD
+	from .models import get_hw_specs as models_get_hw_specs
+	from .serializer import Serializer
+except (ModuleNotFoundError, ImportError):
+	from exceptions import CouldNotConnectError, InvalidInputDataError, NotConnectedError, ResponseTimeoutError
+	from manson_instrument import get_output_values_value_types
+	from mi_commands import MICMD_GETD
+	from models import get_hw_specs as models_get_hw_specs
+	from serializer import Serializer
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+# pause after each response, like MansonInstrument does for real hardware
+EVENG_DEFAULT_PACE_S = 0.1
+EVENG_DEFAULT_TIMEOUT_S = 1.0
+
+# amount of round-trip times kept per port for the statistics
+EVENG_LATENCY_HISTORY = 1000
+
+_EVENG_STATE_IDLE = 0
+_EVENG_STATE_WRITING = 1
+_EVENG_STATE_WAITING = 2
+_EVENG_STATE_PACING = 3
+_EVENG_STATE_LOST = 4
+
+_EVENG_BAUDRATE = 9600
+_EVENG_TERMINATOR = b"OK\r"
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class _EvPort(object):
+	def __init__(self, portId, comPort, serObj, modelId):
+		self.portId = portId
+		self.comPort = comPort
+		self.serObj = serObj
+		self.fd = serObj.fileno()
+		self.modelId = modelId
+		self.hwSpecs = models_get_hw_specs(modelId)
+		self.szrObj = Serializer()
+		self.szrObj.set_hw_specs(self.hwSpecs)
+		self.queue = deque()
+		self.state = _EVENG_STATE_IDLE
+		self.current = None
+		self.outCmd = b""
+		self.outBuf = b""
+		self.inBuf = b""
+		self.staleBytes = 0
+		self.startTime = 0.0
+		self.deadline = 0.0
+		self.stats = {"commands": 0, "timeouts": 0, "resyncs": 0, "errors": 0}
+		self.latencies = deque(maxlen=EVENG_LATENCY_HISTORY)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class EventEngine(object):
+	def __init__(self, paceS=EVENG_DEFAULT_PACE_S, timeoutS=EVENG_DEFAULT_TIMEOUT_S):
+		""" Constructor
+
+		Drives many serial ports from a single thread. Each port has a command
+		queue that is processed one command at a time
+		(write -> wait for "OK\\r" -> pause for paceS -> next command).
+
+		The engine is not thread-safe: except for stop() all functions
+		need to be called from the thread that runs the engine.
+
+		Parameters:
+			paceS (float): Pause after each response before the next command is sent
+			timeoutS (float): Maximum time for receiving a response
+		"""
+		assert isinstance(paceS, (int, float)) and paceS >= 0.0, "paceS needs to be >= 0"
+		assert isinstance(timeoutS, (int, float)) and timeoutS > 0.0, "timeoutS needs to be > 0"
+		#
+		self._paceS = paceS
+		self._timeoutS = timeoutS
+		self._ports = {}
+		self._selObj = selectors.DefaultSelector()
+		self._wakeupR, self._wakeupW = os.pipe()
+		os.set_blocking(self._wakeupR, False)
+		self._selObj.register(self._wakeupR, selectors.EVENT_READ, None)
+		self._stopRequested = False
+
+	# --------------------------------------------------------------------------
+
+	def add_port(self, portId, comPort, modelId):
+		""" Open a serial port
+
+		Parameters:
+			portId (str): ID of the port for submit() and the callbacks
+			comPort (str): Serial device (e.g. "/dev/ttyUSB0")
+			modelId (str): Model ID of the instrument (e.g. "HCS-3202")
+		Raises:
+			CouldNotConnectError
+		"""
+		assert isinstance(portId, str), "portId needs to be string"
+		assert isinstance(comPort, str), "comPort needs to be string"
+		assert portId not in self._ports, "portId already in use"
+		#
+		try:
+			serObj = pyser_Serial(comPort, baudrate=_EVENG_BAUDRATE, bytesize=8, parity="N", stopbits=1, timeout=0)
+		except (pyser_SerialException, ValueError) as err:
+			raise CouldNotConnectError("comPort='%s', baud=%d (%s)" % (comPort, _EVENG_BAUDRATE, str(err)))
+		portObj = _EvPort(portId, comPort, serObj, modelId)
+		os.set_blocking(portObj.fd, False)
+		self._ports[portId] = portObj
+		self._selObj.register(portObj.fd, selectors.EVENT_READ, portObj)
+
+	def remove_port(self, portId):
+		""" Close a serial port (queued commands are dropped)
+
+		Parameters:
+			portId (str)
+		"""
+		portObj = self._ports.pop(portId)
+		if portObj.state != _EVENG_STATE_LOST:
+			self._selObj.unregister(portObj.fd)
+			portObj.serObj.close()
+
+	def get_port_ids(self):
+		""" Get the IDs of all ports
+
+		Returns:
+			list
+		"""
+		return list(self._ports.keys())
+
+	def submit(self, portId, cmd, cargs="", valueTypes=None, callback=None):
+		""" Queue a command
+
+		Parameters:
+			portId (str)
+			cmd (str): e.g. MICMD_GETD
+			cargs (str): Arguments of the command
+			valueTypes (list|None): Value types for Serializer.unserialize_data(),
+					None for getting the raw response
+			callback (callable|None): Function with the signature
+					callback(portId, result, err) - result is None if err is set,
+					err is NotConnectedError if the connection has been lost
+		"""
+		assert isinstance(cmd, str), "cmd needs to be string"
+		assert isinstance(cargs, str), "cargs needs to be string"
+		#
+		portObj = self._ports[portId]
+		if portObj.state == _EVENG_STATE_LOST:
+			if callback is not None:
+				callback(portId, None, NotConnectedError("port '%s' has been lost" % portId))
+			return
+		portObj.queue.append((cmd, cargs, valueTypes, callback))
+		if portObj.state == _EVENG_STATE_IDLE:
+			self._start_next_cmd(portObj, time.monotonic())
+
+	def submit_get_output_values(self, portId, callback):
+		""" Queue reading the output voltage, current and mode
+
+		Parameters:
+			portId (str)
+			callback (callable): see submit() - result is {"volt": float, "curr": float, "mode": str}
+		"""
+		valueTypes = get_output_values_value_types(self._ports[portId].hwSpecs)
+		self.submit(portId, MICMD_GETD, valueTypes=valueTypes,
+				callback=lambda pid, resArr, err: callback(pid,
+						(None if err is not None else {"volt": resArr[0]["val"], "curr": resArr[1]["val"], "mode": resArr[2]["val"]}), err))
+
+	def get_pending_count(self):
+		""" Get the amount of queued and running commands of all ports
+
+		Returns:
+			int
+		"""
+		return sum([len(portObj.queue) + (1 if portObj.current is not None else 0) for portObj in self._ports.values()])
+
+	def get_port_stats(self, portId):
+		""" Get statistics of a port
+
+		Returns:
+			dict: {"commands": int, "timeouts": int, "resyncs": int, "errors": int,
+					"latencyMinS": float|None, "latencyP50S": float|None,
+					"latencyP95S": float|None, "latencyMaxS": float|None}
+				latencies are the round-trip times of the last EVENG_LATENCY_HISTORY commands
+		"""
+		portObj = self._ports[portId]
+		resD = dict(portObj.stats)
+		tmpArr = sorted(portObj.latencies)
+		if not tmpArr:
+			resD.update({"latencyMinS": None, "latencyP50S": None, "latencyP95S": None, "latencyMaxS": None})
+		else:
+			resD["latencyMinS"] = tmpArr[0]
+			resD["latencyP50S"] = tmpArr[(len(tmpArr) - 1) // 2]
+			resD["latencyP95S"] = tmpArr[min(len(tmpArr) - 1, int(round(0.95 * (len(tmpArr) - 1))))]
+			resD["latencyMaxS"] = tmpArr[-1]
+		return resD
+
+	def run_once(self, maxWaitS=None):
+		""" Wait for I/O once and process it
+
+		Parameters:
+			maxWaitS (float|None): Maximum time to wait, None for waiting until the next event
+		"""
+		nowTime = time.monotonic()
+		waitS = self._get_next_timer()
+		if waitS is not None:
+			waitS = max(0.0, waitS - nowTime)
+		if maxWaitS is not None:
+			waitS = (maxWaitS if waitS is None else min(waitS, maxWaitS))
+		for selKey, events in self._selObj.select(waitS):
+			portObj = selKey.data
+			if portObj is None:
+				try:
+					os.read(self._wakeupR, 4096)
+				except BlockingIOError:
+					pass
+				continue
+			if events & selectors.EVENT_WRITE:
+				self._on_writable(portObj)
+			if events & selectors.EVENT_READ and portObj.state != _EVENG_STATE_LOST:
+				self._on_readable(portObj)
+		self._process_timers(time.monotonic())
+
+	def run_until_idle(self, maxWaitS=None):
+		""" Process I/O until all queued commands have been finished
+
+		Parameters:
+			maxWaitS (float|None): Maximum total time
+		Returns:
+			bool: True if all commands have been finished
+		"""
+		endTime = (None if maxWaitS is None else time.monotonic() + maxWaitS)
+		while self.get_pending_count() != 0:
+			if endTime is None:
+				self.run_once()
+			else:
+				remainS = endTime - time.monotonic()
+				if remainS <= 0.0:
+					return False
+				self.run_once(remainS)
+		return True
+
+	def run_forever(self):
+		""" Process I/O until stop() is called """
+		self._stopRequested = False
+		while not self._stopRequested:
+			self.run_once()
+
+	def stop(self):
+		""" Make run_forever() return (may be called from any thread) """
+		self._stopRequested = True
+		os.write(self._wakeupW, b"x")
+
+	def close(self):
+		""" Close all ports """
+		for portId in list(self._ports.keys()):
+			self.remove_port(portId)
+		self._selObj.close()
+		os.close(self._wakeupR)
+		os.close(self._wakeupW)
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _get_next_timer(self):
+		resTime = None
+		for portObj in self._ports.values():
+			if portObj.state == _EVENG_STATE_WAITING or portObj.state == _EVENG_STATE_PACING:
+				if resTime is None or portObj.deadline < resTime:
+					resTime = portObj.deadline
+		return resTime
+
+	def _process_timers(self, nowTime):
+		for portObj in self._ports.values():
+			if portObj.deadline > nowTime:
+				continue
+			if portObj.state == _EVENG_STATE_WAITING:
+				portObj.stats["timeouts"] += 1
+				resS = portObj.inBuf.decode("ascii", "replace").replace("\r", "@")
+				# a late response is discarded as stale data before the next command
+				portObj.staleBytes += len(portObj.inBuf)
+				self._finish_cmd(portObj, nowTime, None,
+						ResponseTimeoutError("cmd='%s', response='%s'" %
+								(portObj.outCmd.decode("ascii", "replace").replace("\r", "@"), resS)))
+			elif portObj.state == _EVENG_STATE_PACING:
+				portObj.state = _EVENG_STATE_IDLE
+				self._start_next_cmd(portObj, nowTime)
+
+	def _start_next_cmd(self, portObj, nowTime):
+		if not portObj.queue:
+			return
+		# leftovers of an earlier response would be taken for the response to this command
+		self._drain_input(portObj)
+		if portObj.staleBytes != 0:
+			portObj.stats["resyncs"] += 1
+			portObj.staleBytes = 0
+		portObj.current = portObj.queue.popleft()
+		cmd = portObj.current[0]
+		if cmd.endswith("\r"):
+			cmd = cmd[0:-1]
+		portObj.outCmd = (cmd + portObj.current[1] + "\r").encode("ascii")
+		portObj.outBuf = portObj.outCmd
+		portObj.inBuf = b""
+		portObj.startTime = nowTime
+		portObj.state = _EVENG_STATE_WRITING
+		portObj.stats["commands"] += 1
+		self._selObj.modify(portObj.fd, selectors.EVENT_READ | selectors.EVENT_WRITE, portObj)
+
+	def _drain_input(self, portObj):
+		while True:
+			try:
+				tmpBy = os.read(portObj.fd, 4096)
+			except (BlockingIOError, InterruptedError):
+				return
+			except OSError:
+				return
+			if not tmpBy:
+				return
+			portObj.staleBytes += len(tmpBy)
+
+	def _on_writable(self, portObj):
+		if portObj.state != _EVENG_STATE_WRITING:
+			return
+		try:
+			lenWritten = os.write(portObj.fd, portObj.outBuf)
+		except (BlockingIOError, InterruptedError):
+			return
+		except OSError:
+			self._on_connection_lost(portObj)
+			return
+		portObj.outBuf = portObj.outBuf[lenWritten:]
+		if not portObj.outBuf:
+			portObj.state = _EVENG_STATE_WAITING
+			portObj.deadline = time.monotonic() + self._timeoutS
+			self._selObj.modify(portObj.fd, selectors.EVENT_READ, portObj)
+
+	def _on_readable(self, portObj):
+		try:
+			tmpBy = os.read(portObj.fd, 4096)
+		except (BlockingIOError, InterruptedError):
+			return
+		except OSError:
+			tmpBy = b""
+		if not tmpBy:
+			# EOF or EIO after a hangup, the port would be reported as readable forever
+			self._on_connection_lost(portObj)
+			return
+		if portObj.state != _EVENG_STATE_WAITING:
+			portObj.staleBytes += len(tmpBy)
+			return
+		portObj.inBuf += tmpBy
+		tmpIx = portObj.inBuf.find(_EVENG_TERMINATOR)
+		if tmpIx < 0:
+			return
+		nowTime = time.monotonic()
+		resBy = portObj.inBuf[0:tmpIx + len(_EVENG_TERMINATOR)]
+		portObj.staleBytes += len(portObj.inBuf) - len(resBy)
+		portObj.latencies.append(nowTime - portObj.startTime)
+		resS = resBy.decode("ascii", "replace").replace("\r", "@")
+		valueTypes = portObj.current[2]
+		if valueTypes is None:
+			self._finish_cmd(portObj, nowTime, resS, None)
+			return
+		try:
+			resVal = portObj.szrObj.unserialize_data(resS, valueTypes)
+		except InvalidInputDataError as err:
+			portObj.stats["errors"] += 1
+			self._finish_cmd(portObj, nowTime, None, err)
+			return
+		self._finish_cmd(portObj, nowTime, resVal, None)
+
+	def _on_connection_lost(self, portObj):
+		portObj.stats["errors"] += 1
+		self._selObj.unregister(portObj.fd)
+		portObj.serObj.close()
+		portObj.state = _EVENG_STATE_LOST
+		cmdArr = ([portObj.current] if portObj.current is not None else []) + list(portObj.queue)
+		portObj.current = None
+		portObj.queue.clear()
+		portObj.inBuf = b""
+		portObj.outBuf = b""
+		for entryCmd in cmdArr:
+			if entryCmd[3] is not None:
+				entryCmd[3](portObj.portId, None, NotConnectedError("port '%s' has been lost" % portObj.portId))
+
+	def _finish_cmd(self, portObj, nowTime, resVal, err):
+		callback = portObj.current[3]
+		portObj.current = None
+		portObj.inBuf = b""
+		portObj.outBuf = b""
+		portObj.state = _EVENG_STATE_PACING
+		portObj.deadline = nowTime + self._paceS
+		self._selObj.modify(portObj.fd, selectors.EVENT_READ, portObj)
+		if callback is not None:
+			callback(portObj.portId, resVal, err)
+		if self._paceS == 0.0 and portObj.state == _EVENG_STATE_PACING:
+			portObj.state = _EVENG_STATE_IDLE
+			self._start_next_cmd(portObj, nowTime)
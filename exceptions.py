@@ -12,6 +12,10 @@ class CouldNotConnectError(InstrumentError):
 class FunctionNotSupportedForModelError(InstrumentError):
 	pass
 
+class IdentityMismatchError(InstrumentError):
+	def __init__(self, msg=""):
+		super().__init__("'%s'" % msg)
+
 class InvalidInputDataError(InstrumentError):
 	def __init__(self, valStr="", valType="n/a"):
 		super().__init__("'%s' (VT=%s)" % (valStr, valType))
@@ -31,6 +35,10 @@ class InvalidTestType(InstrumentError):
 class NotConnectedError(InstrumentError):
 	pass
 
+class ResponseTimeoutError(InstrumentError):
+	def __init__(self, msg=""):
+		super().__init__("'%s'" % msg)
+
 class TestFailedError(InstrumentError):
 	pass
 
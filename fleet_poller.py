@@ -0,0 +1,158 @@
+#
+# by TS, Dec 2020
+#
+
+import threading
+
+try:
+	from .manson_instrument import MansonInstrument
+except (ModuleNotFoundError, ImportError):
+	from manson_instrument import MansonInstrument
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class FleetPoller(object):
+	# pause before restarting the stream of a device after an error
+	_ERROR_BACKOFF_S = 1.0
+
+	def __init__(self, instruments, rateHz=1.0, outpStateEvery=10):
+		""" Constructor
+
+		Polls the display values of several power supplies (one thread per device)
+		and passes every sample to the registered sinks.
+
+		Parameters:
+			instruments (dict): {deviceId: MansonInstrument}, instruments need to be connected already
+			rateHz (float): Sample rate per device
+			outpStateEvery (int): Read the output state every n-th sample (0 to never read it)
+		"""
+		assert isinstance(instruments, dict), "instruments needs to be dict"
+		for deviceId in instruments:
+			assert isinstance(deviceId, str), "device IDs need to be strings"
+			assert isinstance(instruments[deviceId], MansonInstrument), "instruments need to be MansonInstrument objects"
+		assert isinstance(rateHz, (int, float)) and rateHz > 0, "rateHz needs to be int or float > 0"
+		assert isinstance(outpStateEvery, int) and outpStateEvery >= 0, "outpStateEvery needs to be int >= 0"
+		#
+		self._instruments = instruments
+		self._rateHz = rateHz
+		self._outpStateEvery = outpStateEvery
+		self._sinks = []
+		self._threads = []
+		self._stopEvent = threading.Event()
+		self._latestLock = threading.Lock()
+		self._latest = {}
+		self._stats = {}
+		for deviceId in instruments:
+			self._latest[deviceId] = None
+			self._stats[deviceId] = {"samples": 0, "missed": 0, "rateHz": 0.0, "errors": 0, "lastError": None}
+
+	# --------------------------------------------------------------------------
+
+	def add_sink(self, sinkFunc):
+		""" Register a sink that receives all samples
+
+		The sink is called from the polling threads and should therefore return quickly.
+
+		Parameters:
+			sinkFunc (callable): Function with the signature sinkFunc(deviceId, sample)
+		"""
+		assert callable(sinkFunc), "sinkFunc needs to be callable"
+		#
+		self._sinks.append(sinkFunc)
+
+	def get_device_ids(self):
+		""" Get the IDs of all polled devices
+
+		Returns:
+			list
+		"""
+		return list(self._instruments.keys())
+
+	def get_instrument(self, deviceId):
+		""" Get the instrument of a device
+
+		Parameters:
+			deviceId (str)
+		Returns:
+			MansonInstrument
+		"""
+		return self._instruments[deviceId]
+
+	def start(self):
+		""" Start polling """
+		if self._threads:
+			return
+		self._stopEvent.clear()
+		for deviceId in self._instruments:
+			tmpThread = threading.Thread(target=self._poll_device, args=(deviceId,),
+					name="FleetPoller-" + deviceId)
+			tmpThread.daemon = True
+			self._threads.append(tmpThread)
+			tmpThread.start()
+
+	def stop(self):
+		""" Stop polling and wait for all polling threads to finish """
+		self._stopEvent.set()
+		for tmpThread in self._threads:
+			tmpThread.join()
+		self._threads = []
+
+	def is_running(self):
+		""" Is the poller running?
+
+		Returns:
+			bool
+		"""
+		return len(self._threads) != 0
+
+	def get_latest(self, deviceId):
+		""" Get the latest sample of a device
+
+		Parameters:
+			deviceId (str)
+		Returns:
+			dict|None: Sample (see MansonInstrument.stream()) with the additional key "outp"
+		"""
+		with self._latestLock:
+			tmpS = self._latest[deviceId]
+			return (None if tmpS is None else dict(tmpS))
+
+	def get_stats(self):
+		""" Get polling statistics
+
+		Returns:
+			dict: {deviceId: {"samples": int, "missed": int, "rateHz": float, "errors": int, "lastError": str|None}}
+		"""
+		with self._latestLock:
+			return {deviceId: dict(self._stats[deviceId]) for deviceId in self._stats}
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _poll_device(self, deviceId):
+		miObj = self._instruments[deviceId]
+		statsD = self._stats[deviceId]
+		outpState = None
+		sampleCnt = 0
+		while not self._stopEvent.is_set():
+			try:
+				for entryS in miObj.stream(self._rateHz, stopEvent=self._stopEvent):
+					if self._outpStateEvery != 0 and sampleCnt % self._outpStateEvery == 0:
+						outpState = miObj.get_output_state()
+					sampleCnt += 1
+					entryS["outp"] = outpState
+					with self._latestLock:
+						self._latest[deviceId] = entryS
+						statsD["samples"] += 1
+						statsD["missed"] = entryS["missed"]
+						statsD["rateHz"] = entryS["rateHz"]
+					for sinkFunc in self._sinks:
+						sinkFunc(deviceId, entryS)
+					if self._stopEvent.is_set():
+						return
+			except Exception as err:
+				with self._latestLock:
+					statsD["errors"] += 1
+					statsD["lastError"] = ("%s %s" % (type(err).__name__, str(err))).strip()
+				self._stopEvent.wait(self._ERROR_BACKOFF_S)
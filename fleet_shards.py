@@ -0,0 +1,238 @@
+#
+# by TS, Dec 2020
+#
+
+import multiprocessing
+import os
+import queue
+import time
+
+try:
+	from .exceptions import CouldNotConnectError, InstrumentError
+	from .fleet_poller import FleetPoller
+	from .fleet_table import FleetStateTable
+	from .manson_instrument import MansonInstrument
+except (ModuleNotFoundError, ImportError):
+	from exceptions import CouldNotConnectError, InstrumentError
+	from fleet_poller import FleetPoller
+	from fleet_table import FleetStateTable
+	from manson_instrument import MansonInstrument
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+SHARD_DEFAULT_START_TIMEOUT_S = 30.0
+
+_SHARD_MSG_READY = "ready"
+_SHARD_MSG_ERROR = "error"
+_SHARD_MSG_STATS = "stats"
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _run_shard(shardIx, tableName, devices, rateHz, outpStateEvery, stopEvent, msgQueue):
+	""" Main function of a worker process
+
+	Opens the ports of the shard, polls them with a FleetPoller and writes
+	the samples to the FleetStateTable. Only the start result and the final
+	statistics are sent back through msgQueue.
+	"""
+	ftblObj = FleetStateTable(tableName)
+	instruments = {}
+	try:
+		for deviceId, comPort in devices:
+			miObj = MansonInstrument()
+			miObj.open_port(comPort)
+			instruments[deviceId] = miObj
+	except InstrumentError as err:
+		for miObj in instruments.values():
+			miObj.close_port()
+		ftblObj.close()
+		msgQueue.put((_SHARD_MSG_ERROR, shardIx, ("%s %s" % (type(err).__name__, str(err))).strip()))
+		return
+	#
+	pollObj = FleetPoller(instruments, rateHz=rateHz, outpStateEvery=outpStateEvery)
+	pollObj.add_sink(ftblObj.update)
+	pollObj.start()
+	msgQueue.put((_SHARD_MSG_READY, shardIx, None))
+	try:
+		stopEvent.wait()
+	finally:
+		pollObj.stop()
+		msgQueue.put((_SHARD_MSG_STATS, shardIx, pollObj.get_stats()))
+		for miObj in instruments.values():
+			miObj.close_port()
+		ftblObj.close()
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class ShardedFleetPoller(object):
+	def __init__(self, devices, workers=None, rateHz=1.0, outpStateEvery=10):
+		""" Constructor
+
+		Polls several power supplies with a pool of worker processes.
+		The devices are distributed round-robin across the workers, each worker
+		opens and polls its own ports (see FleetPoller) and writes the samples
+		to a FleetStateTable that is shared with this process.
+
+		Parameters:
+			devices (dict): {deviceId: comPort}, comPort may be any transport URL
+					(e.g. "/dev/ttyUSB0" or "emulated://HCS-3102", see transports.py)
+			workers (int|None): Amount of worker processes, None for the amount of CPU cores
+			rateHz (float): Sample rate per device
+			outpStateEvery (int): Read the output state every n-th sample (0 to never read it)
+		"""
+		assert isinstance(devices, dict) and len(devices) > 0, "devices needs to be non-empty dict"
+		for deviceId in devices:
+			assert isinstance(deviceId, str), "device IDs need to be strings"
+			assert isinstance(devices[deviceId], str), "comPorts need to be strings"
+		assert workers is None or (isinstance(workers, int) and workers > 0), "workers needs to be None or int > 0"
+		assert isinstance(rateHz, (int, float)) and rateHz > 0, "rateHz needs to be int or float > 0"
+		assert isinstance(outpStateEvery, int) and outpStateEvery >= 0, "outpStateEvery needs to be int >= 0"
+		#
+		if workers is None:
+			workers = os.cpu_count() or 1
+		self._deviceIds = sorted(devices.keys())
+		self._shards = [[] for _ in range(min(workers, len(self._deviceIds)))]
+		for ix, deviceId in enumerate(self._deviceIds):
+			self._shards[ix % len(self._shards)].append((deviceId, devices[deviceId]))
+		self._rateHz = rateHz
+		self._outpStateEvery = outpStateEvery
+		self._ftblObj = None
+		self._processes = []
+		self._stopEvent = None
+		self._msgQueue = None
+		self._stats = {}
+
+	# --------------------------------------------------------------------------
+
+	def get_device_ids(self):
+		""" Get the IDs of all polled devices
+
+		Returns:
+			list
+		"""
+		return list(self._deviceIds)
+
+	def get_shards(self):
+		""" Get the devices of each worker process
+
+		Returns:
+			list: [[deviceId, ...], ...]
+		"""
+		return [[deviceId for deviceId, _ in shardArr] for shardArr in self._shards]
+
+	def get_table(self):
+		""" Get the table the workers write the samples to
+
+		Returns:
+			FleetStateTable|None: None if the poller isn't running
+		"""
+		return self._ftblObj
+
+	def start(self, timeoutS=SHARD_DEFAULT_START_TIMEOUT_S):
+		""" Start the worker processes and wait until all ports have been opened
+
+		Parameters:
+			timeoutS (float): Maximum time for starting the workers
+		Raises:
+			CouldNotConnectError
+		"""
+		if self._processes:
+			return
+		mpCtx = multiprocessing.get_context()
+		self._ftblObj = FleetStateTable(deviceIds=self._deviceIds)
+		self._stopEvent = mpCtx.Event()
+		self._msgQueue = mpCtx.Queue()
+		self._stats = {}
+		for shardIx, shardArr in enumerate(self._shards):
+			tmpProc = mpCtx.Process(target=_run_shard, name="FleetShard-%d" % shardIx,
+					args=(shardIx, self._ftblObj.get_name(), shardArr, self._rateHz, self._outpStateEvery,
+							self._stopEvent, self._msgQueue))
+			tmpProc.daemon = True
+			self._processes.append(tmpProc)
+			tmpProc.start()
+		#
+		endTime = time.monotonic() + timeoutS
+		doneIxs = set()
+		errMsgs = []
+		while len(doneIxs) != len(self._processes):
+			tmpRemS = endTime - time.monotonic()
+			if tmpRemS <= 0.0:
+				errMsgs.append("timeout")
+				break
+			# a worker that dies without reporting (e.g. killed by a signal) mustn't block until the timeout,
+			# the messages it has sent before are already in the queue
+			deadIxs = [shardIx for shardIx in range(len(self._processes))
+					if shardIx not in doneIxs and not self._processes[shardIx].is_alive()]
+			try:
+				msgType, shardIx, msgVal = self._msgQueue.get(timeout=(0.0 if deadIxs else min(tmpRemS, 0.1)))
+			except queue.Empty:
+				for shardIx in deadIxs:
+					doneIxs.add(shardIx)
+					errMsgs.append("shard %d: exited with code %s" % (shardIx, self._processes[shardIx].exitcode))
+				continue
+			if msgType == _SHARD_MSG_READY:
+				doneIxs.add(shardIx)
+			elif msgType == _SHARD_MSG_ERROR:
+				doneIxs.add(shardIx)
+				errMsgs.append("shard %d: %s" % (shardIx, msgVal))
+		if errMsgs:
+			self.stop()
+			raise CouldNotConnectError(", ".join(errMsgs))
+
+	def stop(self):
+		""" Stop polling and wait for all worker processes to finish """
+		if not self._processes:
+			return
+		self._stopEvent.set()
+		for tmpProc in self._processes:
+			while tmpProc.is_alive():
+				self._collect_messages(0.1)
+			tmpProc.join()
+		self._collect_messages(0.0)
+		self._processes = []
+		self._ftblObj.close()
+		self._ftblObj = None
+
+	def is_running(self):
+		""" Is the poller running?
+
+		Returns:
+			bool
+		"""
+		return len(self._processes) != 0
+
+	def get_latest(self, deviceId):
+		""" Get the latest sample of a device
+
+		Parameters:
+			deviceId (str)
+		Returns:
+			dict|None: see FleetStateTable.read()
+		"""
+		if self._ftblObj is None:
+			return None
+		return self._ftblObj.read(deviceId)
+
+	def get_stats(self):
+		""" Get polling statistics (available after stop())
+
+		Returns:
+			dict: {deviceId: {"samples": int, "missed": int, "rateHz": float, "errors": int, "lastError": str|None}}
+		"""
+		return {deviceId: dict(self._stats[deviceId]) for deviceId in self._stats}
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _collect_messages(self, timeoutS):
+		# the queue needs to be drained, otherwise the workers can't exit
+		while True:
+			try:
+				msgType, _, msgVal = self._msgQueue.get(timeout=timeoutS)
+			except queue.Empty:
+				return
+			if msgType == _SHARD_MSG_STATS:
+				self._stats.update(msgVal)
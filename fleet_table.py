@@ -0,0 +1,218 @@
+#
+# by TS, Dec 2020
+#
+
+from multiprocessing import resource_tracker, shared_memory
+import struct
+import threading
+
+try:
+	from .serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+except (ModuleNotFoundError, ImportError):
+	from serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Shared memory layout (all values little-endian):
+#
+#   header (64 bytes):          magic "MFST", u16 version, u16 reserved, u32 devCount, u32 rowSize, u32 idSize
+#   device IDs (idSize each):   UTF-8, zero-padded
+#   rows (rowSize each):        u64 seqlock, f64 volt, f64 curr, f64 time, u64 seq,
+#                               u8 mode (0=CV, 1=CC), u8 outp (0=off, 1=on, 255=unknown), u8 valid
+#
+# Each row has exactly one writer (the polling thread of the device).
+# The writer increments the row's seqlock to an odd value before and to an even
+# value after updating the row, readers retry until they got a consistent copy.
+
+FTBL_MAGIC = b"MFST"
+FTBL_VERSION = 1
+FTBL_ID_SIZE = 32
+
+_FTBL_HEADER = struct.Struct("<4sHHIII")
+_FTBL_HEADER_SIZE = 64
+_FTBL_U64 = struct.Struct("<Q")
+_FTBL_ROW = struct.Struct("<QdddQBBB")
+_FTBL_ROW_PAYLOAD = struct.Struct("<dddQBBB")
+_FTBL_ROW_SIZE = 64  # one cache line per row
+
+_FTBL_OUTP_OFF = 0
+_FTBL_OUTP_ON = 1
+_FTBL_OUTP_UNKNOWN = 255
+
+assert _FTBL_ROW.size <= _FTBL_ROW_SIZE, "invalid row layout"
+
+# Python < 3.13 registers attached segments with the resource tracker
+# which then removes them when the attaching process exits
+_attachLock = threading.Lock()
+
+def _attach_shared_memory(name):
+	try:
+		return shared_memory.SharedMemory(name=name, track=False)
+	except TypeError:
+		pass
+	with _attachLock:
+		origRegister = resource_tracker.register
+		resource_tracker.register = lambda name, rtype: None
+		try:
+			return shared_memory.SharedMemory(name=name)
+		finally:
+			resource_tracker.register = origRegister
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class FleetStateTable(object):
+	_MAX_RETRIES = 10000
+
+	def __init__(self, name=None, deviceIds=None):
+		""" Constructor
+
+		If deviceIds is given a new table will be created, otherwise
+		the existing table with the given name will be attached.
+
+		Parameters:
+			name (str|None): Name of the shared memory segment (None for a random name when creating)
+			deviceIds (list|None): IDs of all devices (max. 32 bytes each)
+		Raises:
+			ValueError
+		"""
+		assert name is not None or deviceIds is not None, "name and deviceIds may not both be None"
+		#
+		self._isOwner = (deviceIds is not None)
+		if self._isOwner:
+			assert isinstance(deviceIds, list) and len(deviceIds) > 0, "deviceIds needs to be non-empty list"
+			idBytesArr = []
+			for deviceId in deviceIds:
+				assert isinstance(deviceId, str), "device IDs need to be strings"
+				tmpBy = deviceId.encode("utf-8")
+				if len(tmpBy) > FTBL_ID_SIZE or len(tmpBy) == 0:
+					raise ValueError("invalid device ID '%s'" % deviceId)
+				idBytesArr.append(tmpBy)
+			if len(set(deviceIds)) != len(deviceIds):
+				raise ValueError("device IDs need to be unique")
+			devCount = len(deviceIds)
+			shmSize = _FTBL_HEADER_SIZE + devCount * (FTBL_ID_SIZE + _FTBL_ROW_SIZE)
+			self._shmObj = shared_memory.SharedMemory(name=name, create=True, size=shmSize)
+			self._shmObj.buf[:shmSize] = bytes(shmSize)
+			_FTBL_HEADER.pack_into(self._shmObj.buf, 0, FTBL_MAGIC, FTBL_VERSION, 0, devCount, _FTBL_ROW_SIZE, FTBL_ID_SIZE)
+			for ix in range(devCount):
+				offs = _FTBL_HEADER_SIZE + ix * FTBL_ID_SIZE
+				self._shmObj.buf[offs:offs + len(idBytesArr[ix])] = idBytesArr[ix]
+			self._deviceIds = list(deviceIds)
+		else:
+			assert isinstance(name, str), "name needs to be string"
+			self._shmObj = _attach_shared_memory(name)
+			magic, version, _, devCount, rowSize, idSize = _FTBL_HEADER.unpack_from(self._shmObj.buf, 0)
+			if magic != FTBL_MAGIC or version != FTBL_VERSION or rowSize != _FTBL_ROW_SIZE or idSize != FTBL_ID_SIZE:
+				self._shmObj.close()
+				raise ValueError("invalid fleet state table '%s'" % name)
+			self._deviceIds = []
+			for ix in range(devCount):
+				offs = _FTBL_HEADER_SIZE + ix * FTBL_ID_SIZE
+				self._deviceIds.append(bytes(self._shmObj.buf[offs:offs + FTBL_ID_SIZE]).rstrip(b"\0").decode("utf-8"))
+		self._devIxMap = {self._deviceIds[ix]: ix for ix in range(len(self._deviceIds))}
+		self._rowsOffs = _FTBL_HEADER_SIZE + len(self._deviceIds) * FTBL_ID_SIZE
+		self._seqlocks = [0] * len(self._deviceIds)
+
+	# --------------------------------------------------------------------------
+
+	def get_name(self):
+		""" Get the name of the shared memory segment (needed for attaching)
+
+		Returns:
+			str
+		"""
+		return self._shmObj.name
+
+	def get_device_ids(self):
+		""" Get the IDs of all devices
+
+		Returns:
+			list
+		"""
+		return list(self._deviceIds)
+
+	def update(self, deviceId, sample):
+		""" Update the row of a device
+
+		Can be registered as sink of a FleetPoller (see FleetPoller.add_sink()).
+		Each row may only be updated by one thread/process.
+
+		Parameters:
+			deviceId (str)
+			sample (dict): {"seq": int, "time": float, "volt": float, "curr": float, "mode": str, "outp": bool|None}
+		"""
+		devIx = self._devIxMap[deviceId]
+		buf = self._shmObj.buf
+		rowOffs = self._rowsOffs + devIx * _FTBL_ROW_SIZE
+		outpState = sample.get("outp", None)
+		if outpState is None:
+			outpCode = _FTBL_OUTP_UNKNOWN
+		else:
+			outpCode = (_FTBL_OUTP_ON if outpState else _FTBL_OUTP_OFF)
+		#
+		# the row might have been written by another process before (e.g. after a restart)
+		tmpSeqlock = _FTBL_U64.unpack_from(buf, rowOffs)[0]
+		if tmpSeqlock & 1:
+			tmpSeqlock += 1
+		tmpSeqlock = max(tmpSeqlock, self._seqlocks[devIx])
+		_FTBL_U64.pack_into(buf, rowOffs, tmpSeqlock + 1)
+		_FTBL_ROW_PAYLOAD.pack_into(buf, rowOffs + 8, sample["volt"], sample["curr"], sample["time"], sample["seq"],
+				(1 if sample["mode"] == SZR_OUTP_MODE_CC else 0), outpCode, 1)
+		_FTBL_U64.pack_into(buf, rowOffs, tmpSeqlock + 2)
+		self._seqlocks[devIx] = tmpSeqlock + 2
+
+	def read(self, deviceId):
+		""" Read the row of a device (lock-free)
+
+		Parameters:
+			deviceId (str)
+		Returns:
+			dict|None: {"seq": int, "time": float, "volt": float, "curr": float, "mode": str, "outp": bool|None,
+					"updates": int}
+				or None if the row hasn't been written yet
+		"""
+		return self._read_row(self._devIxMap[deviceId])
+
+	def read_all(self):
+		""" Read the rows of all devices (lock-free)
+
+		Returns:
+			dict: {deviceId: dict|None}
+		"""
+		return {self._deviceIds[ix]: self._read_row(ix) for ix in range(len(self._deviceIds))}
+
+	def close(self):
+		""" Detach from the table (and remove it if this object has created it) """
+		if self._shmObj is None:
+			return
+		self._shmObj.close()
+		if self._isOwner:
+			self._shmObj.unlink()
+		self._shmObj = None
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _read_row(self, devIx):
+		buf = self._shmObj.buf
+		rowOffs = self._rowsOffs + devIx * _FTBL_ROW_SIZE
+		for _ in range(self._MAX_RETRIES):
+			rowT = _FTBL_ROW.unpack_from(buf, rowOffs)
+			if rowT[0] & 1:
+				continue
+			if _FTBL_U64.unpack_from(buf, rowOffs)[0] != rowT[0]:
+				continue
+			seqlock, tmpV, tmpC, tmpT, tmpSeq, modeCode, outpCode, valid = rowT
+			if not valid:
+				return None
+			return {
+					"seq": tmpSeq,
+					"time": tmpT,
+					"volt": tmpV,
+					"curr": tmpC,
+					"mode": (SZR_OUTP_MODE_CC if modeCode == 1 else SZR_OUTP_MODE_CV),
+					"outp": (None if outpCode == _FTBL_OUTP_UNKNOWN else outpCode == _FTBL_OUTP_ON),
+					"updates": seqlock // 2
+				}
+		raise TimeoutError("could not read consistent row")
@@ -0,0 +1,256 @@
+#
+# by TS, Dec 2020
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from urllib.parse import parse_qs, urlparse
+
+try:
+	from .fleet_poller import FleetPoller
+	from .manson_instrument import MansonInstrument
+	from .mux_daemon import MUX_FUNCTIONS
+except (ModuleNotFoundError, ImportError):
+	from fleet_poller import FleetPoller
+	from manson_instrument import MansonInstrument
+	from mux_daemon import MUX_FUNCTIONS
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Endpoints:
+#
+#   GET  /devices
+#        -> {"devices": {deviceId: {"model": str}}}
+#
+#   GET  /values[?devices=id1,id2][&maxAgeMs=500]
+#        Voltage/Current/Mode/output state of several devices. Samples of the
+#        FleetPoller that are not older than maxAgeMs are served from its cache,
+#        all other devices are read in parallel.
+#        -> {"values": {deviceId: {"volt", "curr", "mode", "outp", "time", "ageMs", "source"}},
+#            "errors": {deviceId: str}}
+#
+#   POST /batch   {"ops": [{"device": id, "fn": name, "args": [...]}, ...]}
+#        Executes the operations (MansonInstrument functions, see mux_daemon.MUX_FUNCTIONS).
+#        Operations for different devices are executed in parallel,
+#        operations for the same device in the given order.
+#        -> {"results": [{"ok": true, "result": ...} or {"ok": false, "error": str, "errorType": str}, ...]}
+
+HTTPGW_DEFAULT_PORT = 8080
+
+_HTTPGW_MAX_BODY_LEN = 1024 * 1024
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class HttpGateway(object):
+	def __init__(self, instruments, host="127.0.0.1", port=HTTPGW_DEFAULT_PORT, poller=None, maxWorkers=32):
+		""" Constructor
+
+		Parameters:
+			instruments (dict): {deviceId: MansonInstrument}, instruments need to be connected already
+			host (str): Address to listen on
+			port (int): Port to listen on (0 for a random free port)
+			poller (FleetPoller|None): Poller whose cached samples may be used for reads
+			maxWorkers (int): Maximum amount of devices that are accessed in parallel
+		"""
+		assert isinstance(instruments, dict), "instruments needs to be dict"
+		for deviceId in instruments:
+			assert isinstance(deviceId, str), "device IDs need to be strings"
+			assert isinstance(instruments[deviceId], MansonInstrument), "instruments need to be MansonInstrument objects"
+		assert poller is None or isinstance(poller, FleetPoller), "poller needs to be FleetPoller or None"
+		#
+		self._instruments = instruments
+		self._poller = poller
+		self._executor = ThreadPoolExecutor(max_workers=maxWorkers)
+		self._httpd = ThreadingHTTPServer((host, port), self._build_handler_class())
+		self._httpd.daemon_threads = True
+		self._thread = None
+
+	# --------------------------------------------------------------------------
+
+	def get_port(self):
+		""" Get the port the gateway is listening on
+
+		Returns:
+			int
+		"""
+		return self._httpd.server_address[1]
+
+	def start(self):
+		""" Start serving in a background thread """
+		if self._thread is not None:
+			return
+		self._thread = threading.Thread(target=self._httpd.serve_forever, name="HttpGateway")
+		self._thread.daemon = True
+		self._thread.start()
+
+	def serve_forever(self):
+		""" Serve until stop() is called from another thread """
+		self._httpd.serve_forever()
+
+	def stop(self):
+		""" Stop serving """
+		self._httpd.shutdown()
+		self._httpd.server_close()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+		self._executor.shutdown(wait=True)
+
+	def get_devices(self):
+		""" Handler for GET /devices
+
+		Returns:
+			dict
+		"""
+		return {"devices": {deviceId: {"model": self._instruments[deviceId].get_hw_model()} for deviceId in self._instruments}}
+
+	def get_values(self, deviceIds=None, maxAgeS=0.0):
+		""" Handler for GET /values
+
+		Parameters:
+			deviceIds (list|None): None for all devices
+			maxAgeS (float): Maximum age of cached samples
+		Returns:
+			dict
+		"""
+		if deviceIds is None:
+			deviceIds = list(self._instruments.keys())
+		resD = {"values": {}, "errors": {}}
+		futures = {}
+		for deviceId in deviceIds:
+			if deviceId not in self._instruments:
+				resD["errors"][deviceId] = "unknown device"
+				continue
+			tmpS = None
+			if self._poller is not None and maxAgeS > 0.0 and deviceId in self._poller.get_device_ids():
+				tmpS = self._poller.get_latest(deviceId)
+			# the samples have been taken with the instrument's clock (see MansonInstrument.stream())
+			tmpNow = self._instruments[deviceId].get_clock().time()
+			if tmpS is not None and tmpNow - tmpS["time"] <= maxAgeS:
+				resD["values"][deviceId] = self._build_values_dict(tmpS, tmpS["outp"], "cache", tmpNow)
+			else:
+				futures[deviceId] = self._executor.submit(self._read_values, deviceId)
+		for deviceId in futures:
+			try:
+				resD["values"][deviceId] = futures[deviceId].result()
+			except Exception as err:
+				resD["errors"][deviceId] = ("%s %s" % (type(err).__name__, str(err))).strip()
+		return resD
+
+	def run_batch(self, ops):
+		""" Handler for POST /batch
+
+		Parameters:
+			ops (list): [{"device": str, "fn": str, "args": list}, ...]
+		Returns:
+			dict
+		Raises:
+			ValueError
+		"""
+		if not isinstance(ops, list):
+			raise ValueError("ops needs to be list")
+		opsByDevice = {}
+		for opIx in range(len(ops)):
+			entryOp = ops[opIx]
+			if not isinstance(entryOp, dict) or not isinstance(entryOp.get("device"), str) or \
+					entryOp["device"] not in self._instruments:
+				raise ValueError("invalid device in op #%d" % opIx)
+			if entryOp.get("fn") not in MUX_FUNCTIONS or not isinstance(entryOp.get("args", []), list):
+				raise ValueError("invalid function in op #%d" % opIx)
+			if entryOp["device"] not in opsByDevice:
+				opsByDevice[entryOp["device"]] = []
+			opsByDevice[entryOp["device"]].append(opIx)
+		#
+		results = [None] * len(ops)
+		futures = [self._executor.submit(self._run_device_ops, deviceId, ops, opsByDevice[deviceId], results)
+				for deviceId in opsByDevice]
+		for tmpFuture in futures:
+			tmpFuture.result()
+		return {"results": results}
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _build_values_dict(self, sample, outpState, source, tmpNow):
+		return {
+				"volt": sample["volt"],
+				"curr": sample["curr"],
+				"mode": sample["mode"],
+				"outp": outpState,
+				"time": sample["time"],
+				"ageMs": (tmpNow - sample["time"]) * 1000.0,
+				"source": source
+			}
+
+	def _read_values(self, deviceId):
+		miObj = self._instruments[deviceId]
+		clockObj = miObj.get_clock()
+		tmpT = clockObj.time()
+		tmpD = miObj.get_output_values()
+		tmpD["time"] = tmpT
+		return self._build_values_dict(tmpD, miObj.get_output_state(), "device", clockObj.time())
+
+	def _run_device_ops(self, deviceId, ops, opIxArr, results):
+		miObj = self._instruments[deviceId]
+		for opIx in opIxArr:
+			entryOp = ops[opIx]
+			try:
+				resVal = getattr(miObj, entryOp["fn"])(*entryOp.get("args", []))
+				results[opIx] = {"ok": True, "result": resVal}
+			except Exception as err:
+				results[opIx] = {"ok": False, "error": str(err), "errorType": type(err).__name__}
+
+	def _build_handler_class(self):
+		gwObj = self
+
+		class _HttpGatewayHandler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				urlObj = urlparse(self.path)
+				queryD = parse_qs(urlObj.query)
+				try:
+					if urlObj.path == "/devices":
+						self._send_json(200, gwObj.get_devices())
+					elif urlObj.path == "/values":
+						deviceIds = None
+						if "devices" in queryD:
+							deviceIds = [x for x in ",".join(queryD["devices"]).split(",") if x != ""]
+						maxAgeS = float(queryD.get("maxAgeMs", ["0"])[0]) / 1000.0
+						self._send_json(200, gwObj.get_values(deviceIds, maxAgeS))
+					else:
+						self._send_json(404, {"error": "not found"})
+				except ValueError as err:
+					self._send_json(400, {"error": str(err)})
+
+			def do_POST(self):
+				urlObj = urlparse(self.path)
+				try:
+					bodyLen = int(self.headers.get("Content-Length", "0"))
+					if bodyLen < 0:
+						raise ValueError("invalid Content-Length")
+					if bodyLen > _HTTPGW_MAX_BODY_LEN:
+						raise ValueError("request too large")
+					reqD = json.loads(self.rfile.read(bodyLen).decode("utf-8"))
+					if urlObj.path == "/batch":
+						if not isinstance(reqD, dict):
+							raise ValueError("invalid request")
+						self._send_json(200, gwObj.run_batch(reqD.get("ops")))
+					else:
+						self._send_json(404, {"error": "not found"})
+				except ValueError as err:
+					self._send_json(400, {"error": str(err)})
+
+			def log_message(self, format, *args):
+				pass
+
+			def _send_json(self, status, respD):
+				tmpBy = json.dumps(respD, separators=(",", ":")).encode("utf-8")
+				self.send_response(status)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(tmpBy)))
+				self.end_headers()
+				self.wfile.write(tmpBy)
+
+		return _HttpGatewayHandler
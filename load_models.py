@@ -0,0 +1,123 @@
+#
+# by TS, Dec 2020
+#
+
+try:
+	from .serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+except (ModuleNotFoundError, ImportError):
+	from serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Load models for EmulatedInstrumentSerial.set_load_model()
+#
+# A load model offers get_current(volt, timeS) that returns the current the load
+# draws at the given output voltage. timeS is the time since the load model has
+# been set. The current needs to rise monotonically with the voltage.
+
+_LOADM_BISECT_STEPS = 40
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class ResistiveLoad(object):
+	def __init__(self, ohms):
+		""" Constructor
+
+		Parameters:
+			ohms (float): Resistance
+		"""
+		assert isinstance(ohms, (int, float)) and ohms > 0.0, "ohms needs to be > 0"
+		#
+		self._ohms = float(ohms)
+
+	def get_current(self, volt, timeS):
+		return volt / self._ohms
+
+class ConstantCurrentLoad(object):
+	def __init__(self, amps):
+		""" Constructor
+
+		Electronic load in constant current mode
+
+		Parameters:
+			amps (float): Current drawn at any voltage > 0
+		"""
+		assert isinstance(amps, (int, float)) and amps >= 0.0, "amps needs to be >= 0"
+		#
+		self._amps = float(amps)
+
+	def get_current(self, volt, timeS):
+		return (self._amps if volt > 0.0 else 0.0)
+
+class ProfileLoad(object):
+	def __init__(self, steps, repeat=True):
+		""" Constructor
+
+		Time-varying load that switches between other load models
+
+		Parameters:
+			steps (list): [(durationS, loadModel), ...]
+			repeat (bool): Start over after the last step (otherwise the last step is kept)
+		"""
+		assert isinstance(steps, list) and len(steps) > 0, "steps needs to be non-empty list"
+		for durationS, loadObj in steps:
+			assert isinstance(durationS, (int, float)) and durationS > 0.0, "durations need to be > 0"
+			assert callable(getattr(loadObj, "get_current", None)), "load models need get_current()"
+		assert repeat == True or repeat == False, "repeat needs to be bool"
+		#
+		self._steps = list(steps)
+		self._repeat = repeat
+		self._totalS = sum([durationS for durationS, _ in steps])
+
+	def get_step_index(self, timeS):
+		""" Get the index of the step that is active at a given time
+
+		Parameters:
+			timeS (float): Time since the start of the profile
+		Returns:
+			int
+		"""
+		if self._repeat:
+			timeS = timeS % self._totalS
+		for ix, (durationS, _) in enumerate(self._steps):
+			if timeS < durationS:
+				return ix
+			timeS -= durationS
+		return len(self._steps) - 1
+
+	def get_current(self, volt, timeS):
+		return self._steps[self.get_step_index(timeS)][1].get_current(volt, timeS)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def solve_operating_point(voltSet, currSet, loadObj, timeS):
+	""" Get the steady-state output of a power supply with a load
+
+	The supply regulates the voltage (CV) as long as the load draws at most
+	currSet, otherwise it regulates the current (CC) and the voltage drops
+	to where the load draws currSet.
+
+	Parameters:
+		voltSet (float): Voltage setpoint
+		currSet (float): Current setpoint/limit
+		loadObj (object): Load model
+		timeS (float): Time since the load model has been set
+	Returns:
+		tuple: (volt, curr, mode)
+	"""
+	if voltSet <= 0.0:
+		return (0.0, 0.0, SZR_OUTP_MODE_CV)
+	tmpC = loadObj.get_current(voltSet, timeS)
+	if tmpC <= currSet:
+		return (voltSet, tmpC, SZR_OUTP_MODE_CV)
+	voltLo = 0.0
+	voltHi = voltSet
+	for _ in range(_LOADM_BISECT_STEPS):
+		tmpV = (voltLo + voltHi) / 2.0
+		if loadObj.get_current(tmpV, timeS) > currSet:
+			voltHi = tmpV
+		else:
+			voltLo = tmpV
+	return (voltLo, currSet, SZR_OUTP_MODE_CC)
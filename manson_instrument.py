@@ -3,34 +3,39 @@
 #
 
 from copy import deepcopy
-from serial import Serial as pyser_Serial
 from serial.serialutil import SerialException as pyser_SerialException
-import time
+import threading
 
 try:
+	from .clock import MonotonicClock
 	from .mi_commands import *
-	from .emulated_instrument_serial import EmulatedInstrumentSerial
 	from .exceptions import CouldNotConnectError, \
-			FunctionNotSupportedForModelError, InvalidModelError, \
-			InvalidResponseError, NotConnectedError, UnsupportedModelError
+			FunctionNotSupportedForModelError, IdentityMismatchError, InvalidInputDataError, InvalidModelError, \
+			InvalidResponseError, NotConnectedError, ResponseTimeoutError, UnsupportedModelError
 	from .models import build_spec_dict as models_build_spec_dict, \
 			get_hw_model_id as models_get_hw_model_id, \
 			get_hw_specs as models_get_hw_specs, \
 			MODEL_SERIES_ID_HCS, MODEL_SERIES_ID_NTP, MODEL_SERIES_ID_SSP, \
 			MODEL_SUBSERIES_ID_SSP80, MODEL_SUBSERIES_ID_SSP81, MODEL_SUBSERIES_ID_SSP83, MODEL_SUBSERIES_ID_SSP90
 	from .serializer import *
+	from .serial_tuning import apply_low_latency, restore_low_latency
+	from .transports import open_transport, split_transport_url, TRANSPORT_SCHEME_EMULATED, TRANSPORT_SCHEME_SERIAL
+	from .wire_capture import WireCaptureWriter, WCAP_FLAG_MEMPRESETS_CACHE, WCAP_FRAME_CMD, WCAP_FRAME_RESP
 except (ModuleNotFoundError, ImportError):
+	from clock import MonotonicClock
 	from mi_commands import *
-	from emulated_instrument_serial import EmulatedInstrumentSerial
 	from exceptions import CouldNotConnectError, \
-			FunctionNotSupportedForModelError, InvalidModelError, \
-			InvalidResponseError, NotConnectedError, UnsupportedModelError
+			FunctionNotSupportedForModelError, IdentityMismatchError, InvalidInputDataError, InvalidModelError, \
+			InvalidResponseError, NotConnectedError, ResponseTimeoutError, UnsupportedModelError
 	from models import build_spec_dict as models_build_spec_dict, \
 			get_hw_model_id as models_get_hw_model_id, \
 			get_hw_specs as models_get_hw_specs, \
 			MODEL_SERIES_ID_HCS, MODEL_SERIES_ID_NTP, MODEL_SERIES_ID_SSP, \
 			MODEL_SUBSERIES_ID_SSP80, MODEL_SUBSERIES_ID_SSP81, MODEL_SUBSERIES_ID_SSP83, MODEL_SUBSERIES_ID_SSP90
 	from serializer import *
+	from serial_tuning import apply_low_latency, restore_low_latency
+	from transports import open_transport, split_transport_url, TRANSPORT_SCHEME_EMULATED, TRANSPORT_SCHEME_SERIAL
+	from wire_capture import WireCaptureWriter, WCAP_FLAG_MEMPRESETS_CACHE, WCAP_FRAME_CMD, WCAP_FRAME_RESP
 
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -45,10 +50,36 @@ RANGE_ID_2_36V0_2A2 = "2"
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 
+def get_output_values_value_types(hwSpecs):
+	""" Get the value types of the response to the GETD command
+
+	Parameters:
+		hwSpecs (dict): see models.get_hw_specs()
+	Returns:
+		list: [Voltage value type, Current value type, SZR_VTYPE_MODE]
+	"""
+	if hwSpecs["modelSeries"] == MODEL_SERIES_ID_NTP or hwSpecs["modelSubSeries"] == MODEL_SUBSERIES_ID_SSP90:
+		return [SZR_VTYPE_VARVOLT, SZR_VTYPE_VARCURR, SZR_VTYPE_MODE]
+	isHcsSeries = hwSpecs["modelSeries"] == MODEL_SERIES_ID_HCS
+	return [(SZR_VTYPE_SPECVOLT if isHcsSeries else SZR_VTYPE_VOLT),
+			(SZR_VTYPE_SPECCURR if isHcsSeries else SZR_VTYPE_CURR),
+			SZR_VTYPE_MODE]
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
 class MansonInstrument(object):
 	_BAUDRATE = 9600
+	# every response ends with this
+	_RESPONSE_TERMINATOR = b"OK\r"
 
-	def __init__(self):
+	def __init__(self, clockObj=None):
+		""" Constructor
+
+		Parameters:
+			clockObj (MonotonicClock|VirtualClock|None): Clock for all waits and timestamps,
+					None for MonotonicClock (see set_clock())
+		"""
 		self._pyserObj = None
 		self._modelId = None
 		self._modelVers = None
@@ -62,49 +93,195 @@ class MansonInstrument(object):
 		self._enableMemPresetsCache = False
 		self._szrObj = Serializer()
 		self._isEmulated = False
+		# Model ID from the identity information passed to open_port() that
+		# still needs to be verified before the next command
+		self._unverifiedModelId = None
+		self._isVerifyingIdentity = False
+		# makes each command/response transaction atomic
+		# (e.g. for a poller thread and a control thread sharing one instrument),
+		# reentrant for the verification of the identity before the first command
+		self._ioLock = threading.RLock()
+		self._ioTimeoutS = 1.0
+		self._ioGetRetries = 2
+		self._ioSetRetries = 0
+		self._ioBackoffS = 0.05
+		self._ioStats = {"commands": 0, "timeouts": 0, "retries": 0, "resyncs": 0, "failures": 0, "lastRoundTripS": None}
+		self._comPort = None
+		self._lowLatencySettings = None
+		self._captureObj = None
+		self._clockObj = (clockObj if clockObj is not None else MonotonicClock())
 
 	# --------------------------------------------------------------------------
 
-	def open_port(self, comPort, emulateModel=None):
+	def open_port(self, comPort, emulateModel=None, identityInfo=None, lowLatency=False):
 		""" Init serial connection
 
+		If identityInfo is given the handshake is skipped and the information
+		is trusted. The model will be verified before the first command is sent
+		(see verify_identity()).
+
 		Parameters:
-			comPort (str): Serial device (e.g. "/dev/tty.SLAB_USBtoUART")
+			comPort (str): Serial device (e.g. "/dev/tty.SLAB_USBtoUART") or transport URL
+					(e.g. "socket://10.0.0.5:4001", see transports.py)
 			emulateModel (str|None): optional Model ID for hardware emulation
+					(same as comPort "emulated://MODEL")
+			identityInfo (dict|None): optional information from get_identity_info()
+			lowLatency (bool): Apply low-latency settings to local serial ports on Linux
+					(see serial_tuning.py and get_low_latency_settings()), they are restored by close_port()
 		Raises:
 			CouldNotConnectError
 		"""
 		assert isinstance(comPort, str), "comPort needs to be string"
 		assert comPort != VIRTUAL_SERIAL_DEVICE or emulateModel is not None, "for VIRTUAL_SERIAL_DEVICE emulateModel needs to be != None"
+		assert identityInfo is None or isinstance(identityInfo, dict), "identityInfo needs to be dict or None"
+		assert lowLatency == True or lowLatency == False, "lowLatency needs to be bool"
 		#
-		haveSerialErr = False
+		tmpUrl = comPort
+		if emulateModel is not None:
+			tmpUrl = "%s://%s" % (TRANSPORT_SCHEME_EMULATED, emulateModel)
+		self._pyserObj, self._isEmulated = open_transport(tmpUrl, self._BAUDRATE, self._ioTimeoutS)
+		if hasattr(self._pyserObj, "set_clock"):
+			self._pyserObj.set_clock(self._clockObj)
+		# e.g. a replayed capture of a real instrument
+		self._enableMemPresetsCache = getattr(self._pyserObj, "enableMemPresetsCache", not self._isEmulated)
 		try:
-			if comPort != VIRTUAL_SERIAL_DEVICE:
-				self._pyserObj = pyser_Serial(comPort, baudrate=self._BAUDRATE, bytesize=8, parity="N", stopbits=1, timeout=0.1)
-				self._enableMemPresetsCache = True
-			else:
-				self._pyserObj = EmulatedInstrumentSerial(emulateModel)
-				self._isEmulated = True
 			self._pyserObj.flushInput()
 			self._pyserObj.flushOutput()
 		except pyser_SerialException:
-			haveSerialErr = True
-		if haveSerialErr:
+			self.close_port()
 			raise CouldNotConnectError("comPort='%s', baud=%d" % (comPort, self._BAUDRATE))
+		self._comPort = comPort
+		if lowLatency and not self._isEmulated and split_transport_url(comPort)[0] == TRANSPORT_SCHEME_SERIAL:
+			self._lowLatencySettings = apply_low_latency(self._pyserObj, comPort)
 		#
+		if identityInfo is not None and self._apply_identity_info(identityInfo):
+			self._unverifiedModelId = self._modelId
+			return
 		self.get_hw_model()
 		self.get_hw_specs()
 		self._szrObj.set_hw_specs(self._modelSpecs)
-		if comPort == VIRTUAL_SERIAL_DEVICE:
+		if self._isEmulated:
 			self._pyserObj.update_model_id(self._modelId)
 
 	def close_port(self):
-		""" Close serial connection """
+		""" Close serial connection (and stop the capture, see start_capture()) """
+		self.stop_capture()
 		if self._pyserObj is None:
 			return
+		if self._lowLatencySettings is not None:
+			restore_low_latency(self._pyserObj, self._comPort, self._lowLatencySettings)
+			self._lowLatencySettings = None
 		self._pyserObj.close()
 		self._pyserObj = None
 
+	def set_clock(self, clockObj):
+		""" Set the clock for all waits (retry backoff, settle times, stream())
+		and timestamps (stream(), round-trip times, wire captures)
+
+		With a VirtualClock and an emulated instrument (or a replayed capture),
+		which get the same clock, long sequences run faster than real time
+		while all timestamps stay accurate.
+
+		Parameters:
+			clockObj (MonotonicClock|VirtualClock)
+		"""
+		assert clockObj is not None, "clockObj may not be None"
+		#
+		with self._ioLock:
+			self._clockObj = clockObj
+			if self._pyserObj is not None and hasattr(self._pyserObj, "set_clock"):
+				self._pyserObj.set_clock(clockObj)
+
+	def get_clock(self):
+		""" Get the clock (see set_clock())
+
+		Returns:
+			MonotonicClock|VirtualClock
+		"""
+		return self._clockObj
+
+	def set_io_policy(self, timeoutS=1.0, getRetries=2, setRetries=0, backoffS=0.05):
+		""" Configure timeouts and retries of the serial protocol
+
+		If a response is incomplete (no "OK" received within timeoutS) the
+		input buffer is flushed and ResponseTimeoutError is raised.
+		GET commands are sent again automatically (also after a response that
+		can't be parsed), SET commands only if setRetries > 0
+		(not all SET commands are idempotent).
+
+		Parameters:
+			timeoutS (float): Maximum time for receiving a response
+			getRetries (int): Retries for GET commands
+			setRetries (int): Retries for SET commands
+			backoffS (float): Pause before the first retry (doubled for every further retry)
+		"""
+		assert isinstance(timeoutS, (int, float)) and timeoutS > 0.0, "timeoutS needs to be > 0"
+		assert isinstance(getRetries, int) and getRetries >= 0, "getRetries needs to be int >= 0"
+		assert isinstance(setRetries, int) and setRetries >= 0, "setRetries needs to be int >= 0"
+		assert isinstance(backoffS, (int, float)) and backoffS >= 0.0, "backoffS needs to be >= 0"
+		#
+		with self._ioLock:
+			self._ioTimeoutS = timeoutS
+			self._ioGetRetries = getRetries
+			self._ioSetRetries = setRetries
+			self._ioBackoffS = backoffS
+			if self._pyserObj is not None:
+				self._pyserObj.timeout = timeoutS
+
+	def start_capture(self, filePath):
+		""" Record all command and response frames into a wire capture file
+
+		The frames are recorded with timestamps of the clock (see set_clock()) as they are written
+		and read (including retries and incomplete responses), see wire_capture.py.
+		If the capture is started before open_port() the handshake is recorded as well.
+		The file can be replayed with open_port("replay://" + filePath).
+
+		Parameters:
+			filePath (str)
+		"""
+		assert isinstance(filePath, str), "filePath needs to be string"
+		#
+		with self._ioLock:
+			if self._captureObj is not None:
+				self._captureObj.close()
+			self._captureObj = WireCaptureWriter(filePath, modelId=self._modelId,
+					flags=(WCAP_FLAG_MEMPRESETS_CACHE if self._enableMemPresetsCache else 0), clockObj=self._clockObj)
+
+	def stop_capture(self):
+		""" Stop recording (see start_capture())
+
+		Returns:
+			int: Amount of recorded frames, 0 if there was no capture
+		"""
+		with self._ioLock:
+			if self._captureObj is None:
+				return 0
+			resCnt = self._captureObj.get_frame_count()
+			self._captureObj.close()
+			self._captureObj = None
+			return resCnt
+
+	def get_low_latency_settings(self):
+		""" Get the effective low-latency settings (see open_port())
+
+		Returns:
+			dict|None: see serial_tuning.apply_low_latency(), None if no settings have been applied
+		"""
+		return deepcopy(self._lowLatencySettings)
+
+	def get_io_stats(self):
+		""" Get statistics of the serial protocol
+
+		Returns:
+			dict: {"commands": int, "timeouts": int, "retries": int, "resyncs": int, "failures": int,
+					"lastRoundTripS": float|None}
+				"resyncs" counts how often stale input had to be discarded,
+				"failures" the commands that failed even after all retries,
+				"lastRoundTripS" the time from sending the last command until its response had been received
+		"""
+		with self._ioLock:
+			return dict(self._ioStats)
+
 	def round_value(self, valFloat, isVolt):
 		""" Round a Voltage/Current value with respect to the hardware's capabilities
 
@@ -162,12 +339,7 @@ class MansonInstrument(object):
 		"""
 		if self._modelId is not None:
 			return self._modelId
-		response = self._lowlev_send_get_cmd(MICMD_GMOD)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_MODEL])
-		if tmpUd[0]["val"].endswith("@"):
-			tmpUd[0]["val"] = tmpUd[0]["val"][:-1]
-		resS = models_get_hw_model_id(tmpUd[0]["val"])
+		resS = self._query_hw_model()
 		self._modelId = resS
 		return resS
 
@@ -179,9 +351,7 @@ class MansonInstrument(object):
 		"""
 		if self._modelVers is not None:
 			return self._modelVers
-		response = self._lowlev_send_get_cmd(MICMD_GVER)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_VER])
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GVER, [SZR_VTYPE_VER])
 		tmpVer = tmpUd[0]["val"]
 		if tmpVer.endswith("@"):
 			tmpVer = tmpVer[:-1]
@@ -224,15 +394,23 @@ class MansonInstrument(object):
 		tmpD = self._get_output_volt_curr_mode()
 		return (tmpD["mode"] == SZR_OUTP_MODE_CC)
 
+	def get_output_values(self):
+		""" Get PS display values of Voltage/Current and the output mode
+		with a single command
+
+		Returns:
+			dict: {"volt": float, "curr": float, "mode": str}
+				with "mode" being one of SZR_OUTP_MODE_CV, SZR_OUTP_MODE_CC
+		"""
+		return self._get_output_volt_curr_mode()
+
 	def get_output_state(self):
 		""" Get whether output of PS is on/off
 
 		Returns:
 			bool: True if on, False if off
 		"""
-		response = self._lowlev_send_get_cmd(MICMD_GOUT)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_STATE])
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GOUT, [SZR_VTYPE_STATE])
 		tmpState = tmpUd[0]["val"]
 		return tmpState
 
@@ -242,13 +420,77 @@ class MansonInstrument(object):
 		Parameters:
 			state (bool): If True switch output on, else off
 		"""
-		assert state == True or state == False, "state needs to be bool"
-		#
-		cmd = MICMD_SOUT
-		self._check_hwCmdSupp(cmd)
+		cmdAndCargs = self._get_cmd_set_outp_state(state)
+		self._lowlev_send_set_cmd(cmdAndCargs["cmd"], cmdAndCargs["cargs"])
+
+	def stream(self, rateHz, count=None, stopEvent=None):
+		""" Generator that reads the PS display values of Voltage/Current/Mode
+		at a fixed rate
+
+		The samples are taken at the absolute deadlines start + n / rateHz.
+		The time needed for reading a sample therefore does not add up as drift.
+		If a deadline has been missed completely (e.g. because the caller
+		didn't pull the next sample in time) it will be skipped and counted
+		as missed instead of taking several samples in a burst.
+
+		Parameters:
+			rateHz (float): Sample rate
+			count (int|None): Amount of samples to yield, None for infinite stream
+			stopEvent (threading.Event|None): Ends the stream when set, also while waiting for the next deadline
+		Yields:
+			dict: {"seq": int, "time": float, "volt": float, "curr": float, "mode": str,
+					"lateS": float, "missed": int, "rateHz": float}
+				"seq" is the index of the sample's deadline, "time" the time of the clock (see set_clock())
+				at which the sample was taken, "lateS" the amount of seconds the sample
+				was taken after its deadline, "missed" the total amount of missed deadlines
+				and "rateHz" the effective sample rate achieved so far
+		"""
+		assert isinstance(rateHz, (int, float)) and rateHz > 0, "rateHz needs to be int or float > 0"
+		assert count is None or (isinstance(count, int) and count >= 0), "count needs to be None or int >= 0"
+		assert stopEvent is None or isinstance(stopEvent, threading.Event), "stopEvent needs to be threading.Event or None"
 		#
-		cargs = self._szrObj.serialize_data([state], [SZR_VTYPE_STATE])
-		self._lowlev_send_set_cmd(cmd, cargs)
+		periodS = 1.0 / rateHz
+		startTime = self._clockObj.time()
+		firstTime = None
+		slotIx = 0
+		missed = 0
+		taken = 0
+		while count is None or taken < count:
+			deadline = startTime + slotIx * periodS
+			remS = deadline - self._clockObj.time()
+			if remS > 0.0:
+				if stopEvent is not None and isinstance(self._clockObj, MonotonicClock):
+					# at low rates the caller shouldn't have to wait for a whole period when stopping
+					stopEvent.wait(remS)
+				else:
+					self._clockObj.sleep(remS)
+			if stopEvent is not None and stopEvent.is_set():
+				return
+			sampleTime = self._clockObj.time()
+			tmpD = self._get_output_volt_curr_mode()
+			taken += 1
+			if firstTime is None:
+				firstTime = sampleTime
+			achievedHz = 0.0
+			if taken > 1 and sampleTime > firstTime:
+				achievedHz = (taken - 1) / (sampleTime - firstTime)
+			yield {
+					"seq": slotIx,
+					"time": sampleTime,
+					"volt": tmpD["volt"],
+					"curr": tmpD["curr"],
+					"mode": tmpD["mode"],
+					"lateS": sampleTime - deadline,
+					"missed": missed,
+					"rateHz": achievedHz
+				}
+			# skip all deadlines that have already passed
+			slotIx += 1
+			tmpNow = self._clockObj.time()
+			if tmpNow > startTime + (slotIx + 1) * periodS:
+				tmpSkip = int((tmpNow - startTime) / periodS) - slotIx
+				slotIx += tmpSkip
+				missed += tmpSkip
 
 	# --------------------------------------------------------------------------
 	# All Series but HCS Series
@@ -264,9 +506,7 @@ class MansonInstrument(object):
 			cmd = MICMD_GVSH
 		else:
 			cmd = MICMD_GOVP
-		response = self._lowlev_send_get_cmd(cmd)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_VOLT])
+		tmpUd = self._lowlev_send_get_cmd(cmd, [SZR_VTYPE_VOLT])
 		tmpV = tmpUd[0]["val"]
 		return tmpV
 
@@ -290,9 +530,7 @@ class MansonInstrument(object):
 			cmd = MICMD_GISH
 		else:
 			cmd = MICMD_GOCP
-		response = self._lowlev_send_get_cmd(cmd)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_CURR])
+		tmpUd = self._lowlev_send_get_cmd(cmd, [SZR_VTYPE_CURR])
 		tmpC = tmpUd[0]["val"]
 		return tmpC
 
@@ -416,9 +654,7 @@ class MansonInstrument(object):
 		"""
 		if self._hwMax is not None:
 			return deepcopy(self._hwMax)
-		response = self._lowlev_send_get_cmd(MICMD_GMAX)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_VOLT, SZR_VTYPE_CURR])
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GMAX, [SZR_VTYPE_VOLT, SZR_VTYPE_CURR])
 		tmpV = tmpUd[0]["val"]
 		tmpC = tmpUd[1]["val"]
 		self._hwMax = {"maxVolt": tmpV, "maxCurr": tmpC}
@@ -446,15 +682,13 @@ class MansonInstrument(object):
 			cargs = self._szrObj.serialize_data([0], [SZR_VTYPE_IX])
 		else:
 			cargs = ""
-		response = self._lowlev_send_get_cmd(cmd, cargs)
-		#
 		if self._modelSeries == MODEL_SERIES_ID_NTP or self._modelSubSeries == MODEL_SUBSERIES_ID_SSP90:
 			vt1 = SZR_VTYPE_VARVOLT
 			vt2 = SZR_VTYPE_VARCURR
 		else:
 			vt1 = SZR_VTYPE_VOLT
 			vt2 = SZR_VTYPE_CURR
-		tmpUd = self._szrObj.unserialize_data(response, [vt1, vt2])
+		tmpUd = self._lowlev_send_get_cmd(cmd, [vt1, vt2], cargs=cargs)
 		tmpV = tmpUd[0]["val"]
 		tmpC = tmpUd[1]["val"]
 		return {"volt": tmpV, "curr": tmpC}
@@ -523,9 +757,7 @@ class MansonInstrument(object):
 		"""
 		if self._hwMin is not None:
 			return deepcopy(self._hwMin)
-		response = self._lowlev_send_get_cmd(MICMD_GMIN)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_VOLT, SZR_VTYPE_CURR])
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GMIN, [SZR_VTYPE_VOLT, SZR_VTYPE_CURR])
 		tmpV = tmpUd[0]["val"]
 		tmpC = tmpUd[1]["val"]
 		self._hwMin = {"minVolt": tmpV, "minCurr": tmpC}
@@ -542,9 +774,7 @@ class MansonInstrument(object):
 		Raises:
 			ValueError
 		"""
-		response = self._lowlev_send_get_cmd(MICMD_GCHA)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_RANGE])
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GCHA, [SZR_VTYPE_RANGE])
 		rangeId = str(tmpUd[0]["val"])
 		if rangeId not in [RANGE_ID_0_16V0_5A0, RANGE_ID_1_27V0_3A0, RANGE_ID_2_36V0_2A2]:
 			raise ValueError("invalid rangeId read from device")
@@ -576,17 +806,198 @@ class MansonInstrument(object):
 		Returns:
 			int
 		"""
-		response = self._lowlev_send_get_cmd(MICMD_GABC)
-		#
-		tmpUd = self._szrObj.unserialize_data(response, [SZR_VTYPE_IX])
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GABC, [SZR_VTYPE_IX])
 		tmpIx = tmpUd[0]["val"]
 		if self._modelSubSeries == MODEL_SUBSERIES_ID_SSP90:
 			tmpIx -= 1  # on SSP-90XX the preset #0 is the "Normal Mode"
 		return tmpIx
 
+	# --------------------------------------------------------------------------
+	# Pre-encoded commands (e.g. for time-critical sequences)
+
+	def encode_output_state_cmd(self, state):
+		""" Encode the command for switching the output of PS on/off
+
+		Parameters:
+			state (bool): If True switch output on, else off
+		Returns:
+			bytes: Raw command that can be passed to send_encoded_set_cmd()
+		"""
+		cmdAndCargs = self._get_cmd_set_outp_state(state)
+		return self._lowlev_encode_cmd(cmdAndCargs["cmd"], cmdAndCargs["cargs"])
+
+	def encode_preset_voltage_cmd(self, volt):
+		""" Encode the command for setting the PS preset Voltage value
+
+		Parameters:
+			volt (float): Voltage value
+		Returns:
+			bytes: Raw command that can be passed to send_encoded_set_cmd()
+		Raises:
+			FunctionNotSupportedForModelError
+		"""
+		if self._modelSubSeries == MODEL_SUBSERIES_ID_SSP80:
+			raise FunctionNotSupportedForModelError()
+		#
+		cmdAndCargs = self._get_cmd_set_volt_or_curr(volt, "volt", isVolt=True)
+		return self._lowlev_encode_cmd(cmdAndCargs["cmd"], cmdAndCargs["cargs"])
+
+	def encode_preset_current_cmd(self, curr):
+		""" Encode the command for setting the PS preset Current value
+
+		Parameters:
+			curr (float): Current value
+		Returns:
+			bytes: Raw command that can be passed to send_encoded_set_cmd()
+		Raises:
+			FunctionNotSupportedForModelError
+		"""
+		if self._modelSubSeries == MODEL_SUBSERIES_ID_SSP80:
+			raise FunctionNotSupportedForModelError()
+		#
+		cmdAndCargs = self._get_cmd_set_volt_or_curr(curr, "curr", isVolt=False)
+		return self._lowlev_encode_cmd(cmdAndCargs["cmd"], cmdAndCargs["cargs"])
+
+	def send_encoded_set_cmd(self, rawCmd, extraWait=False):
+		""" Send a pre-encoded SET command to hardware and validate response
+
+		Parameters:
+			rawCmd (bytes): Command returned by one of the encode_*_cmd() methods
+			extraWait (bool)
+		Raises:
+			NotConnectedError, InvalidInputDataError, ResponseTimeoutError
+		"""
+		assert isinstance(rawCmd, bytes), "rawCmd needs to be bytes"
+		#
+		response = self._lowlev_send_raw_cmd(rawCmd, extraWait=extraWait, retries=self._ioSetRetries)
+		self._szrObj.unserialize_data(response, [])
+
+	# --------------------------------------------------------------------------
+	# Identity information (e.g. for skipping the handshake after a restart)
+
+	def get_identity_info(self, complete=False):
+		""" Get the information about the instrument that can be passed to
+		open_port() in order to skip the handshake (e.g. after a restart)
+
+		Parameters:
+			complete (bool): If True query all information that hasn't been read yet
+		Returns:
+			dict: {"model": str, "version": str|None, "hwMax": dict|None, "hwMin": dict|None,
+					"memPresets": list|None}
+				values that are unknown or not supported by the model are None
+		Raises:
+			NotConnectedError
+		"""
+		if self._pyserObj is None:
+			raise NotConnectedError()
+		if complete:
+			for tmpFnc in (self.get_hw_version, self.get_max_values_from_hw, self.get_min_values_from_hw):
+				try:
+					tmpFnc()
+				except FunctionNotSupportedForModelError:
+					pass
+			if self._enableMemPresetsCache and self.get_hw_specs()["realMemPresetLocations"] > 0:
+				self._load_all_memory_presets()
+		return {
+				"model": self._modelId,
+				"version": self._modelVers,
+				"hwMax": deepcopy(self._hwMax),
+				"hwMin": deepcopy(self._hwMin),
+				"memPresets": (deepcopy(self._memPresets) if self._enableMemPresetsCache else None)
+			}
+
+	def is_identity_verified(self):
+		""" Has the model been verified?
+
+		Returns:
+			bool: False if the port has been opened with identityInfo
+				and no command has been sent yet
+		"""
+		return (self._unverifiedModelId is None)
+
+	def verify_identity(self):
+		""" Verify the model passed to open_port() with identityInfo
+
+		Is done automatically before the first command is sent.
+		If the model doesn't match the instrument is re-initialized for the
+		actual model and all information from identityInfo is discarded.
+
+		Raises:
+			IdentityMismatchError, NotConnectedError
+		"""
+		with self._ioLock:
+			if self._unverifiedModelId is None or self._isVerifyingIdentity:
+				return
+			# no other thread may send commands with the unverified specs meanwhile
+			self._isVerifyingIdentity = True
+			try:
+				resS = self._query_hw_model()
+			finally:
+				self._isVerifyingIdentity = False
+			# only a response verifies the model, after a timeout it is still unverified
+			expModelId = self._unverifiedModelId
+			self._unverifiedModelId = None
+			if resS == expModelId:
+				if self._isEmulated:
+					self._pyserObj.update_model_id(self._modelId)
+				return
+			self._modelId = resS
+			self._modelVers = None
+			self._modelSpecs = None
+			self._hwMin = None
+			self._hwMax = None
+			self._memPresets = None
+			self.get_hw_specs()
+			self._szrObj.set_hw_specs(self._modelSpecs)
+			if self._isEmulated:
+				self._pyserObj.update_model_id(self._modelId)
+			raise IdentityMismatchError("expected '%s', got '%s'" % (expModelId, resS))
+
 	# --------------------------------------------------------------------------
 	# --------------------------------------------------------------------------
 
+	def _apply_identity_info(self, identityInfo):
+		""" Use the information from get_identity_info() instead of querying it
+
+		Parameters:
+			identityInfo (dict)
+		Returns:
+			bool: False if the information is not usable
+		"""
+		try:
+			modelId = models_get_hw_model_id(identityInfo.get("model"))
+		except (AssertionError, InvalidModelError, UnsupportedModelError):
+			return False
+		self._modelId = modelId
+		self.get_hw_specs()
+		self._szrObj.set_hw_specs(self._modelSpecs)
+		#
+		tmpVer = identityInfo.get("version")
+		if isinstance(tmpVer, str):
+			self._modelVers = tmpVer
+		tmpMax = identityInfo.get("hwMax")
+		if isinstance(tmpMax, dict) and set(tmpMax.keys()) == {"maxVolt", "maxCurr"}:
+			self._hwMax = deepcopy(tmpMax)
+		tmpMin = identityInfo.get("hwMin")
+		if isinstance(tmpMin, dict) and set(tmpMin.keys()) == {"minVolt", "minCurr"}:
+			self._hwMin = deepcopy(tmpMin)
+		tmpMp = identityInfo.get("memPresets")
+		if isinstance(tmpMp, list) and len(tmpMp) == self._modelSpecs["realMemPresetLocations"] and \
+				all(isinstance(x, dict) and set(x.keys()) == {"volt", "curr"} for x in tmpMp):
+			self._memPresets = deepcopy(tmpMp)
+		return True
+
+	def _query_hw_model(self):
+		""" Query hardware model
+
+		Returns:
+			str
+		"""
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GMOD, [SZR_VTYPE_MODEL])
+		if tmpUd[0]["val"].endswith("@"):
+			tmpUd[0]["val"] = tmpUd[0]["val"][:-1]
+		return models_get_hw_model_id(tmpUd[0]["val"])
+
 	def _check_hwCmdSupp(self, cmd):
 		""" Check if command is supported by the current hardware
 
@@ -603,17 +1014,19 @@ class MansonInstrument(object):
 		elif not self._modelHwCmdSupp[cmd]:
 			raise FunctionNotSupportedForModelError()
 
-	def _lowlev_send_cmd(self, cmd, cargs, extraWait=False):
+	def _lowlev_send_cmd(self, cmd, cargs, extraWait=False, retries=0, valueTypes=None):
 		""" Send command to hardware and return response
 
 		Parameters:
 			cmd (str)
 			cargs (str)
 			extraWait (bool)
+			retries (int)
+			valueTypes (list|None): see _lowlev_send_raw_cmd()
 		Returns:
-			str
+			str|list
 		Raises:
-			NotConnectedError
+			NotConnectedError, ResponseTimeoutError, InvalidInputDataError
 		"""
 		assert isinstance(cmd, str), "cmd needs to be string"
 		assert isinstance(cargs, str), "cargs needs to be string"
@@ -621,41 +1034,124 @@ class MansonInstrument(object):
 		#
 		self._check_hwCmdSupp(cmd)
 		#
-		if self._pyserObj is None:
-			raise NotConnectedError()
+		return self._lowlev_send_raw_cmd(self._lowlev_encode_cmd(cmd, cargs), extraWait=extraWait, retries=retries,
+				valueTypes=valueTypes)
+
+	def _lowlev_encode_cmd(self, cmd, cargs):
+		""" Encode command and its arguments for sending it to the hardware
+
+		Parameters:
+			cmd (str)
+			cargs (str)
+		Returns:
+			bytes
+		"""
 		if cmd.endswith("\r"):
 			cmd = cmd[0:-1]
 		cmd += cargs + "\r"
-		#print("-- S: '%s' --" % cmd.replace("\r", "@"))
-		self._pyserObj.write(cmd.encode("ascii"))
+		return cmd.encode("ascii")
+
+	def _lowlev_send_raw_cmd(self, rawCmd, extraWait=False, retries=0, valueTypes=None):
+		""" Send encoded command to hardware and return response
+
+		Parameters:
+			rawCmd (bytes)
+			extraWait (bool)
+			retries (int): How often the command may be sent again after a timeout
+					(or after a garbled response if valueTypes is given)
+			valueTypes (list|None): Value types for unserializing the response, None for the raw response
+		Returns:
+			str|list: list if valueTypes is given (see Serializer.unserialize_data())
+		Raises:
+			NotConnectedError, ResponseTimeoutError, InvalidInputDataError
+		"""
+		if self._pyserObj is None:
+			raise NotConnectedError()
+		with self._ioLock:
+			if self._unverifiedModelId is not None:
+				self.verify_identity()
+			for attemptIx in range(retries + 1):
+				if attemptIx != 0:
+					self._ioStats["retries"] += 1
+					self._clockObj.sleep(self._ioBackoffS * (2 ** (attemptIx - 1)))
+				try:
+					response = self._lowlev_transceive(rawCmd, extraWait)
+					if valueTypes is None:
+						return response
+					return self._szrObj.unserialize_data(response, valueTypes)
+				except (ResponseTimeoutError, InvalidInputDataError) as err:
+					if isinstance(err, InvalidInputDataError):
+						# the rest of a garbled response would be taken for the next one
+						self._ioStats["resyncs"] += 1
+						self._pyserObj.flushInput()
+					if attemptIx == retries:
+						self._ioStats["failures"] += 1
+						raise
+
+	def _lowlev_transceive(self, rawCmd, extraWait):
+		""" Send encoded command and receive the response (needs to hold _ioLock)
+
+		Parameters:
+			rawCmd (bytes)
+			extraWait (bool)
+		Returns:
+			str
+		Raises:
+			ResponseTimeoutError
+		"""
+		# leftovers of an earlier response would be taken for the response to this command
+		if self._pyserObj.in_waiting:
+			self._ioStats["resyncs"] += 1
+		self._pyserObj.flushInput()
+		#print("-- S: '%s' --" % rawCmd.decode("ascii").replace("\r", "@"))
+		startTime = self._clockObj.time()
+		if self._captureObj is not None:
+			self._captureObj.write_frame(WCAP_FRAME_CMD, rawCmd)
+		self._pyserObj.write(rawCmd)
+		self._ioStats["commands"] += 1
+		if extraWait and not self._isEmulated:
+			self._clockObj.sleep(0.9)
+		resBy = self._pyserObj.read_until(self._RESPONSE_TERMINATOR)
+		self._ioStats["lastRoundTripS"] = self._clockObj.time() - startTime
+		if self._captureObj is not None:
+			self._captureObj.write_frame(WCAP_FRAME_RESP, resBy)
 		if not self._isEmulated:
-			time.sleep(0.1 + (0.9 if extraWait else 0.0))
-		resS = self._pyserObj.readline().decode("ascii")
-		resS = resS.replace("\r", "@")
+			self._clockObj.sleep(0.1)
+		if not resBy.endswith(self._RESPONSE_TERMINATOR):
+			self._ioStats["timeouts"] += 1
+			if self._pyserObj.in_waiting:
+				self._ioStats["resyncs"] += 1
+			self._pyserObj.flushInput()
+			raise ResponseTimeoutError("cmd='%s', response='%s'" %
+					(rawCmd.decode("ascii", "replace").replace("\r", "@"), resBy.decode("ascii", "replace").replace("\r", "@")))
+		resS = resBy.decode("ascii", "replace").replace("\r", "@")
 		#print("R: '%s'" % resS)
-		if not self._isEmulated:
-			time.sleep(0.1)
 		return resS
 
-	def _lowlev_send_get_cmd(self, cmd, cargs="", extraWait=False):
-		""" Send GET command to hardware and return response
+	def _lowlev_send_get_cmd(self, cmd, valueTypes, cargs="", extraWait=False):
+		""" Send GET command to hardware and return unserialized response
+		(retried after timeouts and garbled responses, see set_io_policy())
 
 		Parameters:
 			cmd (str)
+			valueTypes (list)
 			cargs (str)
 			extraWait (bool)
+		Returns:
+			list: see Serializer.unserialize_data()
 		"""
-		return self._lowlev_send_cmd(cmd, cargs, extraWait=extraWait)
+		return self._lowlev_send_cmd(cmd, cargs, extraWait=extraWait, retries=self._ioGetRetries, valueTypes=valueTypes)
 
 	def _lowlev_send_set_cmd(self, cmd, cargs, extraWait=False):
 		""" Send SET command to hardware and validate response
+		(only retried after timeouts if enabled, see set_io_policy())
 
 		Parameters:
 			cmd (str)
 			cargs (str)
 			extraWait (bool)
 		"""
-		response = self._lowlev_send_cmd(cmd, cargs, extraWait=extraWait)
+		response = self._lowlev_send_cmd(cmd, cargs, extraWait=extraWait, retries=self._ioSetRetries)
 		self._szrObj.unserialize_data(response, [])
 
 	def _get_cmd_set_volt_or_curr(self, valFloat, varName, isVolt):
@@ -685,6 +1181,22 @@ class MansonInstrument(object):
 		cargs = self._szrObj.serialize_data(valArr, vtArr)
 		return {"cmd": cmd, "cargs": cargs}
 
+	def _get_cmd_set_outp_state(self, state):
+		""" Get raw command for switching the output on/off
+
+		Parameters:
+			state (bool)
+		Returns:
+			dict: {"cmd": str, "cargs": str}
+		"""
+		assert state == True or state == False, "state needs to be bool"
+		#
+		cmd = MICMD_SOUT
+		self._check_hwCmdSupp(cmd)
+		#
+		cargs = self._szrObj.serialize_data([state], [SZR_VTYPE_STATE])
+		return {"cmd": cmd, "cargs": cargs}
+
 	def _get_cmd_set_ovp_or_ocp(self, valFloat, varName, isVolt):
 		""" Get raw command for setting OVP/OCP
 
@@ -714,16 +1226,7 @@ class MansonInstrument(object):
 		Returns:
 			dict: {"volt": float, "curr": float, "mode": str}
 		"""
-		response = self._lowlev_send_get_cmd(MICMD_GETD)
-		#
-		if self._modelSeries == MODEL_SERIES_ID_NTP or self._modelSubSeries == MODEL_SUBSERIES_ID_SSP90:
-			vt1 = SZR_VTYPE_VARVOLT
-			vt2 = SZR_VTYPE_VARCURR
-		else:
-			isHcsSeries = self._modelSeries == MODEL_SERIES_ID_HCS
-			vt1 = (SZR_VTYPE_SPECVOLT if isHcsSeries else SZR_VTYPE_VOLT)
-			vt2 = (SZR_VTYPE_SPECCURR if isHcsSeries else SZR_VTYPE_CURR)
-		tmpUd = self._szrObj.unserialize_data(response, [vt1, vt2, SZR_VTYPE_MODE])
+		tmpUd = self._lowlev_send_get_cmd(MICMD_GETD, get_output_values_value_types(self._modelSpecs))
 		return {"volt": tmpUd[0]["val"], "curr": tmpUd[1]["val"], "mode": tmpUd[2]["val"]}
 
 	def _load_all_memory_presets(self):
@@ -751,19 +1254,16 @@ class MansonInstrument(object):
 				if self._modelSubSeries == MODEL_SUBSERIES_ID_SSP90:
 					tmpIx += 1  # on SSP-90XX the preset #0 is the "Normal Mode"
 				cargs = self._szrObj.serialize_data([tmpIx], [SZR_VTYPE_IX])
-				response = self._lowlev_send_get_cmd(cmd, cargs)
-				tmpUd = self._szrObj.unserialize_data(response, vtArr)
+				tmpUd = self._lowlev_send_get_cmd(cmd, vtArr, cargs=cargs)
 				tmpV = tmpUd[0]["val"]
 				tmpC = tmpUd[1]["val"]
 				self._memPresets.append({"volt": tmpV, "curr": tmpC})
 		else:
-			response = self._lowlev_send_get_cmd(MICMD_GETM)
-			#
 			vtArr = []
 			for ix in range(hwSpecs["realMemPresetLocations"]):
 				vtArr.append(SZR_VTYPE_VOLT)
 				vtArr.append(SZR_VTYPE_CURR)
-			tmpUd = self._szrObj.unserialize_data(response, vtArr)
+			tmpUd = self._lowlev_send_get_cmd(MICMD_GETM, vtArr)
 			#
 			udIx = 0
 			for ix in range(hwSpecs["realMemPresetLocations"]):
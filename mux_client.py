@@ -0,0 +1,120 @@
+#
+# by TS, Dec 2020
+#
+
+import socket
+import threading
+
+try:
+	from . import exceptions as mi_exceptions
+	from .exceptions import CouldNotConnectError, InstrumentError, NotConnectedError
+	from .mux_daemon import mux_recv_frame, mux_send_frame, MUX_DEFAULT_SOCKET_PATH, MUX_FN_ATTACH, MUX_FUNCTIONS
+except (ModuleNotFoundError, ImportError):
+	import exceptions as mi_exceptions
+	from exceptions import CouldNotConnectError, InstrumentError, NotConnectedError
+	from mux_daemon import mux_recv_frame, mux_send_frame, MUX_DEFAULT_SOCKET_PATH, MUX_FN_ATTACH, MUX_FUNCTIONS
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+_BUILTIN_EXCEPTIONS = {
+		"AssertionError": AssertionError,
+		"TypeError": TypeError,
+		"ValueError": ValueError
+	}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class MansonInstrumentClient(object):
+	def __init__(self, socketPath=MUX_DEFAULT_SOCKET_PATH):
+		""" Constructor
+
+		Client for a MuxDaemon. Offers the same functions as MansonInstrument
+		(see mux_daemon.MUX_FUNCTIONS), so existing scripts only need to
+		replace MansonInstrument() with MansonInstrumentClient().
+
+		Parameters:
+			socketPath (str): Path of the daemon's Unix domain socket
+		"""
+		assert isinstance(socketPath, str), "socketPath needs to be string"
+		#
+		self._socketPath = socketPath
+		self._sock = None
+		self._deviceId = None
+		self._nextReqId = 0
+		self._ioLock = threading.Lock()
+
+	# --------------------------------------------------------------------------
+
+	def open_port(self, comPort, emulateModel=None):
+		""" Connect to the daemon and select a device
+
+		Parameters:
+			comPort (str): ID of the device in the daemon (e.g. "/dev/ttyUSB0")
+			emulateModel (str|None): ignored, the daemon owns the instruments
+		Raises:
+			CouldNotConnectError
+		"""
+		assert isinstance(comPort, str), "comPort needs to be string"
+		#
+		self.close_port()
+		sockObj = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			sockObj.connect(self._socketPath)
+		except OSError:
+			sockObj.close()
+			raise CouldNotConnectError("socket='%s'" % self._socketPath)
+		self._sock = sockObj
+		self._deviceId = comPort
+		try:
+			self._call(MUX_FN_ATTACH, [])
+		except InstrumentError:
+			self.close_port()
+			raise
+
+	def close_port(self):
+		""" Disconnect from the daemon """
+		if self._sock is None:
+			return
+		self._sock.close()
+		self._sock = None
+		self._deviceId = None
+
+	def __getattr__(self, name):
+		if name not in MUX_FUNCTIONS:
+			raise AttributeError(name)
+		return lambda *args: self._call(name, list(args))
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _call(self, fnName, args):
+		with self._ioLock:
+			if self._sock is None:
+				raise NotConnectedError()
+			reqId = self._nextReqId
+			self._nextReqId += 1
+			try:
+				mux_send_frame(self._sock, {"i": reqId, "d": self._deviceId, "f": fnName, "a": args})
+				respD = mux_recv_frame(self._sock)
+			except (OSError, ValueError):
+				respD = None
+			if respD is None or respD.get("i") != reqId:
+				self._sock.close()
+				self._sock = None
+				raise NotConnectedError()
+		if "e" in respD:
+			raise self._build_exception(respD["t"], respD["e"])
+		return respD["r"]
+
+	def _build_exception(self, className, msg):
+		excClass = _BUILTIN_EXCEPTIONS.get(className)
+		if excClass is None:
+			excClass = getattr(mi_exceptions, className, None)
+			if not (isinstance(excClass, type) and issubclass(excClass, InstrumentError)):
+				excClass = InstrumentError
+		# bypass the constructors that would quote the message again
+		resErr = excClass.__new__(excClass)
+		Exception.__init__(resErr, msg)
+		return resErr
@@ -0,0 +1,402 @@
+#
+# by TS, Dec 2020
+#
+
+import collections
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+try:
+	from .manson_instrument import MansonInstrument
+	from .serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+except (ModuleNotFoundError, ImportError):
+	from manson_instrument import MansonInstrument
+	from serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Protocol:
+#
+#   Every message is a frame consisting of a u32 (little-endian) payload length
+#   followed by the payload (compact JSON, UTF-8).
+#
+#   request:   {"i": requestId, "d": deviceId, "f": functionName, "a": [args...]}
+#   response:  {"i": requestId, "r": result}
+#              {"i": requestId, "e": errorMessage, "t": exceptionClassName}
+#
+#   Besides the MansonInstrument functions in MUX_FUNCTIONS the daemon
+#   knows the function MUX_FN_ATTACH which only checks that the device exists.
+
+MUX_DEFAULT_SOCKET_PATH = "/tmp/manson_mux.sock"
+
+MUX_FN_ATTACH = "_attach"
+
+# read-only functions whose results may be shared between clients
+MUX_FUNCTIONS_READ = [
+		"get_hw_model",
+		"get_hw_version",
+		"get_hw_specs",
+		"get_output_values",
+		"get_output_voltage",
+		"get_output_current",
+		"get_is_output_mode_cv",
+		"get_is_output_mode_cc",
+		"get_output_state",
+		"get_overvoltage_protection_value",
+		"get_overcurrent_protection_value",
+		"load_memory_preset",
+		"get_max_values_from_hw",
+		"get_preset_voltage_current",
+		"get_min_values_from_hw",
+		"get_selected_range",
+		"get_selected_preset",
+		"round_value"
+	]
+
+# functions that change the state of the power supply
+MUX_FUNCTIONS_WRITE = [
+		"set_output_state",
+		"set_overvoltage_protection_value",
+		"set_overcurrent_protection_value",
+		"set_userinput_allowed",
+		"apply_memory_preset",
+		"save_memory_preset",
+		"set_preset_voltage_current",
+		"set_preset_voltage",
+		"set_preset_current",
+		"set_selected_range"
+	]
+
+MUX_FUNCTIONS = MUX_FUNCTIONS_READ + MUX_FUNCTIONS_WRITE
+
+# functions that are all answered by one GETD command
+_MUX_FUNCTIONS_GETD = {
+		"get_output_values": lambda tmpD: tmpD,
+		"get_output_voltage": lambda tmpD: tmpD["volt"],
+		"get_output_current": lambda tmpD: tmpD["curr"],
+		"get_is_output_mode_cv": lambda tmpD: tmpD["mode"] == SZR_OUTP_MODE_CV,
+		"get_is_output_mode_cc": lambda tmpD: tmpD["mode"] == SZR_OUTP_MODE_CC
+	}
+
+# read-only functions that are answered without any command, they aren't cached
+_MUX_FUNCTIONS_LOCAL = ["get_hw_specs", "round_value"]
+
+# maximum amount of cached read results per device
+_MUX_CACHE_MAX = 256
+
+_MUX_FRAME_HEADER = struct.Struct("<I")
+_MUX_MAX_FRAME_LEN = 1024 * 1024
+
+# ------------------------------------------------------------------------------
+
+def mux_send_frame(sockObj, msgD):
+	""" Send one protocol frame
+
+	Parameters:
+		sockObj (socket.socket)
+		msgD (dict)
+	"""
+	payload = json.dumps(msgD, separators=(",", ":")).encode("utf-8")
+	sockObj.sendall(_MUX_FRAME_HEADER.pack(len(payload)) + payload)
+
+def mux_recv_frame(sockObj):
+	""" Receive one protocol frame
+
+	Parameters:
+		sockObj (socket.socket)
+	Returns:
+		dict|None: None if the connection has been closed
+	Raises:
+		ValueError
+	"""
+	tmpBy = _recv_exact(sockObj, _MUX_FRAME_HEADER.size)
+	if tmpBy is None:
+		return None
+	frameLen = _MUX_FRAME_HEADER.unpack(tmpBy)[0]
+	if frameLen > _MUX_MAX_FRAME_LEN:
+		raise ValueError("frame too long")
+	tmpBy = _recv_exact(sockObj, frameLen)
+	if tmpBy is None:
+		return None
+	return json.loads(tmpBy.decode("utf-8"))
+
+def _recv_exact(sockObj, size):
+	resBy = bytearray()
+	while len(resBy) < size:
+		tmpBy = sockObj.recv(size - len(resBy))
+		if not tmpBy:
+			return None
+		resBy += tmpBy
+	return bytes(resBy)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class MuxDaemon(object):
+	# maximum amount of requests per device that are executed as one batch
+	_BATCH_MAX = 32
+
+	def __init__(self, instruments, socketPath=MUX_DEFAULT_SOCKET_PATH, freshnessS=0.05):
+		""" Constructor
+
+		The daemon owns the instruments and serves many local clients
+		(see mux_client.MansonInstrumentClient) over a Unix domain socket.
+
+		Requests for one device are collected in one queue per client and
+		executed in batches, taking the requests from the clients in round-robin order.
+		Identical reads (e.g. all functions that are answered by GETD) within
+		one batch or within the freshness window are answered by only one command.
+		Every write invalidates the cached reads of the device.
+
+		Parameters:
+			instruments (dict): {deviceId: MansonInstrument}, instruments need to be connected already
+			socketPath (str): Path of the Unix domain socket
+			freshnessS (float): Maximum age of cached read results in seconds
+		"""
+		assert isinstance(instruments, dict), "instruments needs to be dict"
+		for deviceId in instruments:
+			assert isinstance(deviceId, str), "device IDs need to be strings"
+			assert isinstance(instruments[deviceId], MansonInstrument), "instruments need to be MansonInstrument objects"
+		assert isinstance(socketPath, str), "socketPath needs to be string"
+		assert isinstance(freshnessS, (int, float)) and freshnessS >= 0, "freshnessS needs to be int or float >= 0"
+		#
+		self._instruments = instruments
+		self._socketPath = socketPath
+		self._freshnessS = freshnessS
+		self._srvSock = None
+		self._threads = []
+		self._stopEvent = threading.Event()
+		self._clients = {}
+		self._clientsLock = threading.Lock()
+		self._nextClientId = 0
+		self._statsLock = threading.Lock()
+		self._stats = {"clients": 0, "requests": 0, "batches": 0, "executed": 0, "coalesced": 0, "errors": 0}
+		self._devSched = {}
+		for deviceId in instruments:
+			self._devSched[deviceId] = {
+					"cond": threading.Condition(),
+					"queues": {},  # clientId: deque of requests
+					"rr": collections.deque(),  # clientIds with pending requests
+					"cache": {}  # (function, args): (time, batchNo, result)
+				}
+
+	# --------------------------------------------------------------------------
+
+	def start(self):
+		""" Start serving in background threads """
+		if self._srvSock is not None:
+			return
+		if os.path.exists(self._socketPath):
+			os.unlink(self._socketPath)
+		self._stopEvent.clear()
+		self._srvSock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self._srvSock.bind(self._socketPath)
+		self._srvSock.listen(64)
+		self._start_thread(self._accept_loop, (), "MuxDaemon-accept")
+		for deviceId in self._instruments:
+			self._start_thread(self._device_loop, (deviceId,), "MuxDaemon-" + deviceId)
+
+	def serve_forever(self):
+		""" Start serving and block until stop() is called (e.g. from a signal handler) """
+		self.start()
+		while not self._stopEvent.wait(1.0):
+			pass
+
+	def stop(self):
+		""" Stop serving, disconnect all clients and remove the socket """
+		if self._srvSock is None:
+			return
+		self._stopEvent.set()
+		try:
+			self._srvSock.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		self._srvSock.close()
+		with self._clientsLock:
+			clientList = list(self._clients.values())
+		for clientCtx in clientList:
+			try:
+				clientCtx["sock"].shutdown(socket.SHUT_RDWR)
+			except OSError:
+				pass
+		for deviceId in self._devSched:
+			with self._devSched[deviceId]["cond"]:
+				self._devSched[deviceId]["cond"].notify_all()
+		for tmpThread in self._threads:
+			if tmpThread is not threading.current_thread():
+				tmpThread.join()
+		self._threads = []
+		self._srvSock = None
+		if os.path.exists(self._socketPath):
+			os.unlink(self._socketPath)
+
+	def get_stats(self):
+		""" Get statistics
+
+		Returns:
+			dict: {"clients": int, "requests": int, "batches": int, "executed": int, "coalesced": int, "errors": int}
+				"executed" is the amount of requests that have been executed on an instrument,
+				"coalesced" the amount of requests that have been answered from the cache
+		"""
+		with self._statsLock:
+			return dict(self._stats)
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _start_thread(self, targetFunc, args, name):
+		tmpThread = threading.Thread(target=targetFunc, args=args, name=name)
+		tmpThread.daemon = True
+		self._threads.append(tmpThread)
+		tmpThread.start()
+
+	def _inc_stat(self, key, val=1):
+		with self._statsLock:
+			self._stats[key] += val
+
+	def _accept_loop(self):
+		while not self._stopEvent.is_set():
+			try:
+				cliSock, _ = self._srvSock.accept()
+			except OSError:
+				return
+			with self._clientsLock:
+				clientId = self._nextClientId
+				self._nextClientId += 1
+				clientCtx = {"id": clientId, "sock": cliSock, "sendLock": threading.Lock()}
+				self._clients[clientId] = clientCtx
+			self._inc_stat("clients")
+			self._start_thread(self._client_loop, (clientCtx,), "MuxDaemon-client%d" % clientId)
+
+	def _client_loop(self, clientCtx):
+		try:
+			while not self._stopEvent.is_set():
+				try:
+					reqD = mux_recv_frame(clientCtx["sock"])
+				except (OSError, ValueError):
+					break
+				if reqD is None:
+					break
+				self._inc_stat("requests")
+				if not isinstance(reqD, dict):
+					self._send_response(clientCtx, {"i": None, "e": "invalid request", "t": "ValueError"})
+					continue
+				deviceId = reqD.get("d")
+				fnName = reqD.get("f")
+				if not isinstance(deviceId, str) or deviceId not in self._instruments:
+					self._send_response(clientCtx, {"i": reqD.get("i"), "e": "unknown device '%s'" % deviceId,
+							"t": "CouldNotConnectError"})
+					continue
+				if fnName == MUX_FN_ATTACH:
+					self._send_response(clientCtx, {"i": reqD.get("i"), "r": True})
+					continue
+				if fnName not in MUX_FUNCTIONS or not isinstance(reqD.get("a", []), list):
+					self._send_response(clientCtx, {"i": reqD.get("i"), "e": "invalid function '%s'" % fnName,
+							"t": "ValueError"})
+					continue
+				self._enqueue(deviceId, clientCtx, reqD)
+		finally:
+			with self._clientsLock:
+				del self._clients[clientCtx["id"]]
+			clientCtx["sock"].close()
+
+	def _enqueue(self, deviceId, clientCtx, reqD):
+		schedD = self._devSched[deviceId]
+		with schedD["cond"]:
+			clientId = clientCtx["id"]
+			if clientId not in schedD["queues"]:
+				schedD["queues"][clientId] = collections.deque()
+			tmpQueue = schedD["queues"][clientId]
+			if not tmpQueue:
+				schedD["rr"].append(clientId)
+			tmpQueue.append((clientCtx, reqD))
+			schedD["cond"].notify()
+
+	def _device_loop(self, deviceId):
+		schedD = self._devSched[deviceId]
+		batchNo = 0
+		while True:
+			batch = []
+			with schedD["cond"]:
+				while not schedD["rr"] and not self._stopEvent.is_set():
+					schedD["cond"].wait()
+				if self._stopEvent.is_set():
+					return
+				# one request per client and round
+				while schedD["rr"] and len(batch) < self._BATCH_MAX:
+					clientId = schedD["rr"].popleft()
+					tmpQueue = schedD["queues"][clientId]
+					batch.append(tmpQueue.popleft())
+					if tmpQueue:
+						schedD["rr"].append(clientId)
+					else:
+						del schedD["queues"][clientId]
+			batchNo += 1
+			self._inc_stat("batches")
+			for clientCtx, reqD in batch:
+				self._send_response(clientCtx, self._execute(deviceId, batchNo, reqD))
+
+	def _execute(self, deviceId, batchNo, reqD):
+		miObj = self._instruments[deviceId]
+		cacheD = self._devSched[deviceId]["cache"]
+		fnName = reqD["f"]
+		args = reqD.get("a", [])
+		try:
+			if fnName in _MUX_FUNCTIONS_LOCAL:
+				resVal = getattr(miObj, fnName)(*args)
+				self._inc_stat("executed")
+			elif fnName in MUX_FUNCTIONS_READ:
+				if fnName in _MUX_FUNCTIONS_GETD:
+					cacheKey = ("get_output_values", ())
+				else:
+					cacheKey = (fnName, json.dumps(args))
+				tmpNow = time.monotonic()
+				tmpEntry = cacheD.get(cacheKey)
+				if tmpEntry is not None and (tmpEntry[1] == batchNo or tmpNow - tmpEntry[0] <= self._freshnessS):
+					self._inc_stat("coalesced")
+					resVal = tmpEntry[2]
+				else:
+					resVal = getattr(miObj, cacheKey[0])(*args)
+					self._inc_stat("executed")
+					self._cache_insert(cacheD, cacheKey, (tmpNow, batchNo, resVal))
+				if fnName in _MUX_FUNCTIONS_GETD:
+					resVal = _MUX_FUNCTIONS_GETD[fnName](resVal)
+			else:
+				cacheD.clear()
+				resVal = getattr(miObj, fnName)(*args)
+				self._inc_stat("executed")
+			return {"i": reqD.get("i"), "r": resVal}
+		except Exception as err:
+			self._inc_stat("errors")
+			return {"i": reqD.get("i"), "e": str(err), "t": type(err).__name__}
+
+	def _cache_insert(self, cacheD, cacheKey, entryT):
+		""" Insert a read result and evict the expired ones
+
+		The entries are kept in the order of their insertion (i.e. by age).
+
+		Parameters:
+			cacheD (dict): {(function, args): (time, batchNo, result)}
+			cacheKey (tuple): (function, args)
+			entryT (tuple): (time, batchNo, result)
+		"""
+		cacheD.pop(cacheKey, None)
+		while cacheD:
+			oldKey = next(iter(cacheD))
+			oldEntry = cacheD[oldKey]
+			isExpired = (oldEntry[1] != entryT[1] and entryT[0] - oldEntry[0] > self._freshnessS)
+			if not isExpired and len(cacheD) < _MUX_CACHE_MAX:
+				break
+			del cacheD[oldKey]
+		cacheD[cacheKey] = entryT
+
+	def _send_response(self, clientCtx, respD):
+		try:
+			with clientCtx["sendLock"]:
+				mux_send_frame(clientCtx["sock"], respD)
+		except OSError:
+			pass
@@ -0,0 +1,361 @@
+#
+# by TS, Dec 2020
+#
+
+from concurrent.futures import ThreadPoolExecutor, wait as futures_wait
+from copy import deepcopy
+import json
+import os
+from serial.serialutil import SerialException as pyser_SerialException
+from serial.tools.list_ports import comports as pyser_get_comports
+import threading
+import time
+
+try:
+	from .exceptions import InstrumentError
+	from .manson_instrument import MansonInstrument
+except (ModuleNotFoundError, ImportError):
+	from exceptions import InstrumentError
+	from manson_instrument import MansonInstrument
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+PDISC_DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "manson_ps_serial_lib", "ports.json")
+
+# maximum age of cached identity information for open_instrument()
+# (e.g. memory presets could have been changed on the front panel)
+PDISC_DEFAULT_MAX_AGE_S = 24 * 3600.0
+
+PDISC_SOURCE_CACHE = "cache"
+PDISC_SOURCE_PROBE = "probe"
+
+_PDISC_CACHE_VERSION = 1
+_PDISC_BY_ID_DIR = "/dev/serial/by-id"
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def get_port_identity(portInfo, byIdMap=None):
+	""" Get a stable identity for a serial port that doesn't depend on
+	the order in which the adapters have been enumerated
+
+	Parameters:
+		portInfo (serial.tools.list_ports_common.ListPortInfo)
+		byIdMap (dict|None): {device: by-id path}, None for reading /dev/serial/by-id
+	Returns:
+		str|None: "sn:VID:PID:SERIAL", "byid:PATH" or "usb:VID:PID:LOCATION",
+			None if the port has no stable identity
+	"""
+	if byIdMap is None:
+		byIdMap = get_by_id_map()
+	if portInfo.vid is not None and portInfo.pid is not None and portInfo.serial_number:
+		return "sn:%04X:%04X:%s" % (portInfo.vid, portInfo.pid, portInfo.serial_number)
+	if portInfo.device in byIdMap:
+		return "byid:%s" % byIdMap[portInfo.device]
+	if portInfo.vid is not None and portInfo.pid is not None and portInfo.location:
+		return "usb:%04X:%04X:%s" % (portInfo.vid, portInfo.pid, portInfo.location)
+	return None
+
+def get_port_identity_for_device(comPort):
+	""" Get the stable identity of a serial port by its device path
+
+	Parameters:
+		comPort (str): e.g. "/dev/ttyUSB0" or a path in /dev/serial/by-id
+	Returns:
+		str|None
+	"""
+	tmpDev = os.path.realpath(comPort)
+	byIdMap = get_by_id_map()
+	for portInfo in pyser_get_comports(include_links=False):
+		if os.path.realpath(portInfo.device) == tmpDev:
+			return get_port_identity(portInfo, byIdMap)
+	if tmpDev in byIdMap:
+		return "byid:%s" % byIdMap[tmpDev]
+	return None
+
+def find_port_by_identity(identity):
+	""" Find the current device path of a serial port by its stable identity
+	(e.g. after the USB adapter has been re-enumerated)
+
+	Parameters:
+		identity (str): see get_port_identity()
+	Returns:
+		str|None: None if the port is not present
+	"""
+	assert isinstance(identity, str), "identity needs to be string"
+	#
+	if identity.startswith("byid:"):
+		tmpPath = identity[len("byid:"):]
+		return (tmpPath if os.path.exists(tmpPath) else None)
+	byIdMap = get_by_id_map()
+	for portInfo in pyser_get_comports(include_links=False):
+		if get_port_identity(portInfo, byIdMap) == identity:
+			return portInfo.device
+	return None
+
+def get_by_id_map():
+	""" Read the links in /dev/serial/by-id (Linux only)
+
+	Returns:
+		dict: {device: by-id path}
+	"""
+	resD = {}
+	if not os.path.isdir(_PDISC_BY_ID_DIR):
+		return resD
+	for tmpName in sorted(os.listdir(_PDISC_BY_ID_DIR)):
+		tmpPath = os.path.join(_PDISC_BY_ID_DIR, tmpName)
+		resD[os.path.realpath(tmpPath)] = tmpPath
+	return resD
+
+def get_candidate_ports():
+	""" Get all USB serial ports
+
+	Returns:
+		list: [serial.tools.list_ports_common.ListPortInfo, ...]
+	"""
+	return [x for x in pyser_get_comports(include_links=False) if x.manufacturer is not None or x.vid is not None]
+
+def probe_port(comPort, emulateModel=None):
+	""" Identify the instrument connected to a serial port
+
+	Parameters:
+		comPort (str)
+		emulateModel (str|None): optional Model ID for hardware emulation
+	Returns:
+		dict: {"model": str}
+	Raises:
+		InstrumentError
+		SerialException
+		OSError
+	"""
+	miObj = MansonInstrument()
+	# a port without a Manson instrument shouldn't keep the probe busy
+	miObj.set_io_policy(timeoutS=0.5, getRetries=0)
+	try:
+		miObj.open_port(comPort, emulateModel)
+		return {"model": miObj.get_hw_model()}
+	finally:
+		miObj.close_port()
+
+def discover_instruments(portInfos=None, cacheObj=None, deadlineS=2.0, refresh=False, emulateModel=None):
+	""" Identify the instruments connected to several serial ports
+
+	All ports that are not in the cache are probed in parallel.
+
+	Parameters:
+		portInfos (list|None): [ListPortInfo, ...], None for all USB serial ports
+		cacheObj (PortIdentityCache|None): Cache for the identification results, None for no caching
+		deadlineS (float): Maximum time for probing
+		refresh (bool): Probe all ports, even if they are in the cache
+		emulateModel (str|None): optional Model ID for hardware emulation
+	Returns:
+		list: [{"device": str, "identity": str|None, "model": str|None, "source": str, "error": str|None}, ...]
+	"""
+	assert cacheObj is None or isinstance(cacheObj, PortIdentityCache), "cacheObj needs to be PortIdentityCache or None"
+	assert isinstance(deadlineS, (int, float)) and deadlineS > 0.0, "deadlineS needs to be > 0"
+	#
+	if portInfos is None:
+		portInfos = get_candidate_ports()
+	byIdMap = get_by_id_map()
+	resArr = []
+	probeIxArr = []
+	for portInfo in portInfos:
+		tmpIdent = get_port_identity(portInfo, byIdMap)
+		resD = {"device": portInfo.device, "identity": tmpIdent, "model": None, "source": PDISC_SOURCE_PROBE, "error": None}
+		cachedD = None
+		if cacheObj is not None and tmpIdent is not None and not refresh:
+			cachedD = cacheObj.get(tmpIdent)
+		if cachedD is not None and cachedD.get("model"):
+			resD["model"] = cachedD["model"]
+			resD["source"] = PDISC_SOURCE_CACHE
+		else:
+			probeIxArr.append(len(resArr))
+		resArr.append(resD)
+	#
+	if probeIxArr:
+		executor = ThreadPoolExecutor(max_workers=len(probeIxArr))
+		futures = {executor.submit(probe_port, resArr[ix]["device"], emulateModel): ix for ix in probeIxArr}
+		doneSet, _ = futures_wait(futures.keys(), timeout=deadlineS)
+		# probes that are still running are left behind, they end on their own
+		executor.shutdown(wait=False)
+		for tmpFuture in futures:
+			resD = resArr[futures[tmpFuture]]
+			if tmpFuture not in doneSet:
+				resD["error"] = "timeout"
+				continue
+			try:
+				resD["model"] = tmpFuture.result()["model"]
+			except (pyser_SerialException, OSError, InstrumentError) as err:
+				# a single faulty port mustn't abort the discovery of the others
+				resD["error"] = ("%s %s" % (type(err).__name__, str(err))).strip()
+				continue
+			if cacheObj is not None and resD["identity"] is not None:
+				# another instrument is connected now, all other cached information is stale
+				cachedD = cacheObj.get(resD["identity"])
+				if cachedD is not None and cachedD.get("model") != resD["model"]:
+					cacheObj.invalidate(resD["identity"])
+				cacheObj.put(resD["identity"], {"model": resD["model"], "device": resD["device"]})
+		if cacheObj is not None:
+			cacheObj.save()
+	return resArr
+
+def open_instrument(comPort, cacheObj, identity=None, maxAgeS=PDISC_DEFAULT_MAX_AGE_S, emulateModel=None):
+	""" Open a MansonInstrument and skip the handshake if the port's identity
+	information is in the cache
+
+	The cached model is verified before the first command is sent
+	(see MansonInstrument.verify_identity()). If it doesn't match,
+	IdentityMismatchError is raised by that command and the caller should
+	call store_instrument_identity() to replace the stale cache entry.
+	Entries are refreshed when they are older than maxAgeS.
+
+	Parameters:
+		comPort (str)
+		cacheObj (PortIdentityCache)
+		identity (str|None): Identity of the port, None for get_port_identity_for_device()
+		maxAgeS (float): Maximum age of the cache entry
+		emulateModel (str|None): optional Model ID for hardware emulation
+	Returns:
+		MansonInstrument
+	Raises:
+		CouldNotConnectError
+	"""
+	assert isinstance(cacheObj, PortIdentityCache), "cacheObj needs to be PortIdentityCache"
+	#
+	if identity is None:
+		identity = get_port_identity_for_device(comPort)
+	miObj = MansonInstrument()
+	if identity is None:
+		miObj.open_port(comPort, emulateModel)
+		return miObj
+	#
+	cachedD = cacheObj.get(identity)
+	if cachedD is not None and (not cachedD.get("identityInfo") or
+			time.time() - cachedD.get("identityTime", 0.0) > maxAgeS):
+		cachedD = None
+	if cachedD is not None:
+		miObj.open_port(comPort, emulateModel, identityInfo=cachedD["identityInfo"])
+		if not miObj.is_identity_verified():
+			return miObj
+		# the cached information was not usable, the handshake has been done instead
+	else:
+		miObj.open_port(comPort, emulateModel)
+	store_instrument_identity(miObj, cacheObj, identity)
+	return miObj
+
+def store_instrument_identity(miObj, cacheObj, identity):
+	""" Store the identity information of an instrument in the cache
+	(e.g. after the memory presets have been changed or after an IdentityMismatchError)
+
+	Parameters:
+		miObj (MansonInstrument)
+		cacheObj (PortIdentityCache)
+		identity (str)
+	"""
+	identityInfo = miObj.get_identity_info(complete=True)
+	cacheObj.put(identity, {"model": identityInfo["model"], "identityInfo": identityInfo, "identityTime": time.time()})
+	cacheObj.save()
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class PortIdentityCache(object):
+	def __init__(self, filePath=PDISC_DEFAULT_CACHE_PATH):
+		""" Constructor
+
+		On-disk cache for information about the instruments connected to
+		serial ports, keyed by the port's identity (see get_port_identity()).
+
+		Parameters:
+			filePath (str): Path of the JSON file
+		"""
+		assert isinstance(filePath, str), "filePath needs to be string"
+		#
+		self._filePath = filePath
+		self._lock = threading.Lock()
+		self._entries = {}
+		self._isDirty = False
+		self._load()
+
+	# --------------------------------------------------------------------------
+
+	def get(self, identity):
+		""" Get the cached information for a port
+
+		Parameters:
+			identity (str)
+		Returns:
+			dict|None
+		"""
+		with self._lock:
+			tmpD = self._entries.get(identity)
+			return (None if tmpD is None else deepcopy(tmpD))
+
+	def put(self, identity, infoDict):
+		""" Add or update the cached information for a port
+
+		Parameters:
+			identity (str)
+			infoDict (dict): JSON serializable values
+		"""
+		assert isinstance(identity, str), "identity needs to be string"
+		assert isinstance(infoDict, dict), "infoDict needs to be dict"
+		#
+		with self._lock:
+			tmpD = self._entries.get(identity, {})
+			tmpD.update(deepcopy(infoDict))
+			tmpD["time"] = time.time()
+			self._entries[identity] = tmpD
+			self._isDirty = True
+
+	def invalidate(self, identity=None):
+		""" Remove the cached information for a port
+
+		Parameters:
+			identity (str|None): None for all ports
+		"""
+		with self._lock:
+			if identity is None:
+				self._entries = {}
+			else:
+				self._entries.pop(identity, None)
+			self._isDirty = True
+
+	def get_identities(self):
+		""" Get the identities of all cached ports
+
+		Returns:
+			list
+		"""
+		with self._lock:
+			return sorted(self._entries.keys())
+
+	def save(self):
+		""" Write the cache to disk (if it has been modified) """
+		with self._lock:
+			if not self._isDirty:
+				return
+			tmpDir = os.path.dirname(self._filePath)
+			if tmpDir:
+				os.makedirs(tmpDir, exist_ok=True)
+			tmpPath = "%s.%d.tmp" % (self._filePath, os.getpid())
+			with open(tmpPath, "w") as fileObj:
+				json.dump({"version": _PDISC_CACHE_VERSION, "ports": self._entries}, fileObj, indent=1, sort_keys=True)
+			os.replace(tmpPath, self._filePath)
+			self._isDirty = False
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _load(self):
+		try:
+			with open(self._filePath, "r") as fileObj:
+				tmpD = json.load(fileObj)
+		except (OSError, ValueError):
+			return
+		# a cache that cannot be used is simply discarded
+		if not isinstance(tmpD, dict) or tmpD.get("version") != _PDISC_CACHE_VERSION or \
+				not isinstance(tmpD.get("ports"), dict):
+			return
+		self._entries = {x: tmpD["ports"][x] for x in tmpD["ports"] if isinstance(tmpD["ports"][x], dict)}
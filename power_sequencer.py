@@ -0,0 +1,258 @@
+#
+# by TS, Dec 2020
+#
+
+import threading
+import time
+
+try:
+	from .manson_instrument import MansonInstrument
+except (ModuleNotFoundError, ImportError):
+	from manson_instrument import MansonInstrument
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+SEQ_ACTION_OUTPUT = "output"
+SEQ_ACTION_VOLT = "volt"
+SEQ_ACTION_CURR = "curr"
+
+SEQ_ACTIONS = [SEQ_ACTION_OUTPUT, SEQ_ACTION_VOLT, SEQ_ACTION_CURR]
+
+SEQ_STATUS_OK = "ok"
+SEQ_STATUS_ERROR = "error"
+SEQ_STATUS_SKIPPED = "skipped"
+
+# ------------------------------------------------------------------------------
+
+def build_sequence_step(rail, action, value, delayMs=0.0):
+	""" Build Power Sequence Step dictionary
+
+	The planned start time of a step is the planned start time of
+	the previous step plus delayMs. Steps with delayMs == 0 therefore
+	share the start time of their predecessor and are executed in parallel
+	if they belong to different rails.
+
+	Parameters:
+		rail (str): Name of the rail (see PowerSequencer constructor)
+		action (str): One of SEQ_ACTION_*
+		value (bool|float): Output state for SEQ_ACTION_OUTPUT, else Voltage/Current value
+		delayMs (float): Delay in milliseconds relative to the previous step
+	Returns:
+		dict
+	"""
+	assert isinstance(rail, str), "rail needs to be string"
+	assert action in SEQ_ACTIONS, "action needs to be one of SEQ_ACTION_*"
+	assert isinstance(delayMs, (int, float)) and delayMs >= 0, "delayMs needs to be int or float >= 0"
+	if action == SEQ_ACTION_OUTPUT:
+		assert value == True or value == False, "value needs to be bool for SEQ_ACTION_OUTPUT"
+	else:
+		assert isinstance(value, (int, float)), "value needs to be int or float"
+	#
+	return {
+			"rail": rail,
+			"action": action,
+			"value": value,
+			"delayMs": float(delayMs)
+		}
+
+def format_timing_report(report):
+	""" Format a timing report returned by PowerSequencer.run()
+
+	Parameters:
+		report (list)
+	Returns:
+		str
+	"""
+	assert isinstance(report, list), "report needs to be list"
+	#
+	resA = ["  # rail         action        value  planned[ms]   actual[ms]    delta[ms]  status"]
+	for entryR in report:
+		if entryR["action"] == SEQ_ACTION_OUTPUT:
+			valS = "on" if entryR["value"] else "off"
+		else:
+			valS = "%.3f" % entryR["value"]
+		if entryR["startMs"] is None:
+			actS = "-"
+			deltaS = "-"
+		else:
+			actS = "%.3f" % entryR["startMs"]
+			deltaS = "%+.3f" % entryR["deltaMs"]
+		resA.append("%3d %-12s %-8s %10s %12.3f %12s %12s  %s" % (
+				entryR["index"], entryR["rail"], entryR["action"], valS,
+				entryR["plannedMs"], actS, deltaS,
+				entryR["status"] + ("" if entryR["error"] is None else " (%s)" % entryR["error"])))
+	return "\n".join(resA)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class PowerSequencer(object):
+	# the last part of each wait is done by polling the clock
+	# since time.sleep() may oversleep by a few milliseconds
+	_SPIN_THRESHOLD_S = 0.002
+	# head start for the worker threads before the first step is due
+	_START_LEAD_S = 0.02
+
+	def __init__(self, rails):
+		""" Constructor
+
+		Parameters:
+			rails (dict): {railName: MansonInstrument}, instruments need to be connected already
+		"""
+		assert isinstance(rails, dict), "rails needs to be dict"
+		for railName in rails:
+			assert isinstance(railName, str), "rail names need to be strings"
+			assert isinstance(rails[railName], MansonInstrument), "rails need to be MansonInstrument objects"
+		#
+		self._rails = rails
+		self._steps = None
+		self._report = None
+
+	# --------------------------------------------------------------------------
+
+	def load_sequence(self, steps):
+		""" Load a sequence, compute the planned start times and pre-encode all commands
+
+		Parameters:
+			steps (list): List of dicts built with build_sequence_step()
+		Raises:
+			ValueError, FunctionNotSupportedForModelError
+		"""
+		assert isinstance(steps, list), "steps needs to be list"
+		#
+		self._steps = None
+		self._report = None
+		resA = []
+		plannedS = 0.0
+		for stepIx in range(len(steps)):
+			entryStep = steps[stepIx]
+			if entryStep["rail"] not in self._rails:
+				raise ValueError("unknown rail '%s' in step #%d" % (entryStep["rail"], stepIx))
+			plannedS += entryStep["delayMs"] / 1000.0
+			miObj = self._rails[entryStep["rail"]]
+			if entryStep["action"] == SEQ_ACTION_OUTPUT:
+				rawCmd = miObj.encode_output_state_cmd(entryStep["value"])
+			elif entryStep["action"] == SEQ_ACTION_VOLT:
+				rawCmd = miObj.encode_preset_voltage_cmd(entryStep["value"])
+			else:
+				rawCmd = miObj.encode_preset_current_cmd(entryStep["value"])
+			resA.append({
+					"index": stepIx,
+					"rail": entryStep["rail"],
+					"action": entryStep["action"],
+					"value": entryStep["value"],
+					"plannedS": plannedS,
+					"rawCmd": rawCmd
+				})
+		self._steps = resA
+
+	def run(self):
+		""" Run the loaded sequence
+
+		Steps of different rails are executed by one thread per rail.
+		Steps of the same rail are executed in the order in which they were defined.
+		If a step fails all remaining steps will be skipped.
+
+		Returns:
+			list: Timing report (see get_timing_report())
+		"""
+		if self._steps is None:
+			raise ValueError("need to call load_sequence() first")
+		#
+		report = []
+		stepsByRail = {}
+		for entryStep in self._steps:
+			report.append({
+					"index": entryStep["index"],
+					"rail": entryStep["rail"],
+					"action": entryStep["action"],
+					"value": entryStep["value"],
+					"plannedMs": entryStep["plannedS"] * 1000.0,
+					"startMs": None,
+					"endMs": None,
+					"deltaMs": None,
+					"status": SEQ_STATUS_SKIPPED,
+					"error": None
+				})
+			if entryStep["rail"] not in stepsByRail:
+				stepsByRail[entryStep["rail"]] = []
+			stepsByRail[entryStep["rail"]].append(entryStep)
+		#
+		abortEvent = threading.Event()
+		startTime = time.monotonic() + self._START_LEAD_S
+		threadList = []
+		for railName in stepsByRail:
+			tmpThread = threading.Thread(target=self._run_rail,
+					args=(railName, stepsByRail[railName], startTime, report, abortEvent),
+					name="PowerSequencer-" + railName)
+			tmpThread.daemon = True
+			threadList.append(tmpThread)
+		for tmpThread in threadList:
+			tmpThread.start()
+		for tmpThread in threadList:
+			tmpThread.join()
+		#
+		self._report = report
+		return report
+
+	def get_timing_report(self):
+		""" Get the timing report of the last run
+
+		Returns:
+			list: [{"index": int, "rail": str, "action": str, "value": bool|float,
+					"plannedMs": float, "startMs": float|None, "endMs": float|None,
+					"deltaMs": float|None, "status": str, "error": str|None}, ...]
+		"""
+		return self._report
+
+	def get_timing_summary(self):
+		""" Get a summary of the deviations between planned and actual start times of the last run
+
+		Returns:
+			dict: {"steps": int, "executed": int, "failed": int, "maxAbsDeltaMs": float, "meanDeltaMs": float}
+		"""
+		if self._report is None:
+			raise ValueError("need to call run() first")
+		#
+		deltaArr = [entryR["deltaMs"] for entryR in self._report if entryR["deltaMs"] is not None]
+		return {
+				"steps": len(self._report),
+				"executed": len(deltaArr),
+				"failed": len([entryR for entryR in self._report if entryR["status"] == SEQ_STATUS_ERROR]),
+				"maxAbsDeltaMs": max([abs(x) for x in deltaArr]) if deltaArr else 0.0,
+				"meanDeltaMs": (sum(deltaArr) / len(deltaArr)) if deltaArr else 0.0
+			}
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _run_rail(self, railName, steps, startTime, report, abortEvent):
+		miObj = self._rails[railName]
+		for entryStep in steps:
+			if abortEvent.is_set():
+				return
+			self._sleep_until(startTime + entryStep["plannedS"])
+			if abortEvent.is_set():
+				return
+			entryR = report[entryStep["index"]]
+			tmpStart = time.monotonic()
+			try:
+				miObj.send_encoded_set_cmd(entryStep["rawCmd"])
+				entryR["status"] = SEQ_STATUS_OK
+			except Exception as err:
+				entryR["status"] = SEQ_STATUS_ERROR
+				entryR["error"] = ("%s %s" % (type(err).__name__, str(err))).strip()
+				abortEvent.set()
+			tmpEnd = time.monotonic()
+			entryR["startMs"] = (tmpStart - startTime) * 1000.0
+			entryR["endMs"] = (tmpEnd - startTime) * 1000.0
+			entryR["deltaMs"] = entryR["startMs"] - entryR["plannedMs"]
+
+	def _sleep_until(self, deadline):
+		while True:
+			remS = deadline - time.monotonic()
+			if remS <= 0.0:
+				return
+			if remS > self._SPIN_THRESHOLD_S:
+				time.sleep(remS - self._SPIN_THRESHOLD_S)
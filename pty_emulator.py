@@ -0,0 +1,170 @@
+#
+# by TS, Dec 2020
+#
+
+import multiprocessing
+import os
+import selectors
+import threading
+
+if os.name == "posix":
+	import pty
+	import tty
+else:
+	pty = None
+	tty = None
+
+try:
+	from .emulated_instrument_serial import EmulatedInstrumentSerial, build_timing_model
+	from .exceptions import CouldNotConnectError, UnknownCommandError
+	from .models import get_hw_model_id as models_get_hw_model_id
+except (ModuleNotFoundError, ImportError):
+	from emulated_instrument_serial import EmulatedInstrumentSerial, build_timing_model
+	from exceptions import CouldNotConnectError, UnknownCommandError
+	from models import get_hw_model_id as models_get_hw_model_id
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+# how often replies are passed on while the wire-timing model delays them
+_PTYEMU_TIMING_POLL_S = 0.001
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class PtyEmulatorServer(object):
+	def __init__(self, modelIds, wireTiming=False):
+		""" Constructor
+
+		Serves emulated instruments on pseudo terminals, so that they
+		can be opened like real serial ports (POSIX only).
+
+		Parameters:
+			modelIds (list): One Model ID per emulated instrument
+			wireTiming (bool): Delay the replies like a real instrument
+					(see emulated_instrument_serial.build_timing_model())
+		Raises:
+			CouldNotConnectError
+		"""
+		assert isinstance(modelIds, list) and len(modelIds) > 0, "modelIds needs to be non-empty list"
+		assert wireTiming == True or wireTiming == False, "wireTiming needs to be bool"
+		#
+		if pty is None:
+			raise CouldNotConnectError("pseudo terminals not supported on '%s'" % os.name)
+		self._modelIds = [models_get_hw_model_id(x) for x in modelIds]
+		self._wireTiming = wireTiming
+		self._masterFds = []
+		self._slaveFds = []
+		self._devicePaths = []
+		for _ in self._modelIds:
+			masterFd, slaveFd = pty.openpty()
+			tty.setraw(slaveFd)
+			os.set_blocking(masterFd, False)
+			self._masterFds.append(masterFd)
+			# keeping the slave open prevents EIO on the master while no client has opened it
+			self._slaveFds.append(slaveFd)
+			self._devicePaths.append(os.ttyname(slaveFd))
+		self._wakeupR, self._wakeupW = os.pipe()
+		self._thread = None
+		self._process = None
+
+	# --------------------------------------------------------------------------
+
+	def get_device_paths(self):
+		""" Get the serial devices of the emulated instruments
+
+		Returns:
+			list: e.g. ["/dev/pts/5", ...]
+		"""
+		return list(self._devicePaths)
+
+	def get_model_ids(self):
+		""" Get the Model IDs of the emulated instruments
+
+		Returns:
+			list
+		"""
+		return list(self._modelIds)
+
+	def start(self, useProcess=False):
+		""" Start serving
+
+		Parameters:
+			useProcess (bool): Serve in a forked process instead of a thread
+					(keeps the emulation from competing with the caller for the GIL)
+		"""
+		if self._thread is not None or self._process is not None:
+			return
+		if useProcess:
+			self._process = multiprocessing.get_context("fork").Process(target=self._serve)
+			self._process.daemon = True
+			self._process.start()
+		else:
+			self._thread = threading.Thread(target=self._serve, name="PtyEmulatorServer")
+			self._thread.daemon = True
+			self._thread.start()
+
+	def is_running(self):
+		""" Is the server running?
+
+		Returns:
+			bool
+		"""
+		return self._thread is not None or self._process is not None
+
+	def stop(self):
+		""" Stop serving and close the pseudo terminals """
+		if not self._masterFds:
+			return
+		os.write(self._wakeupW, b"x")
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+		if self._process is not None:
+			self._process.join()
+			self._process = None
+		for tmpFd in self._masterFds + self._slaveFds + [self._wakeupR, self._wakeupW]:
+			os.close(tmpFd)
+		self._masterFds = []
+		self._slaveFds = []
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _serve(self):
+		selObj = selectors.DefaultSelector()
+		selObj.register(self._wakeupR, selectors.EVENT_READ, None)
+		emuArr = []
+		for ix in range(len(self._masterFds)):
+			emuObj = EmulatedInstrumentSerial(self._modelIds[ix])
+			if self._wireTiming:
+				emuObj.set_timing_model(build_timing_model(self._modelIds[ix]))
+			emuArr.append(emuObj)
+			selObj.register(self._masterFds[ix], selectors.EVENT_READ, ix)
+		# devices whose replies are (partly) still on the wire
+		delayedIxs = set()
+		while True:
+			for selKey, _ in selObj.select(_PTYEMU_TIMING_POLL_S if delayedIxs else None):
+				devIx = selKey.data
+				if devIx is None:
+					selObj.close()
+					return
+				try:
+					tmpBy = os.read(self._masterFds[devIx], 4096)
+				except (BlockingIOError, OSError):
+					continue
+				try:
+					emuArr[devIx].write(tmpBy)
+				except UnknownCommandError:
+					pass  # the real hardware doesn't respond either
+				delayedIxs.add(devIx)
+			for devIx in list(delayedIxs):
+				respBy = emuArr[devIx].read(emuArr[devIx].in_waiting)
+				if respBy:
+					try:
+						os.write(self._masterFds[devIx], respBy)
+					except (BlockingIOError, OSError):
+						pass
+				# read() may have received further bytes in the meantime
+				if emuArr[devIx].get_pending_count() == 0 and emuArr[devIx].in_waiting == 0:
+					delayedIxs.discard(devIx)
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from clock import MonotonicClock
+from emulated_instrument_serial import build_timing_model
+from exceptions import CouldNotConnectError, FunctionNotSupportedForModelError, InvalidModelError, UnsupportedModelError
+from manson_instrument import MansonInstrument, VIRTUAL_SERIAL_DEVICE
+from models import get_hw_model_id as models_get_hw_model_id, MODEL_LIST_SERIES_ALL
+from pty_emulator import PtyEmulatorServer
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Results file (see --output and --baseline):
+#
+#   {"version": 1, "python": str, "settings": {...},
+#    "results": {model: {transport: {command: {"cmds": str, "calls": int, "p50Ms": float,
+#            "p95Ms": float, "p99Ms": float, "maxMs": float, "meanMs": float, "throughput": float,
+#            "splitMs": {"encode": float, "wire": float, "decode": float, "sleep": float, "other": float}}
+#            or {"unsupported": true}}}}}
+#
+# "throughput" is in calls per second, "splitMs" holds the mean time per call spent
+# before the first I/O (encoding), in the transport (wire or emulator), after the
+# last I/O (decoding), in the clock's sleep() and elsewhere (e.g. between retries).
+
+BENCH_RESULTS_VERSION = 1
+
+BENCH_TRANSPORT_EMULATED = "emulated"
+BENCH_TRANSPORT_PTY = "pty"
+BENCH_TRANSPORT_REPLAY = "replay"
+
+BENCH_TRANSPORTS = [BENCH_TRANSPORT_EMULATED, BENCH_TRANSPORT_PTY, BENCH_TRANSPORT_REPLAY]
+
+BENCH_SPLIT_KEYS = ["encode", "wire", "decode", "sleep", "other"]
+
+_BENCH_WARMUP_CALLS = 2
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class _TimedClock(MonotonicClock):
+	def __init__(self):
+		""" Clock that records the intervals spent in sleep() """
+		self.sleeps = []  # [(startT, endT), ...]
+
+	def sleep(self, seconds):
+		startT = time.perf_counter()
+		MonotonicClock.sleep(self, seconds)
+		self.sleeps.append((startT, time.perf_counter()))
+
+class _TimedTransport(object):
+	def __init__(self, serObj):
+		""" Wraps the transport of a MansonInstrument and records the time spent in it """
+		self._serObj = serObj
+		self.ioS = 0.0
+		self.firstIoT = None
+		self.lastIoT = None
+		self.cmds = []
+
+	def __getattr__(self, name):
+		return getattr(self._serObj, name)
+
+	@property
+	def timeout(self):
+		return self._serObj.timeout
+
+	@timeout.setter
+	def timeout(self, value):
+		self._serObj.timeout = value
+
+	@property
+	def in_waiting(self):
+		return self._timed(lambda: self._serObj.in_waiting)
+
+	def reset(self):
+		self.ioS = 0.0
+		self.firstIoT = None
+		self.lastIoT = None
+		self.cmds = []
+
+	def flushInput(self):
+		return self._timed(self._serObj.flushInput)
+
+	def write(self, data):
+		self.cmds.append(bytes(data[:4]).decode("ascii", "replace"))
+		return self._timed(lambda: self._serObj.write(data))
+
+	def read(self, size=1):
+		return self._timed(lambda: self._serObj.read(size))
+
+	def read_until(self, expected=b"\n", size=None):
+		return self._timed(lambda: self._serObj.read_until(expected, size))
+
+	def _timed(self, fnc):
+		startT = time.perf_counter()
+		try:
+			return fnc()
+		finally:
+			endT = time.perf_counter()
+			self.ioS += endT - startT
+			if self.firstIoT is None:
+				self.firstIoT = startT
+			self.lastIoT = endT
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Measure the latency and throughput of single commands per model and transport",
+			epilog="Transports: %s (the replay transport replays a capture recorded with the emulator).%s"
+				"Latency regressions smaller than --min-delta-ms are ignored as noise." % (", ".join(BENCH_TRANSPORTS), os.linesep))
+	parser.add_argument("--model", default="HCS-3102", help="Comma separated HW Models to emulate or 'all', default=HCS-3102")
+	parser.add_argument("--transports", default=",".join(BENCH_TRANSPORTS),
+			help="Comma separated transports, default=" + ",".join(BENCH_TRANSPORTS))
+	parser.add_argument("--count", type=int, default=200, help="Calls per command, default=200")
+	parser.add_argument("--pty-count", type=int, default=10,
+			help="Calls per command on the pty transport (MansonInstrument waits after every command there), default=10")
+	parser.add_argument("--wire-timing", action="store_true", help="Delay the replies of the emulator like a real instrument")
+	parser.add_argument("--output", help="Write the results into this JSON file")
+	parser.add_argument("--baseline", help="Compare the results with a results file written by --output")
+	parser.add_argument("--max-latency-regression", type=float, default=25.0,
+			help="Maximum increase of the median/p95 latency in percent, default=25")
+	parser.add_argument("--max-throughput-regression", type=float, default=25.0,
+			help="Maximum decrease of the throughput in percent, default=25")
+	parser.add_argument("--min-delta-ms", type=float, default=0.05,
+			help="Minimum latency increase in milliseconds that counts as regression, default=0.05")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if args["count"] < 1 or args["pty_count"] < 1:
+		print("! Invalid count", file=sys.stderr)
+		sys.exit(1)
+	args["transports"] = [x.strip() for x in args["transports"].split(",") if x.strip()]
+	if not args["transports"] or [x for x in args["transports"] if x not in BENCH_TRANSPORTS]:
+		print("! Invalid transports", file=sys.stderr)
+		sys.exit(1)
+	if args["max_latency_regression"] < 0.0 or args["max_throughput_regression"] < 0.0 or args["min_delta_ms"] < 0.0:
+		print("! Invalid regression thresholds", file=sys.stderr)
+		sys.exit(1)
+	if args["model"] == "all":
+		args["model"] = list(MODEL_LIST_SERIES_ALL)
+	else:
+		try:
+			args["model"] = [models_get_hw_model_id(x.strip()) for x in args["model"].split(",")]
+		except (InvalidModelError, UnsupportedModelError) as err:
+			print("! Invalid HW Model %s" % str(err), file=sys.stderr)
+			sys.exit(1)
+	return args
+
+def _get_percentile(sortedArr, pct):
+	return sortedArr[min(len(sortedArr) - 1, int(round(pct / 100.0 * (len(sortedArr) - 1))))]
+
+def _build_ops(miObj):
+	""" Build the benchmarked operations
+
+	The SET commands write the current values again, so that the state of
+	the instrument (and the recorded capture for the replay) doesn't change.
+
+	Returns:
+		list: [(command, fnc), ...], fnc None if the command isn't supported
+	"""
+	def _get_or_none(fnc):
+		try:
+			return fnc()
+		except FunctionNotSupportedForModelError:
+			return None
+
+	presetD = _get_or_none(miObj.get_preset_voltage_current)
+	outpState = miObj.get_output_state()
+	memD = None
+	if miObj.get_hw_specs()["realMemPresetLocations"] > 0:
+		memD = _get_or_none(lambda: miObj.load_memory_preset(0))
+	return [
+			("GETD", miObj.get_output_values),
+			("GETS", miObj.get_preset_voltage_current if presetD is not None else None),
+			("GOUT", miObj.get_output_state),
+			("SOUT", lambda: miObj.set_output_state(outpState)),
+			("VOLT", (lambda: miObj.set_preset_voltage(presetD["volt"])) if presetD is not None else None),
+			("CURR", (lambda: miObj.set_preset_current(presetD["curr"])) if presetD is not None else None),
+			("GOVP", miObj.get_overvoltage_protection_value),
+			("GETM", (lambda: miObj.load_memory_preset(0)) if memD is not None else None),
+			("PROM", (lambda: miObj.save_memory_preset(0, memD["volt"], memD["curr"])) if memD is not None else None)
+		]
+
+def _open_instrument(comPort, emulateModel, clockObj, wireTiming):
+	miObj = MansonInstrument(clockObj=clockObj)
+	miObj.open_port(comPort, emulateModel)
+	if wireTiming and emulateModel is not None:
+		miObj._pyserObj.set_timing_model(build_timing_model(emulateModel))
+	# measure GETM/PROM on every call instead of serving them from the cache
+	miObj._enableMemPresetsCache = False
+	return miObj
+
+def _run_ops(miObj, count, isMeasured):
+	""" Run every operation (count + warm-up) times
+
+	Returns:
+		dict: {command: {"unsupported": True} or list of call dicts}
+	"""
+	resD = {}
+	for cmd, fnc in _build_ops(miObj):
+		if fnc is None:
+			resD[cmd] = {"unsupported": True}
+			continue
+		try:
+			for _ in range(_BENCH_WARMUP_CALLS):
+				fnc()
+		except FunctionNotSupportedForModelError:
+			resD[cmd] = {"unsupported": True}
+			continue
+		if not isMeasured:
+			for _ in range(count):
+				fnc()
+			continue
+		callArr = []
+		clockObj = miObj.get_clock()
+		trObj = miObj._pyserObj
+		loopStartT = time.perf_counter()
+		for _ in range(count):
+			trObj.reset()
+			clockObj.sleeps = []
+			startT = time.perf_counter()
+			fnc()
+			endT = time.perf_counter()
+			firstIoT = (trObj.firstIoT if trObj.firstIoT is not None else endT)
+			lastIoT = (trObj.lastIoT if trObj.lastIoT is not None else endT)
+			sleepS = sum([x[1] - x[0] for x in clockObj.sleeps])
+			sleepBeforeS = sum([x[1] - x[0] for x in clockObj.sleeps if x[1] <= firstIoT])
+			sleepAfterS = sum([x[1] - x[0] for x in clockObj.sleeps if x[0] >= lastIoT])
+			splitD = {
+					"encode": firstIoT - startT - sleepBeforeS,
+					"wire": trObj.ioS,
+					"decode": endT - lastIoT - sleepAfterS,
+					"sleep": sleepS
+				}
+			splitD["other"] = max(0.0, (endT - startT) - sum(splitD.values()))
+			callArr.append({"totalS": endT - startT, "split": splitD, "cmds": trObj.cmds})
+		loopS = time.perf_counter() - loopStartT
+		resD[cmd] = {"calls": callArr, "loopS": loopS}
+	return resD
+
+def _format_cmds(cmdsArr):
+	""" Format the commands sent by one call, e.g. "GETS x3,SETD" """
+	resA = []
+	for cmd in cmdsArr:
+		if resA and resA[-1][0] == cmd:
+			resA[-1][1] += 1
+		else:
+			resA.append([cmd, 1])
+	return ",".join([cmd + (" x%d" % cnt if cnt > 1 else "") for cmd, cnt in resA]) or "-"
+
+def _summarize(opsD):
+	resD = {}
+	for cmd in opsD:
+		if "unsupported" in opsD[cmd]:
+			resD[cmd] = {"unsupported": True}
+			continue
+		callArr = opsD[cmd]["calls"]
+		durArr = sorted([x["totalS"] for x in callArr])
+		resD[cmd] = {
+				"cmds": _format_cmds(callArr[0]["cmds"]),
+				"calls": len(callArr),
+				"p50Ms": _get_percentile(durArr, 50.0) * 1000.0,
+				"p95Ms": _get_percentile(durArr, 95.0) * 1000.0,
+				"p99Ms": _get_percentile(durArr, 99.0) * 1000.0,
+				"maxMs": durArr[-1] * 1000.0,
+				"meanMs": sum(durArr) / len(durArr) * 1000.0,
+				"throughput": len(callArr) / opsD[cmd]["loopS"],
+				"splitMs": {x: sum([y["split"][x] for y in callArr]) / len(callArr) * 1000.0 for x in BENCH_SPLIT_KEYS}
+			}
+	return resD
+
+def _run_transport(modelId, transport, args, tmpDir):
+	""" Run the benchmark of one model on one transport
+
+	Returns:
+		dict: {command: summary}, see the results file format
+	Raises:
+		CouldNotConnectError
+	"""
+	count = (args["pty_count"] if transport == BENCH_TRANSPORT_PTY else args["count"])
+	srvObj = None
+	if transport == BENCH_TRANSPORT_EMULATED:
+		comPort = VIRTUAL_SERIAL_DEVICE
+		emulateModel = modelId
+	elif transport == BENCH_TRANSPORT_PTY:
+		# a separate process keeps the emulator from competing for the GIL
+		srvObj = PtyEmulatorServer([modelId], wireTiming=args["wire_timing"])
+		srvObj.start(useProcess=True)
+		comPort = srvObj.get_device_paths()[0]
+		emulateModel = None
+	else:
+		capturePath = os.path.join(tmpDir, "%s.mwc" % modelId)
+		recMi = MansonInstrument()
+		recMi.start_capture(capturePath)
+		try:
+			recMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+			if args["wire_timing"]:
+				recMi._pyserObj.set_timing_model(build_timing_model(modelId))
+			recMi._enableMemPresetsCache = False
+			_run_ops(recMi, count, isMeasured=False)
+		finally:
+			recMi.close_port()
+		comPort = "replay://%s?timescale=%s" % (capturePath, ("1" if args["wire_timing"] else "0"))
+		emulateModel = None
+	try:
+		miObj = _open_instrument(comPort, emulateModel, _TimedClock(), args["wire_timing"])
+		try:
+			# waits inside the transport count as wire time
+			if hasattr(miObj._pyserObj, "set_clock"):
+				miObj._pyserObj.set_clock(MonotonicClock())
+			miObj._pyserObj = _TimedTransport(miObj._pyserObj)
+			return _summarize(_run_ops(miObj, count, isMeasured=True))
+		finally:
+			miObj.close_port()
+	finally:
+		if srvObj is not None:
+			srvObj.stop()
+
+def _print_results(modelId, transport, resD):
+	print("model=%s, transport=%s:" % (modelId, transport))
+	print("  cmd  sent           calls  p50[ms]  p95[ms]  p99[ms]  max[ms]    calls/s |" +
+			"".join(["%9s" % x for x in BENCH_SPLIT_KEYS]) + " [ms/call]")
+	for cmd in resD:
+		entryD = resD[cmd]
+		if "unsupported" in entryD:
+			print("  %-4s (not supported)" % cmd)
+			continue
+		print("  %-4s %-13s %6d %8.3f %8.3f %8.3f %8.3f %10.0f |%s" % (cmd, entryD["cmds"], entryD["calls"],
+				entryD["p50Ms"], entryD["p95Ms"], entryD["p99Ms"], entryD["maxMs"], entryD["throughput"],
+				"".join(["%9.3f" % entryD["splitMs"][x] for x in BENCH_SPLIT_KEYS])))
+
+def _compare_with_baseline(resultsD, baseD, args):
+	""" Compare results with a baseline
+
+	Only the entries that exist in both are compared.
+
+	Returns:
+		list: Descriptions of the regressions
+	"""
+	resArr = []
+	for modelId in resultsD:
+		for transport in resultsD[modelId]:
+			for cmd, entryD in resultsD[modelId][transport].items():
+				baseEntryD = baseD.get(modelId, {}).get(transport, {}).get(cmd)
+				if baseEntryD is None or "unsupported" in entryD or "unsupported" in baseEntryD:
+					continue
+				tmpS = "%s/%s/%s" % (modelId, transport, cmd)
+				for key in ("p50Ms", "p95Ms"):
+					deltaMs = entryD[key] - baseEntryD[key]
+					if deltaMs > args["min_delta_ms"] and deltaMs > baseEntryD[key] * args["max_latency_regression"] / 100.0:
+						resArr.append("%s: %s %.3fms -> %.3fms (%+.0f%%)" %
+								(tmpS, key, baseEntryD[key], entryD[key], deltaMs / baseEntryD[key] * 100.0))
+				if entryD["throughput"] < baseEntryD["throughput"] * (1.0 - args["max_throughput_regression"] / 100.0):
+					resArr.append("%s: throughput %.0f/s -> %.0f/s (%+.0f%%)" % (tmpS, baseEntryD["throughput"],
+							entryD["throughput"], (entryD["throughput"] / baseEntryD["throughput"] - 1.0) * 100.0))
+	return resArr
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	baseD = None
+	if args["baseline"]:
+		try:
+			with open(args["baseline"], "r") as fileObj:
+				baseD = json.load(fileObj)
+		except (OSError, ValueError) as err:
+			print("! Could not read baseline: %s" % str(err), file=sys.stderr)
+			sys.exit(1)
+		if baseD.get("version") != BENCH_RESULTS_VERSION:
+			print("! Invalid baseline version", file=sys.stderr)
+			sys.exit(1)
+	#
+	resultsD = {}
+	with tempfile.TemporaryDirectory() as tmpDir:
+		for modelId in args["model"]:
+			resultsD[modelId] = {}
+			for transport in args["transports"]:
+				try:
+					resD = _run_transport(modelId, transport, args, tmpDir)
+				except CouldNotConnectError as err:
+					print("! Skipping transport '%s': %s" % (transport, str(err)), file=sys.stderr)
+					continue
+				resultsD[modelId][transport] = resD
+				_print_results(modelId, transport, resD)
+	#
+	if args["output"]:
+		with open(args["output"], "w") as fileObj:
+			json.dump({
+					"version": BENCH_RESULTS_VERSION,
+					"python": platform.python_version(),
+					"settings": {"count": args["count"], "ptyCount": args["pty_count"], "wireTiming": args["wire_timing"]},
+					"results": resultsD
+				}, fileObj, indent=2)
+	if baseD is not None:
+		regressionArr = _compare_with_baseline(resultsD, baseD["results"], args)
+		print("Regressions compared with '%s': %d" % (args["baseline"], len(regressionArr)))
+		for tmpS in regressionArr:
+			print("  ! " + tmpS)
+		if regressionArr:
+			sys.exit(1)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from emulated_instrument_serial import EmulatedInstrumentSerial
+from models import get_hw_model_id as models_get_hw_model_id, TEST_MODEL_LIST
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Measure memory and speed of many emulated instruments in one process",
+			epilog="The memory is measured with tracemalloc (Python allocations only).")
+	parser.add_argument("--count", type=int, default=10000, help="Amount of emulated instruments, default=10000")
+	parser.add_argument("--model", default=None, help="HW Model to emulate, default=all test models round-robin")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if args["count"] < 1:
+		print("! Invalid count", file=sys.stderr)
+		sys.exit(1)
+	return args
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	modelIds = ([models_get_hw_model_id(args["model"])] if args["model"] is not None else TEST_MODEL_LIST)
+	# the shared per-model data isn't part of the per-instance figure
+	for modelId in modelIds:
+		EmulatedInstrumentSerial(modelId)
+	gc.collect()
+	tracemalloc.start()
+	startMem = tracemalloc.get_traced_memory()[0]
+	startTime = time.monotonic()
+	emuArr = [EmulatedInstrumentSerial(modelIds[ix % len(modelIds)]) for ix in range(args["count"])]
+	createS = time.monotonic() - startTime
+	gc.collect()
+	instMem = tracemalloc.get_traced_memory()[0] - startMem
+	tracemalloc.stop()
+	#
+	startTime = time.monotonic()
+	for emuObj in emuArr:
+		emuObj.write(b"GETD\r")
+		emuObj.read_until(b"OK\r")
+	cmdS = time.monotonic() - startTime
+	#
+	print("instances=%d, models=%s:" % (args["count"], ",".join(modelIds)))
+	print("  memory:   %.0f bytes per instance (%.1f MiB total)" % (instMem / float(args["count"]), instMem / 1048576.0))
+	print("  creation: %.1fus per instance" % (createS / args["count"] * 1e6))
+	print("  GETD:     %.0f commands/s" % (args["count"] / cmdS))
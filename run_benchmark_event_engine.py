@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import sys
+import time
+
+from event_engine import EventEngine
+from models import TEST_MODEL_LIST
+from pty_emulator import PtyEmulatorServer
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Poll many emulated instruments on pseudo terminals from a single thread",
+			epilog="The emulated instruments are served by a separate process.")
+	parser.add_argument("--devices", type=int, default=200, help="Amount of emulated instruments, default=200")
+	parser.add_argument("--duration", type=float, default=5.0, help="Duration of the benchmark in seconds, default=5")
+	parser.add_argument("--pace", type=float, default=0.0, help="Pause after each response in seconds, default=0")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if args["devices"] < 1:
+		print("! Invalid amount of devices", file=sys.stderr)
+		sys.exit(1)
+	if args["duration"] <= 0.0 or args["pace"] < 0.0:
+		print("! Invalid duration or pace", file=sys.stderr)
+		sys.exit(1)
+	return args
+
+def _get_percentile(sortedArr, pct):
+	return sortedArr[min(len(sortedArr) - 1, int(round(pct / 100.0 * (len(sortedArr) - 1))))]
+
+def _run_benchmark(devCount, durationS, paceS):
+	modelIds = [TEST_MODEL_LIST[ix % len(TEST_MODEL_LIST)] for ix in range(devCount)]
+	srvObj = PtyEmulatorServer(modelIds)
+	srvObj.start(useProcess=True)
+	engObj = EventEngine(paceS=paceS)
+	try:
+		for ix, comPort in enumerate(srvObj.get_device_paths()):
+			engObj.add_port("dev%03d" % ix, comPort, modelIds[ix])
+		#
+		endTime = time.monotonic() + durationS
+		def _on_values(portId, valD, err):
+			if time.monotonic() < endTime:
+				engObj.submit_get_output_values(portId, _on_values)
+		#
+		startTime = time.monotonic()
+		for portId in engObj.get_port_ids():
+			engObj.submit_get_output_values(portId, _on_values)
+		engObj.run_until_idle()
+		elapsedS = time.monotonic() - startTime
+		#
+		statsArr = [engObj.get_port_stats(portId) for portId in engObj.get_port_ids()]
+	finally:
+		engObj.close()
+		srvObj.stop()
+	#
+	totalCmds = sum([statsD["commands"] for statsD in statsArr])
+	totalTimeouts = sum([statsD["timeouts"] for statsD in statsArr])
+	p50Arr = sorted([statsD["latencyP50S"] for statsD in statsArr if statsD["latencyP50S"] is not None])
+	p95Arr = sorted([statsD["latencyP95S"] for statsD in statsArr if statsD["latencyP95S"] is not None])
+	print("devices=%d, duration=%.1fs, pace=%.3fs:" % (devCount, elapsedS, paceS))
+	print("  commands: %d (%.0f/s total, %.1f/s per port), timeouts: %d" %
+			(totalCmds, totalCmds / elapsedS, totalCmds / elapsedS / devCount, totalTimeouts))
+	if p50Arr:
+		print("  per-port median round-trip [ms]: min=%.2f median=%.2f max=%.2f" %
+				(p50Arr[0] * 1000.0, _get_percentile(p50Arr, 50.0) * 1000.0, p50Arr[-1] * 1000.0))
+		print("  per-port p95 round-trip [ms]:    min=%.2f median=%.2f max=%.2f" %
+				(p95Arr[0] * 1000.0, _get_percentile(p95Arr, 50.0) * 1000.0, p95Arr[-1] * 1000.0))
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	_run_benchmark(args["devices"], args["duration"], args["pace"])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import sys
+import time
+
+from emulated_instrument_serial import build_fault_schedule, build_timing_model, \
+		EIS_FAULT_CORRUPT, EIS_FAULT_DELAY, EIS_FAULT_DROP, EIS_FAULT_EXTRA_CR, EIS_FAULT_TRUNCATE
+from exceptions import InstrumentError
+from manson_instrument import MansonInstrument, VIRTUAL_SERIAL_DEVICE
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Measure throughput and recovery latency of an emulated instrument that injects faults",
+			epilog="Runs with the same seed inject the same faults into the same replies.")
+	parser.add_argument("--model", default="HCS-3102", help="HW Model to emulate, default=HCS-3102")
+	parser.add_argument("--count", type=int, default=500, help="Amount of commands, default=500")
+	parser.add_argument("--seed", type=int, default=1, help="Seed of the fault schedule, default=1")
+	parser.add_argument("--rate", type=float, default=0.01, help="Probability of each fault type per reply, default=0.01")
+	parser.add_argument("--timeout", type=float, default=0.1, help="Response timeout in seconds, default=0.1")
+	parser.add_argument("--retries", type=int, default=2, help="Retries of GET commands, default=2")
+	parser.add_argument("--wire-timing", action="store_true", help="Delay the replies like a real instrument")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if args["count"] < 1 or args["timeout"] <= 0.0 or args["retries"] < 0:
+		print("! Invalid count, timeout or retries", file=sys.stderr)
+		sys.exit(1)
+	if args["rate"] < 0.0 or args["rate"] * 5 > 1.0:
+		print("! Invalid rate", file=sys.stderr)
+		sys.exit(1)
+	return args
+
+def _get_percentile(sortedArr, pct):
+	return sortedArr[min(len(sortedArr) - 1, int(round(pct / 100.0 * (len(sortedArr) - 1))))]
+
+def _format_durations(durArr):
+	if not durArr:
+		return "-"
+	durArr = sorted(durArr)
+	return "median=%.2f p95=%.2f max=%.2f" % (_get_percentile(durArr, 50.0) * 1000.0,
+			_get_percentile(durArr, 95.0) * 1000.0, durArr[-1] * 1000.0)
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	miObj = MansonInstrument()
+	miObj.open_port(VIRTUAL_SERIAL_DEVICE, args["model"])
+	miObj.set_io_policy(timeoutS=args["timeout"], getRetries=args["retries"], backoffS=0.0)
+	emuObj = miObj._pyserObj
+	if args["wire_timing"]:
+		emuObj.set_timing_model(build_timing_model(args["model"]))
+	expD = miObj.get_output_values()
+	# every command may be sent (retries + 1) times
+	faultRates = {x: args["rate"] for x in (EIS_FAULT_DROP, EIS_FAULT_TRUNCATE, EIS_FAULT_CORRUPT,
+			EIS_FAULT_EXTRA_CR, EIS_FAULT_DELAY)}
+	emuObj.set_fault_schedule(build_fault_schedule(args["seed"], args["count"] * (args["retries"] + 1), faultRates),
+			seed=args["seed"], delayS=args["timeout"] * 2.0)
+	#
+	cleanDurArr = []
+	faultDurArr = []
+	errCnts = {}
+	wrongCnt = 0
+	startTime = time.monotonic()
+	try:
+		for _ in range(args["count"]):
+			faultCnt = len(emuObj.get_fault_log())
+			callStartTime = time.monotonic()
+			try:
+				if miObj.get_output_values() != expD:
+					wrongCnt += 1
+			except InstrumentError as err:
+				errCnts[type(err).__name__] = errCnts.get(type(err).__name__, 0) + 1
+			callDurS = time.monotonic() - callStartTime
+			if len(emuObj.get_fault_log()) != faultCnt:
+				faultDurArr.append(callDurS)
+			else:
+				cleanDurArr.append(callDurS)
+		elapsedS = time.monotonic() - startTime
+		ioStatsD = miObj.get_io_stats()
+	finally:
+		miObj.close_port()
+	#
+	faultCnts = {}
+	for entryD in emuObj.get_fault_log():
+		faultCnts[entryD["fault"]] = faultCnts.get(entryD["fault"], 0) + 1
+	okCnt = args["count"] - sum(errCnts.values())
+	print("model=%s, commands=%d, seed=%d, rate=%.3f per fault type:" %
+			(args["model"], args["count"], args["seed"], args["rate"]))
+	print("  injected: %s" % (", ".join(["%s=%d" % (x, faultCnts[x]) for x in sorted(faultCnts)]) or "-"))
+	print("  throughput: %.0f successful commands/s (%d of %d)" % (okCnt / elapsedS, okCnt, args["count"]))
+	print("  undetected wrong values: %d" % wrongCnt)
+	print("  errors: %s" % (", ".join(["%s=%d" % (x, errCnts[x]) for x in sorted(errCnts)]) or "-"))
+	print("  io stats: timeouts=%d retries=%d resyncs=%d" %
+			(ioStatsD["timeouts"], ioStatsD["retries"], ioStatsD["resyncs"]))
+	print("  latency without fault [ms]: %s" % _format_durations(cleanDurArr))
+	print("  latency with fault (recovery) [ms]: %s" % _format_durations(faultDurArr))
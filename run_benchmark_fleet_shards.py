@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import os
+import sys
+import time
+
+from fleet_shards import ShardedFleetPoller
+from models import TEST_MODEL_LIST
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Poll many emulated instruments with different amounts of worker processes",
+			epilog="The samples are read back from the shared memory table.")
+	parser.add_argument("--devices", type=int, default=64, help="Amount of emulated instruments, default=64")
+	parser.add_argument("--duration", type=float, default=3.0, help="Duration of each run in seconds, default=3")
+	parser.add_argument("--rate", type=float, default=1000.0, help="Sample rate per device in Hz, default=1000")
+	parser.add_argument("--workers", default=None,
+			help="Comma separated amounts of worker processes, default=1,2,4,... up to the amount of CPU cores")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if args["devices"] < 1 or args["duration"] <= 0.0 or args["rate"] <= 0.0:
+		print("! Invalid devices, duration or rate", file=sys.stderr)
+		sys.exit(1)
+	if args["workers"] is None:
+		cpuCnt = os.cpu_count() or 1
+		args["workers"] = [1]
+		while args["workers"][-1] * 2 <= cpuCnt:
+			args["workers"].append(args["workers"][-1] * 2)
+		if args["workers"][-1] != cpuCnt:
+			args["workers"].append(cpuCnt)
+	else:
+		try:
+			args["workers"] = [int(x) for x in args["workers"].split(",")]
+		except ValueError:
+			args["workers"] = [0]
+		if min(args["workers"]) < 1:
+			print("! Invalid workers", file=sys.stderr)
+			sys.exit(1)
+	return args
+
+def _get_update_count(pollObj):
+	return sum([rowD["updates"] for rowD in pollObj.get_table().read_all().values() if rowD is not None])
+
+def _run_benchmark(devCount, durationS, rateHz, workers):
+	devices = {"dev%03d" % ix: "emulated://" + TEST_MODEL_LIST[ix % len(TEST_MODEL_LIST)] for ix in range(devCount)}
+	pollObj = ShardedFleetPoller(devices, workers=workers, rateHz=rateHz, outpStateEvery=0)
+	pollObj.start()
+	try:
+		startCnt = _get_update_count(pollObj)
+		startTime = time.monotonic()
+		time.sleep(durationS)
+		totalCnt = _get_update_count(pollObj) - startCnt
+		elapsedS = time.monotonic() - startTime
+	finally:
+		pollObj.stop()
+	errCnt = sum([statsD["errors"] for statsD in pollObj.get_stats().values()])
+	return (totalCnt / elapsedS, errCnt)
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	print("devices=%d, duration=%.1fs, rate=%.0fHz per device:" % (args["devices"], args["duration"], args["rate"]))
+	baseRate = None
+	for workers in args["workers"]:
+		samplesPerS, errCnt = _run_benchmark(args["devices"], args["duration"], args["rate"], workers)
+		if baseRate is None:
+			baseRate = samplesPerS
+		print("  workers=%2d: %9.0f samples/s (x%.2f), errors: %d" %
+				(workers, samplesPerS, (samplesPerS / baseRate if baseRate else 0.0), errCnt))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import sys
+
+from manson_instrument import MansonInstrument, VIRTUAL_SERIAL_DEVICE
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Compare the round-trip latency of a real instrument with and without low-latency settings",
+			epilog="Changing the settings may need root privileges (or a udev rule for the latency_timer).")
+	parser.add_argument("--count", type=int, default=50, help="Amount of commands per run, default=50")
+	parser.add_argument("--emulate", default=None, help="HW Model to emulate instead of using a real instrument")
+	parser.add_argument("COMPORT", nargs="?", default=None, help="Serial port of real instrument")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if args["COMPORT"] is None and args["emulate"] is None:
+		print("! Missing serial port", file=sys.stderr)
+		sys.exit(1)
+	if args["count"] < 1:
+		print("! Invalid count", file=sys.stderr)
+		sys.exit(1)
+	return args
+
+def _get_percentile(sortedArr, pct):
+	return sortedArr[min(len(sortedArr) - 1, int(round(pct / 100.0 * (len(sortedArr) - 1))))]
+
+def _run_benchmark(comPort, emulateModel, lowLatency, count):
+	miObj = MansonInstrument()
+	miObj.open_port(comPort, emulateModel, lowLatency=lowLatency)
+	try:
+		settingsD = miObj.get_low_latency_settings()
+		rttArr = []
+		for _ in range(count):
+			miObj.get_output_values()
+			rttArr.append(miObj.get_io_stats()["lastRoundTripS"])
+	finally:
+		miObj.close_port()
+	rttArr.sort()
+	print("lowLatency=%s:" % str(lowLatency))
+	if settingsD is not None:
+		print("  settings: ASYNC_LOW_LATENCY %s -> %s, latency_timer %s -> %s" %
+				(settingsD["origAsyncLowLatency"], settingsD["asyncLowLatency"],
+				settingsD["origLatencyTimerMs"], settingsD["latencyTimerMs"]))
+		for errMsg in settingsD["errors"]:
+			print("  ! %s" % errMsg)
+	print("  round-trip [ms]: min=%.2f median=%.2f p95=%.2f max=%.2f" %
+			(rttArr[0] * 1000.0, _get_percentile(rttArr, 50.0) * 1000.0,
+			_get_percentile(rttArr, 95.0) * 1000.0, rttArr[-1] * 1000.0))
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	comPort = args["COMPORT"]
+	if args["emulate"] is not None:
+		comPort = VIRTUAL_SERIAL_DEVICE
+	for lowLatency in (False, True):
+		_run_benchmark(comPort, args["emulate"], lowLatency, args["count"])
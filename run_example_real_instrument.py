@@ -9,6 +9,7 @@ from serial.tools.list_ports import comports as pyser_get_comports
 import sys
 
 from manson_instrument import MansonInstrument
+from port_discovery import PortIdentityCache, discover_instruments
 
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -17,7 +18,9 @@ def _get_parsed_args():
 	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
 			description="Run an example for real hardware",
 			epilog="")
-	parser.add_argument("COMPORT", help="Serial port of real instrument (use 'list' to see available ports)")
+	parser.add_argument("--refresh", action="store_true", help="Ignore cached identification results when discovering")
+	parser.add_argument("COMPORT", help="Serial port of real instrument (use 'list' to see available ports, " +
+			"'discover' to identify the instruments on all ports)")
 	#
 	args = parser.parse_args()
 	args = vars(args)  # convert into dict
@@ -50,6 +53,17 @@ def _get_parsed_args():
 				print("    vid/pid      = %s / %s (%s / %s)" % \
 						(entryCp.vid, entryCp.pid, vidHex, pidHex))
 		sys.exit(0)
+	if args["COMPORT"] and (args["COMPORT"] == "d" or args["COMPORT"] == "discover"):
+		print("Instruments:")
+		resArr = discover_instruments(cacheObj=PortIdentityCache(), refresh=args["refresh"])
+		if not resArr:
+			print("  --none found--")
+		for entryRes in resArr:
+			if entryRes["error"] is not None:
+				print("  %s: ! %s" % (entryRes["device"], entryRes["error"]))
+			else:
+				print("  %s: %s (%s)" % (entryRes["device"], entryRes["model"], entryRes["source"]))
+		sys.exit(0)
 	#
 	if not args["COMPORT"]:
 		print("! Missing serial port", file=sys.stderr)
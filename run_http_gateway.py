@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import signal
+import sys
+
+from fleet_poller import FleetPoller
+from http_gateway import HttpGateway, HTTPGW_DEFAULT_PORT
+from manson_instrument import MansonInstrument, VIRTUAL_SERIAL_DEVICE
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Run an HTTP/JSON gateway for a fleet of instruments",
+			epilog="The COMPORTs are used as device IDs.\n" +
+					"Emulated devices are named '%s-0', '%s-1', ..." % (VIRTUAL_SERIAL_DEVICE, VIRTUAL_SERIAL_DEVICE))
+	parser.add_argument("--host", default="127.0.0.1", help="Address to listen on, default=127.0.0.1")
+	parser.add_argument("--port", type=int, default=HTTPGW_DEFAULT_PORT, help="Port to listen on, default=%d" % HTTPGW_DEFAULT_PORT)
+	parser.add_argument("--poll-hz", type=float, default=0.0, help="Rate for polling all devices in the background (0 = disabled), default=0")
+	parser.add_argument("--emulate", action="append", default=[], help="HW Model to emulate (can be used multiple times)")
+	parser.add_argument("COMPORT", nargs="*", help="Serial ports of real instruments")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if not args["COMPORT"] and not args["emulate"]:
+		print("! Missing serial ports", file=sys.stderr)
+		sys.exit(1)
+	if args["poll_hz"] < 0.0:
+		print("! Invalid polling rate", file=sys.stderr)
+		sys.exit(1)
+	return args
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	instruments = {}
+	for comPort in args["COMPORT"]:
+		print("Open serial port '%s'..." % comPort)
+		miObj = MansonInstrument()
+		miObj.open_port(comPort)
+		instruments[comPort] = miObj
+	for emuIx in range(len(args["emulate"])):
+		deviceId = "%s-%d" % (VIRTUAL_SERIAL_DEVICE, emuIx)
+		print("Open emulated device '%s' (%s)..." % (deviceId, args["emulate"][emuIx]))
+		miObj = MansonInstrument()
+		miObj.open_port(VIRTUAL_SERIAL_DEVICE, args["emulate"][emuIx])
+		instruments[deviceId] = miObj
+	#
+	pollObj = None
+	if args["poll_hz"] > 0.0:
+		pollObj = FleetPoller(instruments, rateHz=args["poll_hz"])
+		pollObj.start()
+	gwObj = HttpGateway(instruments, host=args["host"], port=args["port"], poller=pollObj)
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	print("Serving on http://%s:%d" % (args["host"], gwObj.get_port()))
+	try:
+		gwObj.serve_forever()
+	except (KeyboardInterrupt, SystemExit):
+		pass
+	gwObj.stop()
+	if pollObj is not None:
+		pollObj.stop()
+	for deviceId in instruments:
+		instruments[deviceId].close_port()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import signal
+import sys
+
+from manson_instrument import MansonInstrument, VIRTUAL_SERIAL_DEVICE
+from mux_daemon import MuxDaemon, MUX_DEFAULT_SOCKET_PATH
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Run a daemon that owns the serial ports and serves local clients over a Unix domain socket",
+			epilog="Clients use mux_client.MansonInstrumentClient with the COMPORT as device ID.\n" +
+					"Emulated devices are named '%s-0', '%s-1', ..." % (VIRTUAL_SERIAL_DEVICE, VIRTUAL_SERIAL_DEVICE))
+	parser.add_argument("--socket", default=MUX_DEFAULT_SOCKET_PATH, help="Path of the Unix domain socket, default=" + MUX_DEFAULT_SOCKET_PATH)
+	parser.add_argument("--freshness-ms", type=float, default=50.0, help="Maximum age of shared read results, default=50")
+	parser.add_argument("--emulate", action="append", default=[], help="HW Model to emulate (can be used multiple times)")
+	parser.add_argument("COMPORT", nargs="*", help="Serial ports of real instruments")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if not args["COMPORT"] and not args["emulate"]:
+		print("! Missing serial ports", file=sys.stderr)
+		sys.exit(1)
+	return args
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	instruments = {}
+	for comPort in args["COMPORT"]:
+		print("Open serial port '%s'..." % comPort)
+		miObj = MansonInstrument()
+		miObj.open_port(comPort)
+		instruments[comPort] = miObj
+	for emuIx in range(len(args["emulate"])):
+		deviceId = "%s-%d" % (VIRTUAL_SERIAL_DEVICE, emuIx)
+		print("Open emulated device '%s' (%s)..." % (deviceId, args["emulate"][emuIx]))
+		miObj = MansonInstrument()
+		miObj.open_port(VIRTUAL_SERIAL_DEVICE, args["emulate"][emuIx])
+		instruments[deviceId] = miObj
+	#
+	daemonObj = MuxDaemon(instruments, socketPath=args["socket"], freshnessS=args["freshness_ms"] / 1000.0)
+	signal.signal(signal.SIGTERM, lambda signum, frame: daemonObj.stop())
+	print("Serving on '%s'" % args["socket"])
+	try:
+		daemonObj.serve_forever()
+	except KeyboardInterrupt:
+		daemonObj.stop()
+	print("Stats: %s" % str(daemonObj.get_stats()))
+	for deviceId in instruments:
+		instruments[deviceId].close_port()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+#
+# by TS, Dec 2020
+#
+
+import argparse
+import signal
+import sys
+
+from exceptions import InvalidModelError, UnsupportedModelError
+from models import get_hw_model_id as models_get_hw_model_id, TEST_MODEL_LIST
+from pty_emulator import PtyEmulatorServer
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_parsed_args():
+	parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+			description="Serve emulated instruments on pseudo terminals (POSIX only)",
+			epilog="The device paths can be used like real serial ports, e.g. with run_mux_daemon.py.\n" +
+					"Without MODELs the test models are used round-robin.")
+	parser.add_argument("--count", type=int, default=None, help="Amount of emulated instruments, default=amount of MODELs")
+	parser.add_argument("--wire-timing", action="store_true", help="Delay the replies like a real instrument")
+	parser.add_argument("--process", action="store_true", help="Serve from a separate process")
+	parser.add_argument("MODEL", nargs="*", help="HW Models to emulate (used round-robin)")
+	#
+	args = parser.parse_args()
+	args = vars(args)  # convert into dict
+	#
+	if not args["MODEL"]:
+		args["MODEL"] = TEST_MODEL_LIST
+	if args["count"] is None:
+		args["count"] = len(args["MODEL"])
+	if args["count"] < 1:
+		print("! Invalid count", file=sys.stderr)
+		sys.exit(1)
+	for modelId in args["MODEL"]:
+		try:
+			models_get_hw_model_id(modelId)
+		except (InvalidModelError, UnsupportedModelError):
+			print("! Invalid model '%s'" % modelId, file=sys.stderr)
+			sys.exit(1)
+	return args
+
+if __name__ == "__main__":
+	args = _get_parsed_args()
+	#
+	modelIds = [args["MODEL"][ix % len(args["MODEL"])] for ix in range(args["count"])]
+	srvObj = PtyEmulatorServer(modelIds, wireTiming=args["wire_timing"])
+	srvObj.start(useProcess=args["process"])
+	for ix, devPath in enumerate(srvObj.get_device_paths()):
+		print("%s %s" % (devPath, srvObj.get_model_ids()[ix]))
+	sys.stdout.flush()
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	try:
+		while True:
+			signal.pause()
+	except (KeyboardInterrupt, SystemExit):
+		pass
+	srvObj.stop()
@@ -5,8 +5,14 @@
 #
 
 import argparse
+from concurrent.futures import as_completed, ProcessPoolExecutor
+import contextlib
+import io
+import json
+import os
 from os import linesep
 import sys
+import time
 
 from exceptions import InvalidModelError, UnsupportedModelError
 from models import get_hw_model_id as models_get_hw_model_id, \
@@ -25,6 +31,10 @@ def _get_parsed_args():
 	parser.add_argument("--list-tt", action="store_true", help="List options for --tt")
 	parser.add_argument("--mod", help="HW Model to emulate (e.g. '%s') (see --list-mod)" % TEST_MODEL_LIST[0])
 	parser.add_argument("--list-mod", action="store_true", help="List available HW Models")
+	parser.add_argument("--jobs", type=int, default=1,
+			help="Amount of worker processes for running the (model, test type) pairs in parallel, " +
+				"0 for one per CPU, default=1 (sequential, stops at the first failure)")
+	parser.add_argument("--report", help="Write the results and timings of a parallel run into this JSON file")
 	#
 	args = parser.parse_args()
 	args = vars(args)  # convert into dict
@@ -55,6 +65,17 @@ def _get_parsed_args():
 	else:
 		args["tt"] = TEST_TYPE_KEY_ALL
 	#
+	if args["jobs"] < 0:
+		print("! Invalid amount of jobs", file=sys.stderr)
+		sys.exit(1)
+	if args["report"] and args["jobs"] == 1:
+		print("! --report needs --jobs != 1", file=sys.stderr)
+		sys.exit(1)
+	# --jobs 0 always runs in the process pool, even with only one CPU
+	args["parallel"] = (args["jobs"] != 1)
+	if args["jobs"] == 0:
+		args["jobs"] = os.cpu_count() or 1
+	#
 	if args["mod"] and args["mod"] != "all":
 		try:
 			models_get_hw_model_id(args["mod"])
@@ -62,6 +83,86 @@ def _get_parsed_args():
 			print("! Warning: Unknown HW Model '%s'" % args["mod"], file=sys.stderr)
 	return args
 
+def _run_test_in_worker(modelId, testType):
+	""" Run one test type for one model (in a worker process) and capture its output
+
+	Parameters:
+		modelId (str)
+		testType (str)
+	Returns:
+		dict: {"model": str, "testType": str, "ok": bool, "durationS": float, "output": str}
+	"""
+	outpIo = io.StringIO()
+	startTime = time.monotonic()
+	with contextlib.redirect_stdout(outpIo), contextlib.redirect_stderr(outpIo):
+		isOk = TestMansonInstrument().runtest(testType, serialDevice=None, emulateModel=modelId)
+	return {
+			"model": modelId,
+			"testType": testType,
+			"ok": isOk,
+			"durationS": time.monotonic() - startTime,
+			"output": outpIo.getvalue()
+		}
+
+def _run_tests_in_parallel(modelList, testTypeList, jobs, reportPath):
+	""" Run all (model, test type) pairs in a process pool and print a merged report
+
+	Unlike the sequential run all pairs are run, also after a failure.
+
+	Parameters:
+		modelList (list)
+		testTypeList (list)
+		jobs (int): Amount of worker processes
+		reportPath (str|None): JSON file for the results
+	Returns:
+		bool: True if all tests have passed
+	"""
+	pairs = [(entryModel, entryTt) for entryModel in modelList for entryTt in testTypeList]
+	resultsD = {}
+	startTime = time.monotonic()
+	with ProcessPoolExecutor(max_workers=jobs) as executor:
+		futures = {executor.submit(_run_test_in_worker, entryModel, entryTt): (entryModel, entryTt)
+				for entryModel, entryTt in pairs}
+		for futureObj in as_completed(futures):
+			entryModel, entryTt = futures[futureObj]
+			try:
+				resD = futureObj.result()
+			except Exception as err:
+				# e.g. a crashed worker process
+				resD = {"model": entryModel, "testType": entryTt, "ok": False, "durationS": 0.0,
+						"output": "! Worker failed: %s %s" % (type(err).__name__, str(err))}
+			resultsD[(entryModel, entryTt)] = resD
+			print("[%3d/%3d] %-4s %-16s %-4s %7.2fs" % (len(resultsD), len(pairs),
+					("OK" if resD["ok"] else "FAIL"), entryModel, entryTt, resD["durationS"]))
+	wallS = time.monotonic() - startTime
+	resultArr = [resultsD[entryP] for entryP in pairs]
+	failedArr = [resD for resD in resultArr if not resD["ok"]]
+	#
+	for resD in failedArr:
+		print("")
+		print("-" * 60)
+		print("++++ MODEL '%s' - TEST '%s' - FAILED ++++" % (resD["model"], resD["testType"]))
+		print("")
+		print(resD["output"], end="")
+	print("")
+	print("-" * 60)
+	print("Slowest test types (summed over all models):")
+	ttDurD = {}
+	for resD in resultArr:
+		ttDurD[resD["testType"]] = ttDurD.get(resD["testType"], 0.0) + resD["durationS"]
+	for entryTt in sorted(ttDurD, key=lambda x: ttDurD[x], reverse=True)[:10]:
+		print("  %3s: %7.2fs" % (entryTt, ttDurD[entryTt]))
+	sumS = sum([resD["durationS"] for resD in resultArr])
+	print("Tests: %d passed, %d failed" % (len(resultArr) - len(failedArr), len(failedArr)))
+	print("Time: %.2fs wall, %.2fs summed over %d jobs (speedup %.1fx)" % (wallS, sumS, jobs, sumS / wallS))
+	for resD in failedArr:
+		print("! FAILED: model '%s', test '%s'" % (resD["model"], resD["testType"]), file=sys.stderr)
+	#
+	if reportPath:
+		with open(reportPath, "w") as fileObj:
+			json.dump({"jobs": jobs, "wallS": wallS, "results": resultArr}, fileObj, indent=2)
+	return not failedArr
+
 if __name__ == "__main__":
 	args = _get_parsed_args()
 	#
@@ -73,17 +174,19 @@ if __name__ == "__main__":
 		modelList = MODEL_LIST_SERIES_ALL
 	else:
 		modelList.append(args["mod"])
+	testTypeList = []
+	if args["tt"] == TEST_TYPE_KEY_ALL:
+		testTypeList = ALL_TEST_TYPE_KEYS
+	else:
+		testTypeList.append(args["tt"])
+	if args["parallel"]:
+		sys.exit(0 if _run_tests_in_parallel(modelList, testTypeList, args["jobs"], args["report"]) else 1)
 	for entryModel in modelList:
 		print("")
 		print("-" * 80)
 		print("++ MODEL '%s' ++" % entryModel)
 		print("")
 		tmiObj = TestMansonInstrument()
-		testTypeList = []
-		if args["tt"] == TEST_TYPE_KEY_ALL:
-			testTypeList = ALL_TEST_TYPE_KEYS
-		else:
-			testTypeList.append(args["tt"])
 		for entryTt in testTypeList:
 			print("")
 			print("-" * 60)
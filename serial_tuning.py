@@ -0,0 +1,120 @@
+#
+# by TS, Dec 2020
+#
+
+import array
+import os
+import sys
+
+if sys.platform.startswith("linux"):
+	import fcntl
+	import termios
+else:
+	fcntl = None
+	termios = None
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Low-latency settings for USB serial adapters on Linux:
+#
+#   ASYNC_LOW_LATENCY   flag in the kernel's serial_struct (TIOCGSERIAL/TIOCSSERIAL),
+#                       makes the driver push received data to the tty immediately
+#   latency_timer       sysfs attribute of FTDI adapters (default 16ms),
+#                       the adapter buffers received data for up to this long
+
+ASYNC_LOW_LATENCY = 0x2000
+
+SERT_LATENCY_TIMER_MS = 1
+
+_SERT_SERIAL_STRUCT_INTS = 32
+_SERT_FLAGS_IX = 4
+_SERT_SYSFS_PATH = "/sys/bus/usb-serial/devices/%s/latency_timer"
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def apply_low_latency(serObj, comPort):
+	""" Apply the low-latency settings where possible
+
+	Parameters:
+		serObj (serial.Serial): Opened serial port
+		comPort (str): Device path of the serial port
+	Returns:
+		dict: {"asyncLowLatency": bool|None, "latencyTimerMs": int|None,
+				"origAsyncLowLatency": bool|None, "origLatencyTimerMs": int|None, "errors": list}
+			None for settings that are not supported by the port
+	"""
+	resD = {"asyncLowLatency": None, "latencyTimerMs": None,
+			"origAsyncLowLatency": None, "origLatencyTimerMs": None, "errors": []}
+	if fcntl is None:
+		resD["errors"].append("not supported on '%s'" % sys.platform)
+		return resD
+	#
+	try:
+		origFlags = _get_serial_flags(serObj)
+		resD["origAsyncLowLatency"] = bool(origFlags & ASYNC_LOW_LATENCY)
+		resD["asyncLowLatency"] = resD["origAsyncLowLatency"]
+		if not resD["origAsyncLowLatency"]:
+			_set_serial_flags(serObj, origFlags | ASYNC_LOW_LATENCY)
+			resD["asyncLowLatency"] = bool(_get_serial_flags(serObj) & ASYNC_LOW_LATENCY)
+	except OSError as err:
+		resD["errors"].append("ASYNC_LOW_LATENCY: %s" % str(err))
+	#
+	timerPath = _get_latency_timer_path(comPort)
+	try:
+		resD["origLatencyTimerMs"] = _read_latency_timer(timerPath)
+		resD["latencyTimerMs"] = resD["origLatencyTimerMs"]
+		if resD["origLatencyTimerMs"] > SERT_LATENCY_TIMER_MS:
+			_write_latency_timer(timerPath, SERT_LATENCY_TIMER_MS)
+			resD["latencyTimerMs"] = _read_latency_timer(timerPath)
+	except FileNotFoundError:
+		pass  # not an FTDI adapter
+	except (OSError, ValueError) as err:
+		resD["errors"].append("latency_timer: %s" % str(err))
+	return resD
+
+def restore_low_latency(serObj, comPort, settings):
+	""" Restore the settings from before apply_low_latency()
+
+	Parameters:
+		serObj (serial.Serial): Opened serial port
+		comPort (str): Device path of the serial port
+		settings (dict): Result of apply_low_latency()
+	"""
+	if fcntl is None:
+		return
+	if settings["origAsyncLowLatency"] == False and settings["asyncLowLatency"]:
+		try:
+			_set_serial_flags(serObj, _get_serial_flags(serObj) & ~ASYNC_LOW_LATENCY)
+		except OSError:
+			pass
+	if settings["origLatencyTimerMs"] is not None and settings["latencyTimerMs"] != settings["origLatencyTimerMs"]:
+		try:
+			_write_latency_timer(_get_latency_timer_path(comPort), settings["origLatencyTimerMs"])
+		except OSError:
+			pass
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _get_serial_flags(serObj):
+	buf = array.array("i", [0] * _SERT_SERIAL_STRUCT_INTS)
+	fcntl.ioctl(serObj.fileno(), termios.TIOCGSERIAL, buf)
+	return buf[_SERT_FLAGS_IX]
+
+def _set_serial_flags(serObj, flags):
+	buf = array.array("i", [0] * _SERT_SERIAL_STRUCT_INTS)
+	fcntl.ioctl(serObj.fileno(), termios.TIOCGSERIAL, buf)
+	buf[_SERT_FLAGS_IX] = flags
+	fcntl.ioctl(serObj.fileno(), termios.TIOCSSERIAL, buf)
+
+def _get_latency_timer_path(comPort):
+	return _SERT_SYSFS_PATH % os.path.basename(os.path.realpath(comPort))
+
+def _read_latency_timer(timerPath):
+	with open(timerPath, "r") as fileObj:
+		return int(fileObj.read().strip())
+
+def _write_latency_timer(timerPath, valueMs):
+	with open(timerPath, "w") as fileObj:
+		fileObj.write("%d" % valueMs)
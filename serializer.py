@@ -170,12 +170,14 @@ class Serializer(object):
 			raise InvalidInputDataError(valStr)
 		return resA
 
-	def serialize_data(self, valArr, listValueTypes):
+	def serialize_data(self, valArr, listValueTypes, checkRange=True):
 		""" Encode data for hardware
 
 		Parameters:
 			valArr (list)
 			listValueTypes (list)
+			checkRange (bool): Check Voltage/Current against the model's setpoint range
+					(measured values may be outside of it, e.g. 0V)
 		Returns:
 			str
 		Raises:
@@ -202,7 +204,8 @@ class Serializer(object):
 				if not isinstance(entryVal, (int, float)):
 					raise ValueError("value needs to be int or float for ValueType " + entryVt)
 				isVolt = (entryVt == SZR_VTYPE_VOLT or entryVt == SZR_VTYPE_SPECVOLT or entryVt == SZR_VTYPE_VARVOLT)
-				self._validate_output_value(entryVal, isVolt)
+				if checkRange:
+					self._validate_output_value(entryVal, isVolt)
 				entryVal = self.round_value(entryVal, isVolt)
 			#
 			if entryVt == SZR_VTYPE_VARVOLT or entryVt == SZR_VTYPE_VARCURR:
@@ -0,0 +1,225 @@
+#
+# by TS, Dec 2020
+#
+
+from serial.serialutil import SerialException as pyser_SerialException
+import threading
+import time
+
+try:
+	from .exceptions import CouldNotConnectError, InstrumentError, NotConnectedError
+	from .manson_instrument import MansonInstrument
+	from .mux_daemon import MUX_FUNCTIONS
+	from .port_discovery import PortIdentityCache, find_port_by_identity, get_port_identity_for_device, open_instrument
+except (ModuleNotFoundError, ImportError):
+	from exceptions import CouldNotConnectError, InstrumentError, NotConnectedError
+	from manson_instrument import MansonInstrument
+	from mux_daemon import MUX_FUNCTIONS
+	from port_discovery import PortIdentityCache, find_port_by_identity, get_port_identity_for_device, open_instrument
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+# functions whose last call is restored after reconnecting (in this order)
+SUP_REPLAY_ORDER = [
+		"set_selected_range",
+		"set_overvoltage_protection_value",
+		"set_overcurrent_protection_value",
+		"set_userinput_allowed",
+		"apply_memory_preset",
+		"set_preset_voltage_current",
+		"set_preset_voltage",
+		"set_preset_current",
+		"set_output_state"
+	]
+
+# calls that are replaced by a newer call of the key
+_SUP_SUPERSEDES = {
+		"apply_memory_preset": ["set_preset_voltage_current", "set_preset_voltage", "set_preset_current"],
+		"set_preset_voltage_current": ["set_preset_voltage", "set_preset_current"]
+	}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class SupervisedInstrument(object):
+	def __init__(self, reconnectTimeoutS=30.0, retryIntervalS=0.25, cacheObj=None):
+		""" Constructor
+
+		Connection to an instrument that survives the USB serial adapter being
+		unplugged/re-enumerated. Offers the same functions as MansonInstrument
+		(see mux_daemon.MUX_FUNCTIONS).
+
+		If the transport is lost the port is searched by its identity
+		(see port_discovery.get_port_identity()), reopened (with the cached
+		handshake if cacheObj is given) and the last commanded setpoints and
+		output state (see SUP_REPLAY_ORDER) are restored. Then the failed call is
+		executed again.
+
+		Parameters:
+			reconnectTimeoutS (float): Maximum time for reconnecting
+			retryIntervalS (float): Pause between reconnection attempts
+			cacheObj (PortIdentityCache|None): Cache for the handshake information
+		"""
+		assert isinstance(reconnectTimeoutS, (int, float)) and reconnectTimeoutS >= 0.0, "reconnectTimeoutS needs to be >= 0"
+		assert isinstance(retryIntervalS, (int, float)) and retryIntervalS > 0.0, "retryIntervalS needs to be > 0"
+		assert cacheObj is None or isinstance(cacheObj, PortIdentityCache), "cacheObj needs to be PortIdentityCache or None"
+		#
+		self._reconnectTimeoutS = reconnectTimeoutS
+		self._retryIntervalS = retryIntervalS
+		self._cacheObj = cacheObj
+		self._miObj = None
+		self._comPort = None
+		self._emulateModel = None
+		self._identity = None
+		self._setpoints = {}
+		self._lock = threading.RLock()
+		self._stats = {"reconnects": 0, "failedReconnects": 0, "attempts": 0, "replayed": 0,
+				"lastRecoveryS": None, "maxRecoveryS": 0.0, "totalRecoveryS": 0.0}
+
+	# --------------------------------------------------------------------------
+
+	def open_port(self, comPort, emulateModel=None):
+		""" Init serial connection
+
+		Parameters:
+			comPort (str): Serial device (e.g. "/dev/ttyUSB0")
+			emulateModel (str|None): optional Model ID for hardware emulation
+		Raises:
+			CouldNotConnectError
+		"""
+		assert isinstance(comPort, str), "comPort needs to be string"
+		#
+		with self._lock:
+			self.close_port()
+			self._comPort = comPort
+			self._emulateModel = emulateModel
+			self._identity = (None if emulateModel is not None else get_port_identity_for_device(comPort))
+			self._setpoints = {}
+			self._miObj = self._open_instrument(comPort)
+
+	def close_port(self):
+		""" Close serial connection """
+		with self._lock:
+			# no reconnection after an explicit close
+			self._comPort = None
+			if self._miObj is None:
+				return
+			self._miObj.close_port()
+			self._miObj = None
+
+	def get_instrument(self):
+		""" Get the currently used instrument object (changes when reconnecting)
+
+		Returns:
+			MansonInstrument|None
+		"""
+		return self._miObj
+
+	def get_identity(self):
+		""" Get the identity of the port that is used for finding it again
+
+		Returns:
+			str|None: None if the port has no stable identity (then the same path is reopened)
+		"""
+		return self._identity
+
+	def get_setpoints(self):
+		""" Get the calls that would be replayed after reconnecting
+
+		Returns:
+			list: [(functionName, args), ...]
+		"""
+		with self._lock:
+			return [(fnName, list(self._setpoints[fnName])) for fnName in SUP_REPLAY_ORDER if fnName in self._setpoints]
+
+	def get_stats(self):
+		""" Get reconnection statistics
+
+		Returns:
+			dict: {"reconnects": int, "failedReconnects": int, "attempts": int, "replayed": int,
+					"lastRecoveryS": float|None, "maxRecoveryS": float, "totalRecoveryS": float}
+		"""
+		with self._lock:
+			return dict(self._stats)
+
+	def __getattr__(self, name):
+		if name not in MUX_FUNCTIONS:
+			raise AttributeError(name)
+		return lambda *args: self._call(name, args)
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _open_instrument(self, comPort):
+		if self._cacheObj is not None and self._identity is not None:
+			return open_instrument(comPort, self._cacheObj, identity=self._identity)
+		miObj = MansonInstrument()
+		miObj.open_port(comPort, self._emulateModel)
+		return miObj
+
+	def _call(self, fnName, args):
+		with self._lock:
+			if self._miObj is None:
+				if self._comPort is None:
+					raise NotConnectedError()
+				# the last reconnection has failed, the adapter might be back by now
+				self._reconnect()
+			try:
+				resVal = getattr(self._miObj, fnName)(*args)
+			except (pyser_SerialException, OSError, NotConnectedError):
+				self._reconnect()
+				resVal = getattr(self._miObj, fnName)(*args)
+			if fnName in SUP_REPLAY_ORDER:
+				for tmpFn in _SUP_SUPERSEDES.get(fnName, []):
+					self._setpoints.pop(tmpFn, None)
+				self._setpoints[fnName] = tuple(args)
+			return resVal
+
+	def _reconnect(self):
+		startTime = time.monotonic()
+		oldMiObj = self._miObj
+		self._miObj = None
+		if oldMiObj is not None:
+			try:
+				oldMiObj.close_port()
+			except (pyser_SerialException, OSError):
+				pass
+		#
+		lastErr = None
+		while True:
+			self._stats["attempts"] += 1
+			comPort = self._comPort
+			if self._identity is not None:
+				comPort = find_port_by_identity(self._identity)
+			if comPort is not None:
+				miObj = None
+				try:
+					miObj = self._open_instrument(comPort)
+					self._replay_setpoints(miObj)
+					break
+				except (pyser_SerialException, OSError, InstrumentError) as err:
+					lastErr = err
+					if miObj is not None:
+						try:
+							miObj.close_port()
+						except (pyser_SerialException, OSError):
+							pass
+			if time.monotonic() - startTime + self._retryIntervalS > self._reconnectTimeoutS:
+				self._stats["failedReconnects"] += 1
+				raise CouldNotConnectError("comPort='%s', identity='%s' (%s)" % (self._comPort, self._identity, str(lastErr)))
+			time.sleep(self._retryIntervalS)
+		#
+		self._miObj = miObj
+		self._comPort = comPort
+		recoveryS = time.monotonic() - startTime
+		self._stats["reconnects"] += 1
+		self._stats["lastRecoveryS"] = recoveryS
+		self._stats["maxRecoveryS"] = max(self._stats["maxRecoveryS"], recoveryS)
+		self._stats["totalRecoveryS"] += recoveryS
+
+	def _replay_setpoints(self, miObj):
+		for fnName in SUP_REPLAY_ORDER:
+			if fnName in self._setpoints:
+				getattr(miObj, fnName)(*self._setpoints[fnName])
+				self._stats["replayed"] += 1
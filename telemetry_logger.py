@@ -0,0 +1,332 @@
+#
+# by TS, Dec 2020
+#
+
+from array import array
+import csv
+import os
+import struct
+import sys
+
+try:
+	from .serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+except (ModuleNotFoundError, ImportError):
+	from serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# File format (all values little-endian):
+#
+#   file header:  magic "MTLG", u16 version, u8 precVolt, u8 precCurr, 8 bytes reserved
+#   chunk:        magic "CHNK", u32 count,
+#                 f64[count] time, i32[count] volt counts, i32[count] curr counts, u8[count] mode bits
+#
+# Volt/Curr counts are the values multiplied by 10^precVolt / 10^precCurr,
+# which is exactly the resolution of the hardware.
+
+TLOG_FILE_MAGIC = b"MTLG"
+TLOG_FILE_VERSION = 1
+TLOG_CHUNK_MAGIC = b"CHNK"
+
+TLOG_MODE_BIT_CC = 0x01
+TLOG_MODE_BIT_OUTP = 0x02
+
+_TLOG_FILE_HEADER = struct.Struct("<4sHBB8x")
+_TLOG_CHUNK_HEADER = struct.Struct("<4sI")
+
+_TLOG_COLUMNS = [("time", "d"), ("volt", "i"), ("curr", "i"), ("mode", "B")]
+_TLOG_SAMPLE_SIZE = 8 + 4 + 4 + 1
+
+for _entryCol in _TLOG_COLUMNS:
+	assert array(_entryCol[1]).itemsize == {"d": 8, "i": 4, "B": 1}[_entryCol[1]], "unsupported platform"
+
+# ------------------------------------------------------------------------------
+
+def read_telemetry_header(filePath):
+	""" Read the header of a telemetry file
+
+	Parameters:
+		filePath (str)
+	Returns:
+		dict: {"version": int, "precVolt": int, "precCurr": int}
+	Raises:
+		ValueError
+	"""
+	with open(filePath, "rb") as fileObj:
+		return _read_file_header(fileObj)
+
+def read_telemetry_chunks(filePath):
+	""" Generator that reads a telemetry file chunk by chunk
+
+	A truncated chunk at the end of the file (e.g. after a crash) is ignored.
+
+	Parameters:
+		filePath (str)
+	Yields:
+		dict: {"time": array, "volt": array, "curr": array, "mode": array}
+	Raises:
+		ValueError
+	"""
+	with open(filePath, "rb") as fileObj:
+		_read_file_header(fileObj)
+		while True:
+			tmpBy = fileObj.read(_TLOG_CHUNK_HEADER.size)
+			if len(tmpBy) < _TLOG_CHUNK_HEADER.size:
+				return
+			magic, count = _TLOG_CHUNK_HEADER.unpack(tmpBy)
+			if magic != TLOG_CHUNK_MAGIC:
+				raise ValueError("invalid chunk in telemetry file '%s'" % filePath)
+			resD = {}
+			for colName, colType in _TLOG_COLUMNS:
+				colArr = array(colType)
+				try:
+					colArr.fromfile(fileObj, count)
+				except EOFError:
+					return
+				if sys.byteorder != "little":
+					colArr.byteswap()
+				resD[colName] = colArr
+			yield resD
+
+def iter_telemetry_samples(filePath):
+	""" Generator that reads a telemetry file sample by sample
+
+	Parameters:
+		filePath (str)
+	Yields:
+		dict: {"time": float, "volt": float, "curr": float, "mode": str, "outp": bool}
+	"""
+	hdrD = read_telemetry_header(filePath)
+	scaleV = pow(10, -hdrD["precVolt"])
+	scaleC = pow(10, -hdrD["precCurr"])
+	for entryCh in read_telemetry_chunks(filePath):
+		for ix in range(len(entryCh["time"])):
+			modeBits = entryCh["mode"][ix]
+			yield {
+					"time": entryCh["time"][ix],
+					"volt": round(entryCh["volt"][ix] * scaleV, hdrD["precVolt"]),
+					"curr": round(entryCh["curr"][ix] * scaleC, hdrD["precCurr"]),
+					"mode": (SZR_OUTP_MODE_CC if modeBits & TLOG_MODE_BIT_CC else SZR_OUTP_MODE_CV),
+					"outp": (modeBits & TLOG_MODE_BIT_OUTP) != 0
+				}
+
+def export_telemetry_csv(filePath, csvPath):
+	""" Export a telemetry file to CSV
+
+	Parameters:
+		filePath (str): Telemetry file
+		csvPath (str): Output file
+	Returns:
+		int: Amount of exported samples
+	"""
+	hdrD = read_telemetry_header(filePath)
+	fmtV = "%%.%df" % hdrD["precVolt"]
+	fmtC = "%%.%df" % hdrD["precCurr"]
+	resI = 0
+	with open(csvPath, "w", newline="") as csvFile:
+		csvWr = csv.writer(csvFile)
+		csvWr.writerow(["time", "volt", "curr", "mode", "outp"])
+		for entryS in iter_telemetry_samples(filePath):
+			csvWr.writerow(["%.6f" % entryS["time"], fmtV % entryS["volt"], fmtC % entryS["curr"],
+					entryS["mode"], "1" if entryS["outp"] else "0"])
+			resI += 1
+	return resI
+
+def export_telemetry_parquet(filePath, parquetPath):
+	""" Export a telemetry file to Parquet (requires pyarrow)
+
+	The Volt/Curr columns are exported as raw integer counts,
+	the precisions are stored in the schema's metadata.
+
+	Parameters:
+		filePath (str): Telemetry file
+		parquetPath (str): Output file
+	Returns:
+		int: Amount of exported samples
+	Raises:
+		ImportError
+	"""
+	try:
+		import pyarrow
+		import pyarrow.parquet
+	except ImportError:
+		raise ImportError("exporting to Parquet requires pyarrow")
+	#
+	hdrD = read_telemetry_header(filePath)
+	schema = pyarrow.schema([
+				("time", pyarrow.float64()),
+				("volt", pyarrow.int32()),
+				("curr", pyarrow.int32()),
+				("mode", pyarrow.uint8())
+			],
+			metadata={"precVolt": str(hdrD["precVolt"]), "precCurr": str(hdrD["precCurr"])})
+	resI = 0
+	pqWr = pyarrow.parquet.ParquetWriter(parquetPath, schema)
+	try:
+		for entryCh in read_telemetry_chunks(filePath):
+			colArr = [pyarrow.array(entryCh[colName], type=schema.field(colName).type) for colName, _ in _TLOG_COLUMNS]
+			pqWr.write_table(pyarrow.Table.from_arrays(colArr, schema=schema))
+			resI += len(entryCh["time"])
+	finally:
+		pqWr.close()
+	return resI
+
+def _get_complete_length(filePath):
+	""" Get the length of a telemetry file without a truncated chunk at its end
+
+	Parameters:
+		filePath (str)
+	Returns:
+		int
+	Raises:
+		ValueError
+	"""
+	fileLen = os.path.getsize(filePath)
+	with open(filePath, "rb") as fileObj:
+		_read_file_header(fileObj)
+		resI = fileObj.tell()
+		while True:
+			tmpBy = fileObj.read(_TLOG_CHUNK_HEADER.size)
+			if len(tmpBy) < _TLOG_CHUNK_HEADER.size:
+				return resI
+			magic, count = _TLOG_CHUNK_HEADER.unpack(tmpBy)
+			if magic != TLOG_CHUNK_MAGIC:
+				raise ValueError("invalid chunk in telemetry file '%s'" % filePath)
+			endI = resI + _TLOG_CHUNK_HEADER.size + count * _TLOG_SAMPLE_SIZE
+			if endI > fileLen:
+				return resI
+			resI = endI
+			fileObj.seek(resI)
+
+def _read_file_header(fileObj):
+	tmpBy = fileObj.read(_TLOG_FILE_HEADER.size)
+	if len(tmpBy) < _TLOG_FILE_HEADER.size:
+		raise ValueError("invalid telemetry file header")
+	magic, version, precVolt, precCurr = _TLOG_FILE_HEADER.unpack(tmpBy)
+	if magic != TLOG_FILE_MAGIC or version != TLOG_FILE_VERSION:
+		raise ValueError("invalid telemetry file header")
+	return {"version": version, "precVolt": precVolt, "precCurr": precCurr}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class TelemetryLogger(object):
+	def __init__(self, filePath, hwSpecs, chunkSize=4096):
+		""" Constructor
+
+		Samples are collected in preallocated columns and written to the
+		append-only file as one chunk once chunkSize samples have been collected.
+
+		Parameters:
+			filePath (str): Telemetry file (will be created or appended to)
+			hwSpecs (dict): HW Specifications (see MansonInstrument.get_hw_specs())
+			chunkSize (int): Amount of samples per chunk
+		Raises:
+			ValueError
+		"""
+		assert isinstance(filePath, str), "filePath needs to be string"
+		assert isinstance(hwSpecs, dict), "hwSpecs needs to be dict"
+		assert isinstance(chunkSize, int) and chunkSize > 0, "chunkSize needs to be int > 0"
+		#
+		self._precVolt = hwSpecs["precVolt"]
+		self._precCurr = hwSpecs["precCurr"]
+		self._scaleV = pow(10, self._precVolt)
+		self._scaleC = pow(10, self._precCurr)
+		self._chunkSize = chunkSize
+		self._colTime = array("d", bytes(8 * chunkSize))
+		self._colVolt = array("i", bytes(4 * chunkSize))
+		self._colCurr = array("i", bytes(4 * chunkSize))
+		self._colMode = array("B", bytes(chunkSize))
+		self._fill = 0
+		self._stats = {"samples": 0, "chunks": 0, "bytes": 0}
+		#
+		self._fileObj = open(filePath, "ab")
+		if self._fileObj.tell() == 0:
+			self._fileObj.write(_TLOG_FILE_HEADER.pack(TLOG_FILE_MAGIC, TLOG_FILE_VERSION, self._precVolt, self._precCurr))
+			self._fileObj.flush()
+		else:
+			try:
+				hdrD = read_telemetry_header(filePath)
+				if hdrD["precVolt"] != self._precVolt or hdrD["precCurr"] != self._precCurr:
+					raise ValueError("telemetry file '%s' has been written for different HW Specifications" % filePath)
+				# new chunks may not follow a truncated chunk (e.g. after a crash)
+				completeLen = _get_complete_length(filePath)
+			except ValueError:
+				self._fileObj.close()
+				raise
+			if completeLen != self._fileObj.tell():
+				self._fileObj.truncate(completeLen)
+
+	# --------------------------------------------------------------------------
+
+	def append_sample(self, sample):
+		""" Append a sample (e.g. from MansonInstrument.stream())
+
+		Parameters:
+			sample (dict): {"time": float, "volt": float, "curr": float, "mode": str[, "outp": bool]}
+		"""
+		if self._fileObj is None:
+			raise ValueError("logger has been closed")
+		ix = self._fill
+		self._colTime[ix] = sample["time"]
+		self._colVolt[ix] = int(round(sample["volt"] * self._scaleV))
+		self._colCurr[ix] = int(round(sample["curr"] * self._scaleC))
+		modeBits = 0
+		if sample["mode"] == SZR_OUTP_MODE_CC:
+			modeBits |= TLOG_MODE_BIT_CC
+		if sample.get("outp", False):
+			modeBits |= TLOG_MODE_BIT_OUTP
+		self._colMode[ix] = modeBits
+		self._fill = ix + 1
+		self._stats["samples"] += 1
+		if self._fill == self._chunkSize:
+			self.flush()
+
+	def consume(self, samples):
+		""" Append all samples from an iterable (e.g. MansonInstrument.stream())
+
+		Parameters:
+			samples (iterable)
+		Returns:
+			int: Amount of appended samples
+		"""
+		resI = 0
+		for entryS in samples:
+			self.append_sample(entryS)
+			resI += 1
+		return resI
+
+	def flush(self):
+		""" Write all collected samples to the file as one chunk """
+		if self._fileObj is None or self._fill == 0:
+			return
+		count = self._fill
+		self._fileObj.write(_TLOG_CHUNK_HEADER.pack(TLOG_CHUNK_MAGIC, count))
+		bytesWritten = _TLOG_CHUNK_HEADER.size
+		for colArr in (self._colTime, self._colVolt, self._colCurr, self._colMode):
+			if sys.byteorder != "little":
+				colArr = array(colArr.typecode, colArr[:count])
+				colArr.byteswap()
+			self._fileObj.write(memoryview(colArr)[:count])
+			bytesWritten += count * colArr.itemsize
+		self._fileObj.flush()
+		self._fill = 0
+		self._stats["chunks"] += 1
+		self._stats["bytes"] += bytesWritten
+
+	def close(self):
+		""" Flush remaining samples and close the file """
+		if self._fileObj is None:
+			return
+		self.flush()
+		os.fsync(self._fileObj.fileno())
+		self._fileObj.close()
+		self._fileObj = None
+
+	def get_stats(self):
+		""" Get statistics
+
+		Returns:
+			dict: {"samples": int, "chunks": int, "bytes": int}
+		"""
+		return dict(self._stats)
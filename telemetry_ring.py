@@ -0,0 +1,242 @@
+#
+# by TS, Dec 2020
+#
+
+import mmap
+import os
+import struct
+
+try:
+	from .serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+	from .telemetry_logger import TLOG_MODE_BIT_CC, TLOG_MODE_BIT_OUTP
+except (ModuleNotFoundError, ImportError):
+	from serializer import SZR_OUTP_MODE_CC, SZR_OUTP_MODE_CV
+	from telemetry_logger import TLOG_MODE_BIT_CC, TLOG_MODE_BIT_OUTP
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Ring file layout (all values little-endian):
+#
+#   header (64 bytes):  magic "MTRB", u16 version, u8 precVolt, u8 precCurr,
+#                       u32 capacity, u32 recordSize, u64 seqlock, u64 head
+#   record (32 bytes):  u64 seq, f64 time, i32 volt counts, i32 curr counts, u8 mode bits
+#
+# "head" is the total amount of records written so far, record #n is stored
+# in slot n % capacity and has seq == n + 1 (0 marks an empty or invalid slot).
+#
+# The writer increments the header's seqlock to an odd value before updating
+# a record and "head" and to an even value afterwards. Additionally the record's
+# seq is set to 0 while the record is being written. Readers therefore never
+# block the writer: they just retry or drop records that changed while being read.
+
+TRING_MAGIC = b"MTRB"
+TRING_VERSION = 1
+
+_TRING_HEADER = struct.Struct("<4sHBBII")
+_TRING_HEADER_SIZE = 64
+_TRING_OFFS_SEQLOCK = 16
+_TRING_OFFS_HEAD = 24
+_TRING_U64 = struct.Struct("<Q")
+_TRING_RECORD = struct.Struct("<QdiiB7x")
+_TRING_RECORD_PAYLOAD = struct.Struct("<diiB")
+
+assert _TRING_HEADER.size <= _TRING_OFFS_SEQLOCK, "invalid header layout"
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class TelemetryRingWriter(object):
+	def __init__(self, filePath, hwSpecs, capacity=65536):
+		""" Constructor
+
+		Creates (or replaces) the ring file. A new ring is built in a temporary
+		file and renamed over the old one, so readers that still map the old
+		ring keep a valid (but no longer updated) mapping and need to reopen the file.
+
+		Parameters:
+			filePath (str): Ring file (e.g. on a tmpfs like /dev/shm)
+			hwSpecs (dict): HW Specifications (see MansonInstrument.get_hw_specs())
+			capacity (int): Amount of records the ring can hold
+		"""
+		assert isinstance(filePath, str), "filePath needs to be string"
+		assert isinstance(hwSpecs, dict), "hwSpecs needs to be dict"
+		assert isinstance(capacity, int) and capacity > 0, "capacity needs to be int > 0"
+		#
+		self._capacity = capacity
+		self._precVolt = hwSpecs["precVolt"]
+		self._precCurr = hwSpecs["precCurr"]
+		self._scaleV = pow(10, self._precVolt)
+		self._scaleC = pow(10, self._precCurr)
+		self._head = 0
+		self._seqlock = 0
+		self._mmObj = None
+		#
+		fileSize = _TRING_HEADER_SIZE + capacity * _TRING_RECORD.size
+		# truncating the file in place would make the readers of the old ring crash (SIGBUS)
+		tmpPath = "%s.tmp%d" % (filePath, os.getpid())
+		fd = os.open(tmpPath, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+		try:
+			os.ftruncate(fd, fileSize)
+			self._mmObj = mmap.mmap(fd, fileSize, access=mmap.ACCESS_WRITE)
+			_TRING_HEADER.pack_into(self._mmObj, 0, TRING_MAGIC, TRING_VERSION, self._precVolt, self._precCurr,
+					capacity, _TRING_RECORD.size)
+			os.replace(tmpPath, filePath)
+		except OSError:
+			if self._mmObj is not None:
+				self._mmObj.close()
+				self._mmObj = None
+			os.unlink(tmpPath)
+			raise
+		finally:
+			os.close(fd)
+
+	# --------------------------------------------------------------------------
+
+	def append_sample(self, sample):
+		""" Append a sample (e.g. from MansonInstrument.stream())
+
+		Parameters:
+			sample (dict): {"time": float, "volt": float, "curr": float, "mode": str[, "outp": bool]}
+		"""
+		mmObj = self._mmObj
+		if mmObj is None:
+			raise ValueError("ring has been closed")
+		modeBits = 0
+		if sample["mode"] == SZR_OUTP_MODE_CC:
+			modeBits |= TLOG_MODE_BIT_CC
+		if sample.get("outp", False):
+			modeBits |= TLOG_MODE_BIT_OUTP
+		recOffs = _TRING_HEADER_SIZE + (self._head % self._capacity) * _TRING_RECORD.size
+		#
+		self._seqlock += 1
+		_TRING_U64.pack_into(mmObj, _TRING_OFFS_SEQLOCK, self._seqlock)
+		_TRING_U64.pack_into(mmObj, recOffs, 0)
+		_TRING_RECORD_PAYLOAD.pack_into(mmObj, recOffs + 8, sample["time"],
+				int(round(sample["volt"] * self._scaleV)), int(round(sample["curr"] * self._scaleC)), modeBits)
+		_TRING_U64.pack_into(mmObj, recOffs, self._head + 1)
+		self._head += 1
+		_TRING_U64.pack_into(mmObj, _TRING_OFFS_HEAD, self._head)
+		self._seqlock += 1
+		_TRING_U64.pack_into(mmObj, _TRING_OFFS_SEQLOCK, self._seqlock)
+
+	def close(self):
+		""" Close the ring file (the file itself is kept for the readers) """
+		if self._mmObj is None:
+			return
+		self._mmObj.flush()
+		self._mmObj.close()
+		self._mmObj = None
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class TelemetryRingReader(object):
+	_MAX_RETRIES = 1000
+
+	def __init__(self, filePath):
+		""" Constructor
+
+		Parameters:
+			filePath (str): Ring file created by a TelemetryRingWriter
+		Raises:
+			ValueError
+		"""
+		assert isinstance(filePath, str), "filePath needs to be string"
+		#
+		fd = os.open(filePath, os.O_RDONLY)
+		try:
+			self._mmObj = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+		finally:
+			os.close(fd)
+		if len(self._mmObj) < _TRING_HEADER_SIZE:
+			self.close()
+			raise ValueError("invalid ring file '%s'" % filePath)
+		magic, version, precVolt, precCurr, capacity, recordSize = _TRING_HEADER.unpack_from(self._mmObj, 0)
+		if magic != TRING_MAGIC or version != TRING_VERSION or recordSize != _TRING_RECORD.size or \
+				len(self._mmObj) < _TRING_HEADER_SIZE + capacity * recordSize:
+			self.close()
+			raise ValueError("invalid ring file '%s'" % filePath)
+		self._capacity = capacity
+		self._precVolt = precVolt
+		self._precCurr = precCurr
+		self._scaleV = pow(10, -precVolt)
+		self._scaleC = pow(10, -precCurr)
+
+	# --------------------------------------------------------------------------
+
+	def get_head(self):
+		""" Get total amount of records written so far
+
+		Returns:
+			int
+		"""
+		mmObj = self._mmObj
+		for _ in range(self._MAX_RETRIES):
+			seqA = _TRING_U64.unpack_from(mmObj, _TRING_OFFS_SEQLOCK)[0]
+			if seqA & 1:
+				continue
+			head = _TRING_U64.unpack_from(mmObj, _TRING_OFFS_HEAD)[0]
+			if _TRING_U64.unpack_from(mmObj, _TRING_OFFS_SEQLOCK)[0] == seqA:
+				return head
+		raise TimeoutError("could not read consistent ring header")
+
+	def read_latest(self, count):
+		""" Read the latest records
+
+		Parameters:
+			count (int): Maximum amount of records to read
+		Returns:
+			list: [{"seq": int, "time": float, "volt": float, "curr": float, "mode": str, "outp": bool}, ...]
+				(oldest first)
+		"""
+		assert isinstance(count, int) and count >= 0, "count needs to be int >= 0"
+		#
+		head = self.get_head()
+		return self._read_range(max(0, head - min(count, self._capacity)), head)
+
+	def read_since(self, cursor):
+		""" Read all records written since the given cursor
+
+		Parameters:
+			cursor (int): Value returned by a previous call (0 for all available records)
+		Returns:
+			dict: {"records": list, "cursor": int, "lost": int}
+				"lost" is the amount of records that have been overwritten
+				before they could be read
+		"""
+		assert isinstance(cursor, int) and cursor >= 0, "cursor needs to be int >= 0"
+		#
+		head = self.get_head()
+		startIx = max(cursor, head - self._capacity)
+		resA = self._read_range(startIx, head)
+		lost = (startIx - cursor) + (head - startIx - len(resA))
+		return {"records": resA, "cursor": head, "lost": lost}
+
+	def close(self):
+		""" Close the ring file """
+		if self._mmObj is None:
+			return
+		self._mmObj.close()
+		self._mmObj = None
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _read_range(self, startIx, endIx):
+		mmObj = self._mmObj
+		resA = []
+		for ix in range(startIx, endIx):
+			recOffs = _TRING_HEADER_SIZE + (ix % self._capacity) * _TRING_RECORD.size
+			seqA, tmpT, tmpV, tmpC, modeBits = _TRING_RECORD.unpack_from(mmObj, recOffs)
+			if seqA != ix + 1 or _TRING_U64.unpack_from(mmObj, recOffs)[0] != seqA:
+				# overwritten or being written right now
+				continue
+			resA.append({
+					"seq": ix,
+					"time": tmpT,
+					"volt": round(tmpV * self._scaleV, self._precVolt),
+					"curr": round(tmpC * self._scaleC, self._precCurr),
+					"mode": (SZR_OUTP_MODE_CC if modeBits & TLOG_MODE_BIT_CC else SZR_OUTP_MODE_CV),
+					"outp": (modeBits & TLOG_MODE_BIT_OUTP) != 0
+				})
+		return resA
@@ -2,23 +2,88 @@
 # by TS, Dec 2020
 #
 
+import gc
+import http.client
+import json
+import multiprocessing
+import os
+import pty
+import socket
 import sys
+import tempfile
+import threading
 import time
 import traceback
+import tracemalloc
+import urllib.error
+import urllib.request
+
+from serial import Serial as pyser_Serial
+from serial.tools.list_ports_common import ListPortInfo
 
 try:
-	from .exceptions import FunctionNotSupportedForModelError, InvalidModelError, \
-			InvalidTestType, TestFailedError, UnsupportedModelError
+	from .clock import MonotonicClock, VirtualClock
+	from .emulated_instrument_serial import EmulatedInstrumentSerial, build_fault_schedule, build_timing_model, \
+			EIS_EEPROM_WRITE_S, EIS_FAULTS, EIS_FAULT_CORRUPT, EIS_FAULT_DELAY, EIS_FAULT_DISCONNECT, EIS_FAULT_DROP, \
+			EIS_FAULT_EXTRA_CR, EIS_FAULT_TRUNCATE
+	from .event_engine import EventEngine
+	from .exceptions import CouldNotConnectError, FunctionNotSupportedForModelError, IdentityMismatchError, InvalidModelError, \
+			InvalidResponseError, InvalidTestType, NotConnectedError, ResponseTimeoutError, TestFailedError, \
+			UnknownCommandError, UnsupportedModelError
 	from .manson_instrument import MansonInstrument, \
 			VIRTUAL_SERIAL_DEVICE, \
 			RANGE_ID_0_16V0_5A0, RANGE_ID_1_27V0_3A0, RANGE_ID_2_36V0_2A2
+	from .fleet_poller import FleetPoller
+	from .fleet_shards import ShardedFleetPoller
+	from .fleet_table import FleetStateTable
+	from .http_gateway import HttpGateway
+	from .load_models import ConstantCurrentLoad, ProfileLoad, ResistiveLoad
+	from .models import get_hw_model_id as models_get_hw_model_id, TEST_MODEL_LIST
+	from .mux_client import MansonInstrumentClient
+	from .mux_daemon import mux_recv_frame, mux_send_frame, MuxDaemon
+	from .port_discovery import PortIdentityCache, discover_instruments, open_instrument, store_instrument_identity, \
+			PDISC_SOURCE_CACHE, PDISC_SOURCE_PROBE
+	from .pty_emulator import PtyEmulatorServer
+	from .power_sequencer import PowerSequencer, build_sequence_step, format_timing_report, \
+			SEQ_ACTION_OUTPUT, SEQ_STATUS_OK
+	from .serial_tuning import apply_low_latency, restore_low_latency
+	from .supervised_instrument import SupervisedInstrument
+	from .telemetry_logger import TelemetryLogger, export_telemetry_csv, iter_telemetry_samples
+	from .telemetry_ring import TelemetryRingReader, TelemetryRingWriter
+	from .transports import get_transport_schemes
+	from .wire_capture import ReplaySerial, read_wire_capture, WCAP_FRAME_CMD, WCAP_FRAME_RESP
 	from .test_serializer_manson_instrument import TestSerializerMansonInstrument
 except (ModuleNotFoundError, ImportError):
-	from exceptions import FunctionNotSupportedForModelError, InvalidModelError, \
-			InvalidTestType, TestFailedError, UnsupportedModelError
+	from clock import MonotonicClock, VirtualClock
+	from emulated_instrument_serial import EmulatedInstrumentSerial, build_fault_schedule, build_timing_model, \
+			EIS_EEPROM_WRITE_S, EIS_FAULTS, EIS_FAULT_CORRUPT, EIS_FAULT_DELAY, EIS_FAULT_DISCONNECT, EIS_FAULT_DROP, \
+			EIS_FAULT_EXTRA_CR, EIS_FAULT_TRUNCATE
+	from event_engine import EventEngine
+	from exceptions import CouldNotConnectError, FunctionNotSupportedForModelError, IdentityMismatchError, InvalidModelError, \
+			InvalidResponseError, InvalidTestType, NotConnectedError, ResponseTimeoutError, TestFailedError, \
+			UnknownCommandError, UnsupportedModelError
 	from manson_instrument import MansonInstrument, \
 			VIRTUAL_SERIAL_DEVICE, \
 			RANGE_ID_0_16V0_5A0, RANGE_ID_1_27V0_3A0, RANGE_ID_2_36V0_2A2
+	from fleet_poller import FleetPoller
+	from fleet_shards import ShardedFleetPoller
+	from fleet_table import FleetStateTable
+	from http_gateway import HttpGateway
+	from load_models import ConstantCurrentLoad, ProfileLoad, ResistiveLoad
+	from models import get_hw_model_id as models_get_hw_model_id, TEST_MODEL_LIST
+	from mux_client import MansonInstrumentClient
+	from mux_daemon import mux_recv_frame, mux_send_frame, MuxDaemon
+	from port_discovery import PortIdentityCache, discover_instruments, open_instrument, store_instrument_identity, \
+			PDISC_SOURCE_CACHE, PDISC_SOURCE_PROBE
+	from pty_emulator import PtyEmulatorServer
+	from power_sequencer import PowerSequencer, build_sequence_step, format_timing_report, \
+			SEQ_ACTION_OUTPUT, SEQ_STATUS_OK
+	from serial_tuning import apply_low_latency, restore_low_latency
+	from supervised_instrument import SupervisedInstrument
+	from telemetry_logger import TelemetryLogger, export_telemetry_csv, iter_telemetry_samples
+	from telemetry_ring import TelemetryRingReader, TelemetryRingWriter
+	from transports import get_transport_schemes
+	from wire_capture import ReplaySerial, read_wire_capture, WCAP_FRAME_CMD, WCAP_FRAME_RESP
 	from test_serializer_manson_instrument import TestSerializerMansonInstrument
 
 # ------------------------------------------------------------------------------
@@ -30,6 +95,27 @@ TEST_TYPE_KEY_SIMPLE = "sim"
 TEST_TYPE_KEY_VOLT = "v"
 TEST_TYPE_KEY_CURR = "c"
 TEST_TYPE_KEY_MEMPRESET = "mp"
+TEST_TYPE_KEY_SEQUENCE = "seq"
+TEST_TYPE_KEY_STREAM = "str"
+TEST_TYPE_KEY_TELEMETRY = "tel"
+TEST_TYPE_KEY_FLEET = "flt"
+TEST_TYPE_KEY_MUX = "mux"
+TEST_TYPE_KEY_GATEWAY = "gw"
+TEST_TYPE_KEY_DISCOVERY = "dsc"
+TEST_TYPE_KEY_IDENTITY = "idc"
+TEST_TYPE_KEY_SUPERVISED = "sup"
+TEST_TYPE_KEY_RESYNC = "rsy"
+TEST_TYPE_KEY_TRANSPORT = "trn"
+TEST_TYPE_KEY_LATENCY = "lat"
+TEST_TYPE_KEY_EVENTLOOP = "evl"
+TEST_TYPE_KEY_SHARDS = "shd"
+TEST_TYPE_KEY_PIPELINE = "pip"
+TEST_TYPE_KEY_WIRETIMING = "wtm"
+TEST_TYPE_KEY_LOADSIM = "lod"
+TEST_TYPE_KEY_FAULTS = "fij"
+TEST_TYPE_KEY_FOOTPRINT = "fpt"
+TEST_TYPE_KEY_CAPTURE = "cap"
+TEST_TYPE_KEY_VIRTUALCLOCK = "vck"
 
 TEST_TYPES = {
 		TEST_TYPE_KEY_ALL: "run all Test Types",
@@ -37,7 +123,28 @@ TEST_TYPES = {
 		TEST_TYPE_KEY_SIMPLE: "run simple tests",
 		TEST_TYPE_KEY_VOLT: "run Voltage tests",  # WARNING: potentially dangerous to connected load
 		TEST_TYPE_KEY_CURR: "run Current tests",  # WARNING: potentially dangerous to connected load
-		TEST_TYPE_KEY_MEMPRESET: "run Memory Preset tests"  # WARNING: potentially dangerous to connected load
+		TEST_TYPE_KEY_MEMPRESET: "run Memory Preset tests",  # WARNING: potentially dangerous to connected load
+		TEST_TYPE_KEY_SEQUENCE: "run Power Sequencer tests",  # WARNING: potentially dangerous to connected load
+		TEST_TYPE_KEY_STREAM: "run Streaming tests",
+		TEST_TYPE_KEY_TELEMETRY: "run Telemetry tests",
+		TEST_TYPE_KEY_FLEET: "run Fleet Poller tests",
+		TEST_TYPE_KEY_MUX: "run Multiplexing Daemon tests",
+		TEST_TYPE_KEY_GATEWAY: "run HTTP Gateway tests",
+		TEST_TYPE_KEY_DISCOVERY: "run Port Discovery tests",
+		TEST_TYPE_KEY_IDENTITY: "run Identity Cache tests",
+		TEST_TYPE_KEY_SUPERVISED: "run Supervised Instrument tests",
+		TEST_TYPE_KEY_RESYNC: "run Timeout/Resync/Retry tests",
+		TEST_TYPE_KEY_TRANSPORT: "run Transport tests",
+		TEST_TYPE_KEY_LATENCY: "run Low-Latency Settings tests",
+		TEST_TYPE_KEY_EVENTLOOP: "run Event Engine tests",
+		TEST_TYPE_KEY_SHARDS: "run Sharded Fleet Poller tests",
+		TEST_TYPE_KEY_PIPELINE: "run Emulator Pipelining tests",
+		TEST_TYPE_KEY_WIRETIMING: "run Emulator Wire-Timing tests",
+		TEST_TYPE_KEY_LOADSIM: "run Emulator Load Simulation tests",
+		TEST_TYPE_KEY_FAULTS: "run Emulator Fault-Injection tests",
+		TEST_TYPE_KEY_FOOTPRINT: "run Emulator Footprint tests",
+		TEST_TYPE_KEY_CAPTURE: "run Wire Capture/Replay tests",
+		TEST_TYPE_KEY_VIRTUALCLOCK: "run Virtual Clock tests"
 	}
 
 ALL_TEST_TYPE_KEYS = [
@@ -45,17 +152,114 @@ ALL_TEST_TYPE_KEYS = [
 		TEST_TYPE_KEY_SIMPLE,
 		TEST_TYPE_KEY_VOLT,
 		TEST_TYPE_KEY_CURR,
-		TEST_TYPE_KEY_MEMPRESET
+		TEST_TYPE_KEY_MEMPRESET,
+		TEST_TYPE_KEY_SEQUENCE,
+		TEST_TYPE_KEY_STREAM,
+		TEST_TYPE_KEY_TELEMETRY,
+		TEST_TYPE_KEY_FLEET,
+		TEST_TYPE_KEY_MUX,
+		TEST_TYPE_KEY_GATEWAY,
+		TEST_TYPE_KEY_DISCOVERY,
+		TEST_TYPE_KEY_IDENTITY,
+		TEST_TYPE_KEY_SUPERVISED,
+		TEST_TYPE_KEY_RESYNC,
+		TEST_TYPE_KEY_TRANSPORT,
+		TEST_TYPE_KEY_LATENCY,
+		TEST_TYPE_KEY_EVENTLOOP,
+		TEST_TYPE_KEY_SHARDS,
+		TEST_TYPE_KEY_PIPELINE,
+		TEST_TYPE_KEY_WIRETIMING,
+		TEST_TYPE_KEY_LOADSIM,
+		TEST_TYPE_KEY_FAULTS,
+		TEST_TYPE_KEY_FOOTPRINT,
+		TEST_TYPE_KEY_CAPTURE,
+		TEST_TYPE_KEY_VIRTUALCLOCK
+	]
+
+# test types that use the instrument from the calling thread only:
+# with an emulated instrument they run on a VirtualClock, so that settle times
+# don't cost real time (pollers, gateways etc. in other threads need real time)
+VIRTUAL_CLOCK_TEST_TYPE_KEYS = [
+		TEST_TYPE_KEY_SIMPLE,
+		TEST_TYPE_KEY_VOLT,
+		TEST_TYPE_KEY_CURR,
+		TEST_TYPE_KEY_MEMPRESET,
+		TEST_TYPE_KEY_SEQUENCE,
+		TEST_TYPE_KEY_STREAM,
+		TEST_TYPE_KEY_TELEMETRY
 	]
 
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 
+def _read_fleet_table_in_subprocess(tableName, resQueue):
+	ftblObj = FleetStateTable(tableName)
+	resQueue.put(ftblObj.read_all())
+	ftblObj.close()
+
+class _GlitchingSerial(object):
+	def __init__(self, serObj):
+		""" Wraps a serial port and truncates the next responses
+		(the rest of a truncated response stays in the input buffer) """
+		self._serObj = serObj
+		self.truncateNext = 0
+
+	def __getattr__(self, name):
+		return getattr(self._serObj, name)
+
+	def read_until(self, expected=b"\n", size=None):
+		if self.truncateNext > 0:
+			self.truncateNext -= 1
+			return self._serObj.read_until(expected, 2)
+		return self._serObj.read_until(expected, size)
+
+class _EmulatorTcpBridge(object):
+	def __init__(self, modelId):
+		""" Serves an emulated instrument over TCP (like a serial-to-ethernet converter) """
+		self._listenSock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self._listenSock.bind(("127.0.0.1", 0))
+		self._listenSock.listen(1)
+		self._modelId = modelId
+		self._thread = threading.Thread(target=self._serve)
+		self._thread.daemon = True
+		self._thread.start()
+
+	def get_port(self):
+		return self._listenSock.getsockname()[1]
+
+	def close(self):
+		self._listenSock.close()
+		self._thread.join()
+
+	def _serve(self):
+		try:
+			connSock, _ = self._listenSock.accept()
+		except OSError:
+			return
+		emuObj = MansonInstrument()
+		emuObj.open_port(VIRTUAL_SERIAL_DEVICE, self._modelId)
+		serObj = emuObj._pyserObj
+		inpBy = b""
+		with connSock:
+			while True:
+				tmpBy = connSock.recv(256)
+				if not tmpBy:
+					break
+				inpBy += tmpBy
+				while b"\r" in inpBy:
+					cmdBy, inpBy = inpBy.split(b"\r", 1)
+					serObj.write(cmdBy + b"\r")
+					connSock.sendall(serObj.read_until(b"OK\r"))
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
 class TestMansonInstrument(object):
 	def __init__(self):
 		self._miCtrl = MansonInstrument()
 		self._hwSpecs = None
 		self._isEmulated = False
+		self._clockObj = MonotonicClock()
 
 	# --------------------------------------------------------------------------
 
@@ -73,6 +277,8 @@ class TestMansonInstrument(object):
 			if serialDevice is None and emulateModel is not None:
 				serialDevice = VIRTUAL_SERIAL_DEVICE
 			self._isEmulated = (serialDevice == VIRTUAL_SERIAL_DEVICE)
+			self._clockObj = (VirtualClock() if self._isEmulated and testType in VIRTUAL_CLOCK_TEST_TYPE_KEYS else MonotonicClock())
+			miCtrl.set_clock(self._clockObj)
 			if serialDevice is not None:
 				print("Open Serial Port '%s'" % serialDevice)
 				miCtrl.open_port(serialDevice, emulateModel)
@@ -100,10 +306,51 @@ class TestMansonInstrument(object):
 				self._hwSpecs = miCtrl.get_hw_specs()
 				if testType == TEST_TYPE_KEY_SIMPLE:
 					self._ttype_simple()
+				elif testType == TEST_TYPE_KEY_STREAM:
+					self._ttype_stream()
+				elif testType == TEST_TYPE_KEY_TELEMETRY:
+					self._ttype_telemetry()
+				elif testType == TEST_TYPE_KEY_FLEET:
+					self._ttype_fleet()
+				elif testType == TEST_TYPE_KEY_MUX:
+					self._ttype_mux()
+				elif testType == TEST_TYPE_KEY_GATEWAY:
+					self._ttype_gateway()
+				elif testType == TEST_TYPE_KEY_DISCOVERY:
+					self._ttype_discovery()
+				elif testType == TEST_TYPE_KEY_IDENTITY:
+					self._ttype_identity()
+				elif testType == TEST_TYPE_KEY_SUPERVISED:
+					self._ttype_supervised()
+				elif testType == TEST_TYPE_KEY_RESYNC:
+					self._ttype_resync()
+				elif testType == TEST_TYPE_KEY_TRANSPORT:
+					self._ttype_transport()
+				elif testType == TEST_TYPE_KEY_LATENCY:
+					self._ttype_latency()
+				elif testType == TEST_TYPE_KEY_EVENTLOOP:
+					self._ttype_event_engine()
+				elif testType == TEST_TYPE_KEY_SHARDS:
+					self._ttype_shards()
+				elif testType == TEST_TYPE_KEY_PIPELINE:
+					self._ttype_pipeline()
+				elif testType == TEST_TYPE_KEY_WIRETIMING:
+					self._ttype_wire_timing()
+				elif testType == TEST_TYPE_KEY_LOADSIM:
+					self._ttype_load_simulation()
+				elif testType == TEST_TYPE_KEY_FAULTS:
+					self._ttype_fault_injection()
+				elif testType == TEST_TYPE_KEY_FOOTPRINT:
+					self._ttype_footprint()
+				elif testType == TEST_TYPE_KEY_CAPTURE:
+					self._ttype_capture()
+				elif testType == TEST_TYPE_KEY_VIRTUALCLOCK:
+					self._ttype_virtual_clock()
 				else:
 					if not self._isEmulated:
 						print("-" * 16)
-						if testType == TEST_TYPE_KEY_MEMPRESET or testType == TEST_TYPE_KEY_VOLT:
+						if testType == TEST_TYPE_KEY_MEMPRESET or testType == TEST_TYPE_KEY_VOLT or \
+								testType == TEST_TYPE_KEY_SEQUENCE:
 							print("YOU -MAY- CONNECT AN ELECTRONIC LOAD TO THE POWER SUPPLY")
 							print("AND SET IT IN CONSTANT CURRENT MODE WITH A CURRENT == 0.1A.")
 							print("OR SIMPLY DISCONNECT ANY LOAD FROM THE POWER SUPPLY")
@@ -118,6 +365,8 @@ class TestMansonInstrument(object):
 						self._ttype_volt()
 					elif testType == TEST_TYPE_KEY_CURR:
 						self._ttype_curr()
+					elif testType == TEST_TYPE_KEY_SEQUENCE:
+						self._ttype_sequence()
 			print("-" * 32)
 		except TestFailedError as err:
 			print("")
@@ -211,8 +460,7 @@ class TestMansonInstrument(object):
 		print("Enable output: ", end="")
 		miCtrl.set_output_state(True)
 		print("OK")
-		if not self._isEmulated:
-			time.sleep(1)
+		self._clockObj.sleep(1.0)
 		#
 		print("Output state: ", end="")
 		tmpB = miCtrl.get_output_state()
@@ -274,6 +522,1481 @@ class TestMansonInstrument(object):
 			except ValueError:
 				print("OK (expected failure)")
 
+	def _ttype_stream(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Streaming:")
+		# the real hardware needs about 200ms per command
+		rateHz = 50.0 if self._isEmulated else 2.0
+		count = 20
+		#
+		print("Stream %d samples at %.1fHz: " % (count, rateHz))
+		lastSeq = -1
+		lastS = None
+		for entryS in miCtrl.stream(rateHz, count=count):
+			print("  #%3d: %6.3fV / %6.3fA / %s (late %6.3fms)" %
+					(entryS["seq"], entryS["volt"], entryS["curr"], entryS["mode"], entryS["lateS"] * 1000.0))
+			if entryS["seq"] <= lastSeq:
+				raise TestFailedError("! unexpected sequence number")
+			lastSeq = entryS["seq"]
+			lastS = entryS
+		print("Missed deadlines: %d, effective rate: %.2fHz" % (lastS["missed"], lastS["rateHz"]))
+		if lastS["seq"] != count - 1 + lastS["missed"]:
+			raise TestFailedError("! unexpected amount of samples")
+		if lastS["rateHz"] > rateHz * 1.05:
+			raise TestFailedError("! unexpected rate")
+		# a slow consumer leads to missed deadlines instead of a burst of samples
+		print("Stream with slow consumer: ", end="")
+		tmpGen = miCtrl.stream(rateHz)
+		entryS = next(tmpGen)
+		self._clockObj.sleep(3.5 / rateHz)
+		entryS = next(tmpGen)
+		tmpGen.close()
+		print("seq=%d, missed=%d" % (entryS["seq"], entryS["missed"]))
+		if entryS["missed"] < 2:
+			raise TestFailedError("! unexpected amount of missed deadlines")
+
+	def _ttype_telemetry(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Telemetry Logger:")
+		rateHz = 200.0 if self._isEmulated else 2.0
+		count = 50 if self._isEmulated else 10
+		#
+		with tempfile.TemporaryDirectory() as tmpDir:
+			tlogPath = os.path.join(tmpDir, "telemetry.bin")
+			print("Log %d samples: " % count, end="")
+			tlogObj = TelemetryLogger(tlogPath, self._hwSpecs, chunkSize=16)
+			sampleArr = []
+			for entryS in miCtrl.stream(rateHz, count=count):
+				sampleArr.append(entryS)
+				tlogObj.append_sample(entryS)
+			tlogObj.close()
+			tmpD = tlogObj.get_stats()
+			print("OK (%d chunks, %d bytes)" % (tmpD["chunks"], tmpD["bytes"]))
+			if tmpD["samples"] != count or tmpD["chunks"] != (count + 15) // 16:
+				raise TestFailedError("! unexpected stats")
+			#
+			print("Read back: ", end="")
+			readArr = list(iter_telemetry_samples(tlogPath))
+			if len(readArr) != count:
+				raise TestFailedError("! unexpected amount of samples")
+			for ix in range(count):
+				if readArr[ix]["time"] != sampleArr[ix]["time"] or \
+						readArr[ix]["volt"] != sampleArr[ix]["volt"] or \
+						readArr[ix]["curr"] != sampleArr[ix]["curr"] or \
+						readArr[ix]["mode"] != sampleArr[ix]["mode"]:
+					raise TestFailedError("! unexpected sample #%d" % ix)
+			print("OK")
+			#
+			print("Export to CSV: ", end="")
+			tmpI = export_telemetry_csv(tlogPath, os.path.join(tmpDir, "telemetry.csv"))
+			if tmpI != count:
+				raise TestFailedError("! unexpected amount of exported samples")
+			print("OK")
+			#
+			print("Reopen after truncated chunk: ", end="")
+			with open(tlogPath, "r+b") as fileObj:
+				fileObj.truncate(os.path.getsize(tlogPath) - 5)
+			tlogObj = TelemetryLogger(tlogPath, self._hwSpecs, chunkSize=16)
+			for entryS in sampleArr[:16]:
+				tlogObj.append_sample(entryS)
+			tlogObj.close()
+			# the truncated last chunk is lost, the samples appended afterwards are not
+			expArr = sampleArr[:count - (count % 16 or 16)] + sampleArr[:16]
+			readArr = list(iter_telemetry_samples(tlogPath))
+			if [x["time"] for x in readArr] != [x["time"] for x in expArr]:
+				raise TestFailedError("! unexpected samples after reopening")
+			print("OK")
+			#
+			print("Ring buffer: ", end="")
+			ringPath = os.path.join(tmpDir, "telemetry.ring")
+			ringCap = 16
+			ringWrObj = TelemetryRingWriter(ringPath, self._hwSpecs, capacity=ringCap)
+			ringRdObj = TelemetryRingReader(ringPath)
+			for entryS in sampleArr[:10]:
+				ringWrObj.append_sample(entryS)
+			tmpD = ringRdObj.read_since(0)
+			if len(tmpD["records"]) != 10 or tmpD["lost"] != 0:
+				raise TestFailedError("! unexpected amount of records")
+			cursor = tmpD["cursor"]
+			for entryS in sampleArr[10:]:
+				ringWrObj.append_sample(entryS)
+			tmpD = ringRdObj.read_since(cursor)
+			if len(tmpD["records"]) != ringCap or tmpD["lost"] != count - 10 - ringCap:
+				raise TestFailedError("! unexpected amount of records")
+			tmpA = ringRdObj.read_latest(4)
+			for ix in range(4):
+				entryS = sampleArr[count - 4 + ix]
+				if tmpA[ix]["seq"] != count - 4 + ix or tmpA[ix]["time"] != entryS["time"] or \
+						tmpA[ix]["volt"] != entryS["volt"] or tmpA[ix]["curr"] != entryS["curr"]:
+					raise TestFailedError("! unexpected record #%d" % ix)
+			ringWrObj.close()
+			print("OK")
+			#
+			print("Restart ring writer: ", end="")
+			# the old reader keeps the old ring, a smaller new one mustn't make it crash
+			ringWrObj = TelemetryRingWriter(ringPath, self._hwSpecs, capacity=ringCap // 4)
+			if ringRdObj.read_latest(4) != tmpA:
+				raise TestFailedError("! old ring has changed")
+			ringRdObj.close()
+			ringRdObj = TelemetryRingReader(ringPath)
+			ringWrObj.append_sample(sampleArr[0])
+			tmpA = ringRdObj.read_latest(4)
+			if len(tmpA) != 1 or tmpA[0]["time"] != sampleArr[0]["time"]:
+				raise TestFailedError("! unexpected records %s" % str(tmpA))
+			ringRdObj.close()
+			ringWrObj.close()
+			if os.listdir(tmpDir).count("telemetry.ring") != 1 or [x for x in os.listdir(tmpDir) if ".tmp" in x]:
+				raise TestFailedError("! unexpected files %s" % str(os.listdir(tmpDir)))
+			print("OK")
+
+	def _ttype_fleet(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Fleet Poller:")
+		#
+		instruments = {"psu0": miCtrl}
+		if self._isEmulated:
+			for ix in range(1, 4):
+				tmpMi = MansonInstrument()
+				tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, miCtrl.get_hw_model())
+				instruments["psu%d" % ix] = tmpMi
+		rateHz = 50.0 if self._isEmulated else 2.0
+		ftblObj = FleetStateTable(deviceIds=sorted(instruments.keys()))
+		try:
+			pollObj = FleetPoller(instruments, rateHz=rateHz, outpStateEvery=5)
+			pollObj.add_sink(ftblObj.update)
+			print("Poll %d devices for 1s: " % len(instruments), end="")
+			pollObj.start()
+			time.sleep(1.0)
+			pollObj.stop()
+			print("OK")
+			for deviceId, statsD in sorted(pollObj.get_stats().items()):
+				print("  %s: %s" % (deviceId, str(statsD)))
+				if statsD["samples"] == 0 or statsD["errors"] != 0:
+					raise TestFailedError("! unexpected stats")
+			#
+			print("Read table from other process: ", end="")
+			tmpCtx = multiprocessing.get_context("fork")
+			resQueue = tmpCtx.Queue()
+			tmpProc = tmpCtx.Process(target=_read_fleet_table_in_subprocess, args=(ftblObj.get_name(), resQueue))
+			tmpProc.start()
+			rowsD = resQueue.get(timeout=10.0)
+			tmpProc.join()
+			for deviceId in instruments:
+				tmpLatest = pollObj.get_latest(deviceId)
+				tmpRow = rowsD[deviceId]
+				if tmpRow is None or tmpRow["seq"] != tmpLatest["seq"] or tmpRow["time"] != tmpLatest["time"] or \
+						tmpRow["volt"] != tmpLatest["volt"] or tmpRow["curr"] != tmpLatest["curr"] or \
+						tmpRow["mode"] != tmpLatest["mode"] or tmpRow["outp"] != tmpLatest["outp"]:
+					raise TestFailedError("! unexpected row for '%s'" % deviceId)
+			print("OK")
+			#
+			print("Stop at 0.1Hz: ", end="")
+			pollObj = FleetPoller({"psu0": miCtrl}, rateHz=0.1, outpStateEvery=0)
+			pollObj.start()
+			time.sleep(0.2)
+			startT = time.monotonic()
+			pollObj.stop()
+			stopS = time.monotonic() - startT
+			if stopS > 1.0 or pollObj.get_stats()["psu0"]["samples"] != 1:
+				raise TestFailedError("! stop took %.3fs" % stopS)
+			print("OK (%.1fms)" % (stopS * 1000.0))
+		finally:
+			ftblObj.close()
+			for deviceId in instruments:
+				if instruments[deviceId] is not miCtrl:
+					instruments[deviceId].close_port()
+
+	def _ttype_mux(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Multiplexing Daemon:")
+		#
+		with tempfile.TemporaryDirectory() as tmpDir:
+			socketPath = os.path.join(tmpDir, "mux.sock")
+			daemonObj = MuxDaemon({"psu0": miCtrl}, socketPath=socketPath, freshnessS=0.2)
+			daemonObj.start()
+			try:
+				print("Connect client: ", end="")
+				cliObj = MansonInstrumentClient(socketPath)
+				cliObj.open_port("psu0")
+				print("OK")
+				print("Model via daemon: ", end="")
+				tmpS = cliObj.get_hw_model()
+				print(tmpS)
+				if tmpS != miCtrl.get_hw_model():
+					raise TestFailedError("! unexpected value")
+				#
+				print("Unknown device: ", end="")
+				try:
+					MansonInstrumentClient(socketPath).open_port("psu1")
+					raise TestFailedError("! unexpected success")
+				except CouldNotConnectError:
+					print("OK (expected failure)")
+				print("Invalid request: ", end="")
+				with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as tmpSock:
+					tmpSock.connect(socketPath)
+					for reqVal in [[], 1, {"d": ["psu0"], "f": "get_output_state"}]:
+						mux_send_frame(tmpSock, reqVal)
+						respD = mux_recv_frame(tmpSock)
+						if not isinstance(respD, dict) or "e" not in respD:
+							raise TestFailedError("! unexpected response %s" % str(respD))
+				print("OK (expected failure)")
+				print("Remote exception: ", end="")
+				try:
+					cliObj.set_preset_voltage(self._hwSpecs["maxVolt"] + 1.0)
+					raise TestFailedError("! unexpected success")
+				except ValueError:
+					print("OK (expected failure)")
+				except FunctionNotSupportedForModelError:
+					print("(not supported)")
+				#
+				print("Concurrent clients: ", end="")
+				expVolt = miCtrl.get_output_voltage()
+				errArr = []
+				def _client_thread():
+					try:
+						tmpCli = MansonInstrumentClient(socketPath)
+						tmpCli.open_port("psu0")
+						for _ in range(10):
+							if tmpCli.get_output_voltage() != expVolt:
+								errArr.append("unexpected value")
+							tmpCli.get_is_output_mode_cv()
+						tmpCli.close_port()
+					except Exception as err:
+						errArr.append(str(err))
+				threadList = [threading.Thread(target=_client_thread) for _ in range(4)]
+				for tmpThread in threadList:
+					tmpThread.start()
+				for tmpThread in threadList:
+					tmpThread.join()
+				if errArr:
+					raise TestFailedError("! %s" % errArr[0])
+				statsD = daemonObj.get_stats()
+				print("OK (%s)" % str(statsD))
+				# 80 GETD based reads within the freshness window need only a few commands
+				if statsD["coalesced"] < 40:
+					raise TestFailedError("! reads have not been coalesced")
+				#
+				print("Cache eviction: ", end="")
+				for ix in range(20):
+					cliObj.round_value(1.0 + ix * 0.01, True)
+				time.sleep(0.3)
+				cliObj.get_hw_version()
+				# only the last read is left, round_value() isn't cached at all
+				cacheKeys = list(daemonObj._devSched["psu0"]["cache"].keys())
+				if cacheKeys != [("get_hw_version", "[]")]:
+					raise TestFailedError("! unexpected cache entries %s" % str(cacheKeys))
+				print("OK")
+				cliObj.close_port()
+			finally:
+				daemonObj.stop()
+
+	def _ttype_gateway(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test HTTP Gateway:")
+		#
+		instruments = {"psu0": miCtrl}
+		if self._isEmulated:
+			for ix in range(1, 4):
+				tmpMi = MansonInstrument()
+				tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, miCtrl.get_hw_model())
+				instruments["psu%d" % ix] = tmpMi
+		pollObj = FleetPoller(instruments, rateHz=(20.0 if self._isEmulated else 1.0), outpStateEvery=1)
+		gwObj = HttpGateway(instruments, port=0, poller=pollObj)
+		baseUrl = "http://127.0.0.1:%d" % gwObj.get_port()
+
+		def _http_req(path, reqD=None):
+			tmpData = (None if reqD is None else json.dumps(reqD).encode("utf-8"))
+			with urllib.request.urlopen(baseUrl + path, data=tmpData, timeout=30.0) as respObj:
+				return json.loads(respObj.read().decode("utf-8"))
+
+		try:
+			pollObj.start()
+			gwObj.start()
+			time.sleep(0.5 if self._isEmulated else 2.5)
+			#
+			print("Devices: ", end="")
+			respD = _http_req("/devices")
+			print(sorted(respD["devices"].keys()))
+			if sorted(respD["devices"].keys()) != sorted(instruments.keys()) or \
+					respD["devices"]["psu0"]["model"] != miCtrl.get_hw_model():
+				raise TestFailedError("! unexpected value")
+			#
+			print("Values from poller cache: ", end="")
+			respD = _http_req("/values?maxAgeMs=5000")
+			if respD["errors"] or sorted(respD["values"].keys()) != sorted(instruments.keys()):
+				raise TestFailedError("! unexpected response %s" % str(respD))
+			for deviceId in respD["values"]:
+				if respD["values"][deviceId]["source"] != "cache":
+					raise TestFailedError("! '%s' has not been served from cache" % deviceId)
+			print("OK")
+			print("Values from devices: ", end="")
+			respD = _http_req("/values?devices=psu0&maxAgeMs=0")
+			if respD["errors"] or list(respD["values"].keys()) != ["psu0"] or \
+					respD["values"]["psu0"]["source"] != "device" or \
+					respD["values"]["psu0"]["volt"] != miCtrl.get_output_voltage():
+				raise TestFailedError("! unexpected response %s" % str(respD))
+			print("OK")
+			#
+			print("Batch: ", end="")
+			opsArr = []
+			for deviceId in sorted(instruments.keys()):
+				# setting the current preset again doesn't change anything on the PSU
+				try:
+					tmpV = instruments[deviceId].get_preset_voltage_current()["volt"]
+				except FunctionNotSupportedForModelError:
+					tmpV = self._hwSpecs["minVolt"]
+				opsArr.append({"device": deviceId, "fn": "set_preset_voltage", "args": [tmpV]})
+				opsArr.append({"device": deviceId, "fn": "get_preset_voltage_current", "args": []})
+			opsArr.append({"device": "psu0", "fn": "set_preset_voltage", "args": [self._hwSpecs["maxVolt"] + 1.0]})
+			respD = _http_req("/batch", {"ops": opsArr})
+			resArr = respD["results"]
+			if len(resArr) != len(opsArr):
+				raise TestFailedError("! unexpected amount of results")
+			for opIx in range(0, len(opsArr) - 1, 2):
+				if resArr[opIx]["ok"]:
+					if not resArr[opIx + 1]["ok"] or resArr[opIx + 1]["result"]["volt"] != opsArr[opIx]["args"][0]:
+						raise TestFailedError("! unexpected result %s" % str(resArr[opIx + 1]))
+				elif resArr[opIx]["errorType"] != FunctionNotSupportedForModelError.__name__:
+					raise TestFailedError("! unexpected result %s" % str(resArr[opIx]))
+			if resArr[-1]["ok"] or resArr[-1]["errorType"] not in ("ValueError", FunctionNotSupportedForModelError.__name__):
+				raise TestFailedError("! unexpected result %s" % str(resArr[-1]))
+			print("OK")
+			print("Invalid batch: ", end="")
+			for entryOp in [{"device": "psu0", "fn": "close_port", "args": []},
+					{"device": ["psu0"], "fn": "get_output_state", "args": []}]:
+				try:
+					_http_req("/batch", {"ops": [entryOp]})
+					raise TestFailedError("! unexpected success")
+				except urllib.error.HTTPError as err:
+					if err.code != 400:
+						raise TestFailedError("! unexpected status %d" % err.code)
+			# a negative Content-Length would make the gateway wait for the end of the connection
+			connObj = http.client.HTTPConnection("127.0.0.1", gwObj.get_port(), timeout=30.0)
+			try:
+				connObj.putrequest("POST", "/batch")
+				connObj.putheader("Content-Length", "-1")
+				connObj.endheaders()
+				tmpStatus = connObj.getresponse().status
+			finally:
+				connObj.close()
+			if tmpStatus != 400:
+				raise TestFailedError("! unexpected status %d" % tmpStatus)
+			print("OK (expected failure)")
+		finally:
+			gwObj.stop()
+			pollObj.stop()
+			for deviceId in instruments:
+				if instruments[deviceId] is not miCtrl:
+					instruments[deviceId].close_port()
+
+	def _ttype_discovery(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Port Discovery:")
+		#
+		# emulated ports only, the real instrument's port is already in use
+		portInfos = []
+		for ix in range(3):
+			tmpPi = ListPortInfo(VIRTUAL_SERIAL_DEVICE, skip_link_detection=True)
+			tmpPi.vid = 0x10C4
+			tmpPi.pid = 0xEA60
+			tmpPi.serial_number = "EMU%04d" % ix
+			portInfos.append(tmpPi)
+		tmpPi = ListPortInfo(VIRTUAL_SERIAL_DEVICE, skip_link_detection=True)
+		portInfos.append(tmpPi)  # no stable identity
+		with tempfile.TemporaryDirectory() as tmpDir:
+			cachePath = os.path.join(tmpDir, "ports.json")
+			for runIx in range(2):
+				print("Discover (run #%d): " % (runIx + 1), end="")
+				cacheObj = PortIdentityCache(cachePath)
+				resArr = discover_instruments(portInfos, cacheObj=cacheObj, emulateModel=miCtrl.get_hw_model())
+				print([(x["identity"], x["source"]) for x in resArr])
+				for entryRes in resArr:
+					if entryRes["error"] is not None or entryRes["model"] != miCtrl.get_hw_model():
+						raise TestFailedError("! unexpected result %s" % str(entryRes))
+					expSource = PDISC_SOURCE_CACHE if runIx == 1 and entryRes["identity"] is not None else PDISC_SOURCE_PROBE
+					if entryRes["source"] != expSource:
+						raise TestFailedError("! unexpected source for '%s'" % entryRes["identity"])
+			print("Invalid cache file: ", end="")
+			with open(cachePath, "w") as fileObj:
+				fileObj.write("{invalid")
+			cacheObj = PortIdentityCache(cachePath)
+			if cacheObj.get_identities():
+				raise TestFailedError("! unexpected entries")
+			print("OK (discarded)")
+
+	def _ttype_identity(self):
+		miCtrl = self._miCtrl
+		modelId = miCtrl.get_hw_model()
+		otherModelId = [x for x in TEST_MODEL_LIST if models_get_hw_model_id(x) != modelId][0]
+		identity = "emu:0"
+		#
+		print("-" * 32)
+		print("Test Identity Cache:")
+		#
+		# emulated ports only, the real instrument's port is already in use
+		with tempfile.TemporaryDirectory() as tmpDir:
+			cachePath = os.path.join(tmpDir, "ports.json")
+			print("Open with empty cache: ", end="")
+			tmpMi = open_instrument(VIRTUAL_SERIAL_DEVICE, PortIdentityCache(cachePath), identity=identity, emulateModel=modelId)
+			expInfo = tmpMi.get_identity_info()
+			tmpMi.close_port()
+			if not tmpMi.is_identity_verified() or expInfo["model"] != modelId or expInfo["version"] is None:
+				raise TestFailedError("! unexpected identity %s" % str(expInfo))
+			print("OK")
+			#
+			print("Open with cache: ", end="")
+			tmpMi = open_instrument(VIRTUAL_SERIAL_DEVICE, PortIdentityCache(cachePath), identity=identity, emulateModel=modelId)
+			if tmpMi.is_identity_verified() or tmpMi.get_identity_info() != expInfo or \
+					tmpMi.get_hw_version() != expInfo["version"] or tmpMi.get_hw_specs()["maxVolt"] != self._hwSpecs["maxVolt"]:
+				raise TestFailedError("! cached identity has not been used")
+			if tmpMi.is_identity_verified():
+				raise TestFailedError("! unexpected command")
+			tmpMi.get_output_voltage()
+			if not tmpMi.is_identity_verified():
+				raise TestFailedError("! identity has not been verified")
+			tmpMi.close_port()
+			print("OK")
+			#
+			print("Open with expired cache: ", end="")
+			tmpMi = open_instrument(VIRTUAL_SERIAL_DEVICE, PortIdentityCache(cachePath), identity=identity, maxAgeS=0.0,
+					emulateModel=modelId)
+			if not tmpMi.is_identity_verified():
+				raise TestFailedError("! expired identity has been used")
+			tmpMi.close_port()
+			print("OK")
+			#
+			print("Open with stale cache (%s): " % otherModelId, end="")
+			cacheObj = PortIdentityCache(cachePath)
+			tmpMi = MansonInstrument()
+			tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, otherModelId)
+			store_instrument_identity(tmpMi, cacheObj, identity)
+			tmpMi.close_port()
+			tmpMi = open_instrument(VIRTUAL_SERIAL_DEVICE, cacheObj, identity=identity, emulateModel=modelId)
+			try:
+				tmpMi.get_output_voltage()
+				raise TestFailedError("! unexpected success")
+			except IdentityMismatchError:
+				pass
+			if tmpMi.get_hw_model() != modelId or tmpMi.get_hw_specs()["maxVolt"] != self._hwSpecs["maxVolt"]:
+				raise TestFailedError("! instrument has not been re-initialized")
+			tmpMi.get_output_voltage()
+			store_instrument_identity(tmpMi, cacheObj, identity)
+			tmpMi.close_port()
+			if PortIdentityCache(cachePath).get(identity)["model"] != modelId:
+				raise TestFailedError("! cache has not been updated")
+			print("OK (expected failure)")
+			#
+			print("Lost verification response: ", end="")
+			tmpMi = MansonInstrument()
+			tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, otherModelId)
+			store_instrument_identity(tmpMi, cacheObj, identity)
+			tmpMi.close_port()
+			tmpMi = open_instrument(VIRTUAL_SERIAL_DEVICE, cacheObj, identity=identity, emulateModel=modelId)
+			try:
+				tmpMi.set_io_policy(timeoutS=0.1, getRetries=0)
+				tmpMi._pyserObj.set_fault_schedule({0: EIS_FAULT_DROP})
+				try:
+					tmpMi.get_output_voltage()
+					raise TestFailedError("! unexpected success")
+				except ResponseTimeoutError:
+					pass
+				if tmpMi.is_identity_verified():
+					raise TestFailedError("! identity verified without response")
+				# the next command verifies the identity again
+				try:
+					tmpMi.get_output_voltage()
+					raise TestFailedError("! unexpected success")
+				except IdentityMismatchError:
+					pass
+				if tmpMi.get_hw_model() != modelId:
+					raise TestFailedError("! instrument has not been re-initialized")
+			finally:
+				tmpMi.close_port()
+			print("OK (expected failure)")
+
+	def _ttype_supervised(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Supervised Instrument:")
+		#
+		# emulated port only, the real instrument's port can't be unplugged by the test
+		supObj = SupervisedInstrument(reconnectTimeoutS=5.0)
+		supObj.open_port(VIRTUAL_SERIAL_DEVICE, miCtrl.get_hw_model())
+		try:
+			expVolt = supObj.round_value(self._hwSpecs["minVolt"] + (self._hwSpecs["maxVolt"] - self._hwSpecs["minVolt"]) / 3.0, True)
+			try:
+				supObj.set_preset_voltage(expVolt)
+			except FunctionNotSupportedForModelError:
+				expVolt = None
+			supObj.set_output_state(False)
+			print("Setpoints: %s" % str(supObj.get_setpoints()))
+			#
+			print("Lose transport: ", end="")
+			oldMi = supObj.get_instrument()
+			# the new emulated instrument starts with its default values (like after a power cycle)
+			oldMi._pyserObj.close()
+			if supObj.get_output_state() != False:
+				raise TestFailedError("! output state has not been restored")
+			if expVolt is not None and supObj.get_preset_voltage_current()["volt"] != expVolt:
+				raise TestFailedError("! preset voltage has not been restored")
+			statsD = supObj.get_stats()
+			if supObj.get_instrument() is oldMi or statsD["reconnects"] != 1 or \
+					statsD["replayed"] != len(supObj.get_setpoints()):
+				raise TestFailedError("! unexpected stats %s" % str(statsD))
+			print("OK (recovered in %.1fms)" % (statsD["lastRecoveryS"] * 1000.0))
+		finally:
+			supObj.close_port()
+		#
+		print("Unplug/replug serial port: ", end="")
+		with tempfile.TemporaryDirectory() as tmpDir:
+			# the link keeps the device path stable like /dev/serial/by-id does
+			linkPath = os.path.join(tmpDir, "ttyPSU")
+			srvArr = [PtyEmulatorServer([miCtrl.get_hw_model()])]
+			srvArr[0].start()
+			os.symlink(srvArr[0].get_device_paths()[0], linkPath)
+
+			def _replug():
+				time.sleep(0.5)
+				srvObj = PtyEmulatorServer([miCtrl.get_hw_model()])
+				srvObj.start()
+				srvArr.append(srvObj)
+				os.symlink(srvObj.get_device_paths()[0], linkPath)
+
+			supObj = SupervisedInstrument(reconnectTimeoutS=10.0, retryIntervalS=0.1)
+			replugThread = threading.Thread(target=_replug)
+			try:
+				supObj.open_port(linkPath)
+				# the new emulated instrument starts with the output switched on
+				supObj.set_output_state(False)
+				srvArr[0].stop()
+				os.remove(linkPath)
+				replugThread.start()
+				if supObj.get_output_state() != False:
+					raise TestFailedError("! output state has not been restored")
+				statsD = supObj.get_stats()
+				if statsD["reconnects"] != 1 or statsD["attempts"] < 2:
+					raise TestFailedError("! unexpected stats %s" % str(statsD))
+				print("OK (recovered in %.1fms after %d attempts)" % (statsD["lastRecoveryS"] * 1000.0, statsD["attempts"]))
+			finally:
+				supObj.close_port()
+				if replugThread.is_alive():
+					replugThread.join()
+				for srvObj in srvArr:
+					srvObj.stop()
+		#
+		print("Replug after failed reconnection: ", end="")
+		with tempfile.TemporaryDirectory() as tmpDir:
+			linkPath = os.path.join(tmpDir, "ttyPSU")
+			srvArr = [PtyEmulatorServer([miCtrl.get_hw_model()])]
+			srvArr[0].start()
+			os.symlink(srvArr[0].get_device_paths()[0], linkPath)
+			supObj = SupervisedInstrument(reconnectTimeoutS=0.3, retryIntervalS=0.1)
+			try:
+				supObj.open_port(linkPath)
+				supObj.set_output_state(False)
+				srvArr[0].stop()
+				os.remove(linkPath)
+				try:
+					supObj.get_output_state()
+					raise TestFailedError("! unexpected success")
+				except CouldNotConnectError:
+					pass
+				srvArr.append(PtyEmulatorServer([miCtrl.get_hw_model()]))
+				srvArr[-1].start()
+				os.symlink(srvArr[-1].get_device_paths()[0], linkPath)
+				# the next call starts a new reconnection
+				if supObj.get_output_state() != False:
+					raise TestFailedError("! output state has not been restored")
+				statsD = supObj.get_stats()
+				if statsD["reconnects"] != 1 or statsD["failedReconnects"] != 1:
+					raise TestFailedError("! unexpected stats %s" % str(statsD))
+				supObj.close_port()
+				try:
+					supObj.get_output_state()
+					raise TestFailedError("! unexpected success")
+				except NotConnectedError:
+					pass
+				print("OK")
+			finally:
+				supObj.close_port()
+				for srvObj in srvArr:
+					srvObj.stop()
+
+	def _ttype_resync(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Timeout/Resync/Retry:")
+		#
+		def _check_stats_delta(statsBefore, expDelta):
+			statsAfter = miCtrl.get_io_stats()
+			for tmpKey in expDelta:
+				if statsAfter[tmpKey] - statsBefore[tmpKey] != expDelta[tmpKey]:
+					raise TestFailedError("! unexpected stats %s (before: %s)" % (str(statsAfter), str(statsBefore)))
+
+		glitchObj = _GlitchingSerial(miCtrl._pyserObj)
+		miCtrl._pyserObj = glitchObj
+		try:
+			expVolt = miCtrl.get_output_voltage()
+			outpState = miCtrl.get_output_state()
+			#
+			print("GET after truncated response: ", end="")
+			statsBefore = miCtrl.get_io_stats()
+			glitchObj.truncateNext = 1
+			if miCtrl.get_output_voltage() != expVolt:
+				raise TestFailedError("! unexpected value")
+			_check_stats_delta(statsBefore, {"commands": 2, "timeouts": 1, "retries": 1, "resyncs": 1, "failures": 0})
+			print("OK (retried)")
+			#
+			print("SET after truncated response: ", end="")
+			statsBefore = miCtrl.get_io_stats()
+			glitchObj.truncateNext = 1
+			try:
+				miCtrl.set_output_state(outpState)
+				raise TestFailedError("! unexpected success")
+			except ResponseTimeoutError:
+				pass
+			_check_stats_delta(statsBefore, {"commands": 1, "timeouts": 1, "retries": 0, "failures": 1})
+			print("OK (expected failure)")
+			print("Next command: ", end="")
+			statsBefore = miCtrl.get_io_stats()
+			if miCtrl.get_output_state() != outpState:
+				raise TestFailedError("! unexpected value")
+			_check_stats_delta(statsBefore, {"commands": 1, "timeouts": 0, "retries": 0})
+			print("OK")
+			#
+			print("SET with retries: ", end="")
+			miCtrl.set_io_policy(setRetries=1)
+			statsBefore = miCtrl.get_io_stats()
+			glitchObj.truncateNext = 1
+			miCtrl.set_output_state(outpState)
+			_check_stats_delta(statsBefore, {"commands": 2, "timeouts": 1, "retries": 1, "failures": 0})
+			print("OK (retried)")
+			#
+			print("GET with too many truncated responses: ", end="")
+			statsBefore = miCtrl.get_io_stats()
+			glitchObj.truncateNext = 3
+			try:
+				miCtrl.get_output_voltage()
+				raise TestFailedError("! unexpected success")
+			except ResponseTimeoutError:
+				pass
+			_check_stats_delta(statsBefore, {"commands": 3, "timeouts": 3, "retries": 2, "failures": 1})
+			print("OK (expected failure)")
+		finally:
+			glitchObj.truncateNext = 0
+			miCtrl._pyserObj = glitchObj._serObj
+			miCtrl.set_io_policy()
+
+	def _ttype_transport(self):
+		miCtrl = self._miCtrl
+		modelId = miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Transports:")
+		print("Registered: %s" % str(get_transport_schemes()))
+		#
+		print("emulated://%s: " % modelId, end="")
+		tmpMi = MansonInstrument()
+		tmpMi.open_port("emulated://%s" % modelId)
+		if tmpMi.get_hw_model() != modelId or tmpMi.get_hw_specs()["maxVolt"] != self._hwSpecs["maxVolt"]:
+			raise TestFailedError("! unexpected model")
+		tmpMi.close_port()
+		print("OK")
+		#
+		print("socket://: ", end="")
+		bridgeObj = _EmulatorTcpBridge(modelId)
+		try:
+			tmpMi = MansonInstrument()
+			tmpMi.open_port("socket://127.0.0.1:%d" % bridgeObj.get_port())
+			tmpModel = tmpMi.get_hw_model()
+			tmpV = tmpMi.get_output_voltage()
+			tmpMi.close_port()
+		finally:
+			bridgeObj.close()
+		if tmpModel != modelId:
+			raise TestFailedError("! unexpected model")
+		print("OK (%.3fV)" % tmpV)
+		#
+		if sys.platform.startswith("linux"):
+			print("pty://%s: " % modelId, end="")
+			tmpMi = MansonInstrument()
+			tmpMi.open_port("pty://%s" % modelId)
+			try:
+				tmpModel = tmpMi.get_hw_model()
+				tmpD = tmpMi.get_output_values()
+			finally:
+				tmpMi.close_port()
+			if tmpModel != modelId or tmpD != miCtrl.get_output_values():
+				raise TestFailedError("! unexpected model or values")
+			print("OK (%s)" % str(tmpD))
+			#
+			print("PtyEmulatorServer with wire timing: ", end="")
+			srvObj = PtyEmulatorServer([modelId] * 2, wireTiming=True)
+			srvObj.start()
+			try:
+				rttArr = []
+				for comPort in srvObj.get_device_paths():
+					tmpMi = MansonInstrument()
+					tmpMi.open_port(comPort)
+					tmpMi.get_output_values()
+					rttArr.append(tmpMi.get_io_stats()["lastRoundTripS"])
+					tmpMi.close_port()
+			finally:
+				srvObj.stop()
+			if min(rttArr) < build_timing_model(modelId)["turnaroundS"]:
+				raise TestFailedError("! round-trip time too short %s" % str(rttArr))
+			print("OK (%.1fms)" % (max(rttArr) * 1000.0))
+			#
+			print("pty://nope: ", end="")
+			try:
+				MansonInstrument().open_port("pty://nope")
+				raise TestFailedError("! unexpected success")
+			except CouldNotConnectError:
+				print("OK (expected failure)")
+		#
+		print("Unknown transport: ", end="")
+		try:
+			MansonInstrument().open_port("nope://1")
+			raise TestFailedError("! unexpected success")
+		except CouldNotConnectError:
+			print("OK (expected failure)")
+
+	def _ttype_latency(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Low-Latency Settings:")
+		#
+		print("Round-trip time: ", end="")
+		miCtrl.get_output_values()
+		tmpRtt = miCtrl.get_io_stats()["lastRoundTripS"]
+		if tmpRtt is None or tmpRtt < 0.0:
+			raise TestFailedError("! unexpected value")
+		print("%.3fms" % (tmpRtt * 1000.0))
+		#
+		print("Emulated instrument: ", end="")
+		tmpMi = MansonInstrument()
+		tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, miCtrl.get_hw_model(), lowLatency=True)
+		if tmpMi.get_low_latency_settings() is not None:
+			raise TestFailedError("! settings have been applied")
+		tmpMi.close_port()
+		print("OK (not applied)")
+		#
+		if not sys.platform.startswith("linux"):
+			return
+		print("Pseudo terminal: ", end="")
+		masterFd, slaveFd = pty.openpty()
+		try:
+			serObj = pyser_Serial(os.ttyname(slaveFd))
+			settingsD = apply_low_latency(serObj, serObj.port)
+			restore_low_latency(serObj, serObj.port, settingsD)
+			serObj.close()
+		finally:
+			os.close(slaveFd)
+			os.close(masterFd)
+		# a pty has neither a serial_struct nor a latency_timer
+		if settingsD["latencyTimerMs"] is not None or settingsD["asyncLowLatency"]:
+			raise TestFailedError("! unexpected settings %s" % str(settingsD))
+		print("OK (%s)" % str(settingsD))
+
+	def _ttype_event_engine(self):
+		miCtrl = self._miCtrl
+		modelId = miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Event Engine:")
+		#
+		if not sys.platform.startswith("linux"):
+			print("(skipped, needs pseudo terminals)")
+			return
+		srvObj = PtyEmulatorServer([modelId] * 3)
+		srvObj.start()
+		engObj = EventEngine(paceS=0.0, timeoutS=0.3)
+		# a pseudo terminal without emulated instrument never responds
+		masterFd, slaveFd = pty.openpty()
+		try:
+			for ix, comPort in enumerate(srvObj.get_device_paths()):
+				engObj.add_port("dev%d" % ix, comPort, modelId)
+			engObj.add_port("mute", os.ttyname(slaveFd), modelId)
+			#
+			print("Output values of all ports: ", end="")
+			resArr = []
+			for portId in engObj.get_port_ids():
+				for _ in range(5):
+					engObj.submit_get_output_values(portId, lambda portId, valD, err: resArr.append((portId, valD, err)))
+			if not engObj.run_until_idle(5.0):
+				raise TestFailedError("! commands not finished")
+			tmpMi = MansonInstrument()
+			tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+			expD = tmpMi.get_output_values()
+			tmpMi.close_port()
+			for portId, valD, err in resArr:
+				if portId == "mute":
+					if not isinstance(err, ResponseTimeoutError):
+						raise TestFailedError("! expected timeout for port '%s'" % portId)
+				elif err is not None or valD != expD:
+					raise TestFailedError("! unexpected result for port '%s': %s (expected %s)" % (portId, str(valD or err), str(expD)))
+			print("OK (%s)" % str(expD))
+			#
+			print("Port statistics: ", end="")
+			statsD = engObj.get_port_stats("dev0")
+			if statsD["commands"] != 5 or statsD["timeouts"] != 0 or statsD["latencyMaxS"] is None:
+				raise TestFailedError("! unexpected stats %s" % str(statsD))
+			if engObj.get_port_stats("mute")["timeouts"] != 5:
+				raise TestFailedError("! unexpected stats %s" % str(engObj.get_port_stats("mute")))
+			print("OK (p50=%.3fms)" % (statsD["latencyP50S"] * 1000.0))
+			#
+			print("Connection lost: ", end="")
+			resArr = []
+			for _ in range(3):
+				engObj.submit_get_output_values("mute", lambda portId, valD, err: resArr.append(err))
+			engObj.run_once(0.05)  # the first command is waiting for the response now
+			# the hangup makes reading the port fail with EIO
+			os.close(masterFd)
+			masterFd = None
+			if not engObj.run_until_idle(1.0):
+				raise TestFailedError("! commands not finished")
+			engObj.submit_get_output_values("mute", lambda portId, valD, err: resArr.append(err))
+			engObj.submit_get_output_values("dev0", lambda portId, valD, err: resArr.append(err))
+			if not engObj.run_until_idle(1.0):
+				raise TestFailedError("! commands not finished")
+			if [type(x) for x in resArr] != [NotConnectedError] * 4 + [type(None)]:
+				raise TestFailedError("! unexpected results %s" % str(resArr))
+			print("OK")
+		finally:
+			engObj.close()
+			srvObj.stop()
+			os.close(slaveFd)
+			if masterFd is not None:
+				os.close(masterFd)
+
+	def _ttype_shards(self):
+		miCtrl = self._miCtrl
+		modelId = miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Sharded Fleet Poller:")
+		#
+		print("Shards: ", end="")
+		devices = {"psu%d" % ix: "emulated://" + modelId for ix in range(5)}
+		pollObj = ShardedFleetPoller(devices, workers=2, rateHz=50.0, outpStateEvery=1)
+		tmpShards = pollObj.get_shards()
+		if tmpShards != [["psu0", "psu2", "psu4"], ["psu1", "psu3"]]:
+			raise TestFailedError("! unexpected shards %s" % str(tmpShards))
+		print("OK (%s)" % str(tmpShards))
+		#
+		print("Samples in shared memory: ", end="")
+		tmpMi = MansonInstrument()
+		tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+		expD = tmpMi.get_output_values()
+		expOutp = tmpMi.get_output_state()
+		tmpMi.close_port()
+		pollObj.start()
+		try:
+			endTime = time.monotonic() + 5.0
+			while time.monotonic() < endTime:
+				rowsD = pollObj.get_table().read_all()
+				if all([rowD is not None and rowD["updates"] >= 3 for rowD in rowsD.values()]):
+					break
+				time.sleep(0.05)
+			for deviceId, rowD in rowsD.items():
+				if rowD is None or rowD["updates"] < 3:
+					raise TestFailedError("! not enough samples for '%s'" % deviceId)
+				if rowD["volt"] != expD["volt"] or rowD["curr"] != expD["curr"] or \
+						rowD["mode"] != expD["mode"] or rowD["outp"] != expOutp:
+					raise TestFailedError("! unexpected sample for '%s': %s" % (deviceId, str(rowD)))
+		finally:
+			pollObj.stop()
+		print("OK")
+		#
+		print("Worker statistics: ", end="")
+		statsD = pollObj.get_stats()
+		if sorted(statsD.keys()) != sorted(devices.keys()) or \
+				any([tmpD["samples"] < 3 or tmpD["errors"] != 0 for tmpD in statsD.values()]):
+			raise TestFailedError("! unexpected stats %s" % str(statsD))
+		if pollObj.is_running() or pollObj.get_table() is not None:
+			raise TestFailedError("! poller still running")
+		print("OK")
+		#
+		print("Invalid port: ", end="")
+		pollObj = ShardedFleetPoller({"psu0": "emulated://" + modelId, "bad": "nope://1"}, workers=2)
+		try:
+			pollObj.start()
+			raise TestFailedError("! unexpected success")
+		except CouldNotConnectError as err:
+			if pollObj.is_running() or "nope://1" not in str(err):
+				raise TestFailedError("! unexpected state (%s)" % str(err))
+		print("OK (expected failure)")
+
+	def _ttype_pipeline(self):
+		miCtrl = self._miCtrl
+		modelId = miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Emulator Pipelining:")
+		#
+		def _get_single_reply(cmdBy):
+			tmpEmu = EmulatedInstrumentSerial(modelId)
+			tmpEmu.write(cmdBy)
+			return tmpEmu.read_until(b"OK\r")
+
+		expGmod = _get_single_reply(b"GMOD\r")
+		expGetd = _get_single_reply(b"GETD\r")
+		expGout = _get_single_reply(b"GOUT\r")
+		#
+		print("Three queued commands: ", end="")
+		emuObj = EmulatedInstrumentSerial(modelId)
+		if emuObj.write(b"GMOD\rGETD\rGOUT\r") != 15:
+			raise TestFailedError("! unexpected amount of bytes written")
+		if emuObj.in_waiting != len(expGmod + expGetd + expGout):
+			raise TestFailedError("! unexpected in_waiting %d" % emuObj.in_waiting)
+		for expBy in (expGmod, expGetd, expGout):
+			tmpBy = emuObj.read_until(b"OK\r")
+			if tmpBy != expBy:
+				raise TestFailedError("! unexpected reply %s (expected %s)" % (str(tmpBy), str(expBy)))
+		print("OK")
+		#
+		print("Byte-wise reading: ", end="")
+		emuObj.write(b"GETD\r")
+		tmpBy = b""
+		while emuObj.in_waiting:
+			tmpBy += emuObj.read(1)
+		if tmpBy != expGetd or emuObj.read(10) != b"":
+			raise TestFailedError("! unexpected reply %s" % str(tmpBy))
+		print("OK")
+		#
+		print("Command split across writes: ", end="")
+		emuObj.write(b"GE")
+		if emuObj.in_waiting != 0:
+			raise TestFailedError("! reply to incomplete command")
+		emuObj.write(b"TD\rGO")
+		emuObj.write(b"UT\r")
+		tmpBy = emuObj.read(len(expGetd) + len(expGout))
+		if tmpBy != expGetd + expGout:
+			raise TestFailedError("! unexpected reply %s" % str(tmpBy))
+		print("OK")
+		#
+		print("Unknown command between others: ", end="")
+		try:
+			emuObj.write(b"GMOD\rXXXX\rGOUT\r")
+			raise TestFailedError("! unexpected success")
+		except UnknownCommandError:
+			pass
+		tmpBy = emuObj.read(100)
+		if tmpBy != expGmod + expGout:
+			raise TestFailedError("! unexpected reply %s" % str(tmpBy))
+		print("OK (expected failure)")
+
+	def _ttype_wire_timing(self):
+		miCtrl = self._miCtrl
+		modelId = miCtrl.get_hw_model()
+		timingModel = build_timing_model(modelId)
+		byteS = timingModel["byteS"]
+		turnaroundS = timingModel["turnaroundS"]
+		#
+		print("-" * 32)
+		print("Test Emulator Wire-Timing:")
+		#
+		def _check_time(clockObj, expS):
+			if abs(clockObj.time() - expS) > 1e-6:
+				raise TestFailedError("! unexpected time %.6fs (expected %.6fs)" % (clockObj.time(), expS))
+
+		print("Single command: ", end="")
+		clockObj = VirtualClock()
+		emuObj = EmulatedInstrumentSerial(modelId)
+		emuObj.set_timing_model(timingModel, clockObj)
+		emuObj.write(b"GMOD\r")
+		if emuObj.in_waiting != 0:
+			raise TestFailedError("! reply available immediately")
+		replyBy = emuObj.read_until(b"OK\r")
+		if not replyBy.endswith(b"OK\r"):
+			raise TestFailedError("! unexpected reply %s" % str(replyBy))
+		_check_time(clockObj, (5 + len(replyBy)) * byteS + turnaroundS)
+		print("OK (%.2fms)" % (clockObj.time() * 1000.0))
+		#
+		print("Two pipelined commands: ", end="")
+		startT = clockObj.time()
+		emuObj.write(b"GMOD\rGMOD\r")
+		if emuObj.read(2 * len(replyBy)) != replyBy * 2:
+			raise TestFailedError("! unexpected reply")
+		# the second command is processed after the first reply has been sent
+		_check_time(clockObj, startT + 5 * byteS + 2 * (turnaroundS + len(replyBy) * byteS))
+		print("OK")
+		#
+		print("Timeout: ", end="")
+		emuObj.timeout = turnaroundS / 2.0
+		startT = clockObj.time()
+		emuObj.write(b"GMOD\r")
+		if emuObj.read_until(b"OK\r") != b"":
+			raise TestFailedError("! unexpected reply")
+		_check_time(clockObj, startT + emuObj.timeout)
+		emuObj.timeout = None
+		if emuObj.read_until(b"OK\r") != replyBy:
+			raise TestFailedError("! late reply missing")
+		print("OK (late reply received afterwards)")
+		#
+		print("MansonInstrument with EEPROM write: ", end="")
+		tmpMi = MansonInstrument()
+		tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+		clockObj = VirtualClock()
+		tmpMi._pyserObj.set_timing_model(timingModel, clockObj)
+		try:
+			expD = miCtrl.get_output_values()
+			if tmpMi.get_output_values() != expD:
+				raise TestFailedError("! unexpected output values")
+			if self._hwSpecs["realMemPresetLocations"] == 0:
+				print("OK (no memory presets)")
+				return
+			startT = clockObj.time()
+			tmpMi.save_memory_preset(0, self._hwSpecs["minVolt"], self._hwSpecs["minCurr"])
+			if clockObj.time() - startT < EIS_EEPROM_WRITE_S:
+				raise TestFailedError("! EEPROM write time missing (%.3fs)" % (clockObj.time() - startT))
+		finally:
+			tmpMi.close_port()
+		print("OK (%.3fs)" % (clockObj.time() - startT))
+
+	def _ttype_load_simulation(self):
+		modelId = self._miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Emulator Load Simulation:")
+		#
+		tmpMi = MansonInstrument()
+		tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+		emuObj = tmpMi._pyserObj
+		clockObj = VirtualClock()
+		try:
+			if not tmpMi.get_output_state():
+				tmpMi.set_output_state(True)
+			# without load model the display values equal the setpoints
+			resD = tmpMi.get_output_values()
+			setVolt = resD["volt"]
+			setCurr = resD["curr"]
+			# the default over-voltage protection is above the preset
+			#
+			print("CV with settling: ", end="")
+			emuObj.set_load_model(ResistiveLoad(setVolt / (setCurr / 2.0)), clockObj, settlingTauS=0.1)
+			if tmpMi.get_output_voltage() > setVolt * 0.01:
+				raise TestFailedError("! output not settling")
+			clockObj.advance(0.1)
+			resD = tmpMi.get_output_values()
+			if not (setVolt * 0.5 < resD["volt"] < setVolt * 0.7):
+				raise TestFailedError("! unexpected voltage %.2fV after one time constant" % resD["volt"])
+			clockObj.advance(1.0)
+			resD = tmpMi.get_output_values()
+			if resD["mode"] != "CV" or abs(resD["volt"] - setVolt) > 0.05 or abs(resD["curr"] - setCurr / 2.0) > 0.05:
+				raise TestFailedError("! unexpected output values %s" % str(resD))
+			print("OK (%.2fV %.2fA)" % (resD["volt"], resD["curr"]))
+			#
+			print("CC: ", end="")
+			emuObj.set_load_model(ResistiveLoad(setVolt / (setCurr * 2.0)), clockObj, settlingTauS=0.0)
+			resD = tmpMi.get_output_values()
+			if resD["mode"] != "CC" or abs(resD["volt"] - setVolt / 2.0) > 0.05 or abs(resD["curr"] - setCurr) > 0.05:
+				raise TestFailedError("! unexpected output values %s" % str(resD))
+			print("OK (%.2fV %.2fA)" % (resD["volt"], resD["curr"]))
+			#
+			print("Profile: ", end="")
+			emuObj.set_load_model(ProfileLoad([(1.0, ConstantCurrentLoad(setCurr / 2.0)), (1.0, ConstantCurrentLoad(setCurr * 2.0))]),
+					clockObj, settlingTauS=0.0)
+			modes = []
+			clockObj.advance(0.5)  # sample in the middle of the steps
+			for _ in range(4):
+				modes.append(tmpMi.get_output_values()["mode"])
+				clockObj.advance(1.0)
+			if modes != ["CV", "CC", "CV", "CC"]:
+				raise TestFailedError("! unexpected modes %s" % str(modes))
+			print("OK")
+			#
+			print("Protection: ", end="")
+			# the load draws setCurr / 2
+			protCurr = tmpMi.round_value(max(setCurr / 4.0, self._hwSpecs["minCurr"]), isVolt=False)
+			emuObj.set_load_model(ResistiveLoad(setVolt / (setCurr / 2.0)), clockObj, settlingTauS=0.0)
+			try:
+				tmpMi.set_overcurrent_protection_value(protCurr)
+				resD = emuObj.get_simulated_output()
+			except FunctionNotSupportedForModelError:
+				resD = None
+			if resD is None:
+				print("(not supported)")
+			elif resD["tripped"]:
+				# over-current protection (SOCP)
+				if tmpMi.get_output_state():
+					raise TestFailedError("! output still enabled")
+				tmpMi.set_overcurrent_protection_value(tmpMi.round_value(setCurr, isVolt=False))
+				tmpMi.set_output_state(True)
+				if not tmpMi.get_output_state() or emuObj.get_simulated_output()["tripped"]:
+					raise TestFailedError("! output not re-enabled")
+				print("OK (tripped)")
+			else:
+				# upper current limit (SISH)
+				if resD["mode"] != "CC" or abs(resD["curr"] - protCurr) > 0.01:
+					raise TestFailedError("! unexpected simulated output %s" % str(resD))
+				print("OK (limited)")
+			#
+			print("Disabled: ", end="")
+			emuObj.set_load_model(None)
+			if tmpMi.get_output_values()["volt"] != setVolt:
+				raise TestFailedError("! display values don't equal the setpoints")
+			print("OK")
+		finally:
+			tmpMi.close_port()
+
+	def _ttype_fault_injection(self):
+		modelId = self._miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Emulator Fault-Injection:")
+		#
+		print("Schedule: ", end="")
+		faultRates = {x: 0.05 for x in EIS_FAULTS}
+		schedD = build_fault_schedule(1, 1000, faultRates)
+		if build_fault_schedule(1, 1000, faultRates) != schedD or build_fault_schedule(2, 1000, faultRates) == schedD:
+			raise TestFailedError("! schedule not reproducible")
+		for faultId in EIS_FAULTS:
+			tmpCnt = list(schedD.values()).count(faultId)
+			if not 20 <= tmpCnt <= 80:
+				raise TestFailedError("! unexpected amount of '%s' faults: %d" % (faultId, tmpCnt))
+		print("OK (%d faults)" % len(schedD))
+		#
+		def _run_schedule(schedD, seed):
+			clockObj = VirtualClock()
+			emuObj = EmulatedInstrumentSerial(modelId)
+			emuObj.set_fault_schedule(schedD, seed=seed, delayS=0.5, downtimeS=2.0, clockObj=clockObj)
+			emuObj.timeout = 0.1
+			resArr = []
+			for _ in range(10):
+				try:
+					emuObj.write(b"GMOD\r")
+					tmpBy = emuObj.read_until(b"OK\r")
+					resArr.append(tmpBy + emuObj.read(emuObj.in_waiting))
+				except NotConnectedError:
+					resArr.append(None)
+				clockObj.advance(1.0)
+			return (resArr, emuObj.get_fault_log())
+
+		print("Faults: ", end="")
+		schedD = {1: EIS_FAULT_DROP, 2: EIS_FAULT_TRUNCATE, 3: EIS_FAULT_CORRUPT, 4: EIS_FAULT_EXTRA_CR,
+				5: EIS_FAULT_DELAY, 7: EIS_FAULT_DISCONNECT}
+		resArr, logArr = _run_schedule(schedD, 1)
+		replyBy = resArr[0]
+		if resArr[1] != b"" or \
+				len(resArr[2]) >= len(replyBy) or not replyBy.startswith(resArr[2]) or \
+				len(resArr[3]) != len(replyBy) or resArr[3] == replyBy or \
+				resArr[4].replace(b"\r", b"", 1) != replyBy or \
+				resArr[5] != b"":
+			raise TestFailedError("! unexpected replies %s" % str(resArr))
+		# the delayed reply arrives before the next one, the device is gone for two commands
+		if resArr[6:] != [replyBy + replyBy, None, None, replyBy]:
+			raise TestFailedError("! unexpected replies %s" % str(resArr[6:]))
+		if [(x["reply"], x["fault"]) for x in logArr] != sorted(schedD.items()):
+			raise TestFailedError("! unexpected fault log %s" % str(logArr))
+		print("OK")
+		#
+		print("Reply order: ", end="")
+		clockObj = VirtualClock()
+		emuObj = EmulatedInstrumentSerial(modelId)
+		emuObj.set_fault_schedule({0: EIS_FAULT_DELAY}, delayS=0.5, clockObj=clockObj)
+		emuObj.write(b"GMOD\r")
+		emuObj.write(b"GVER\r")
+		if emuObj.in_waiting != 0:
+			raise TestFailedError("! reply overtook the delayed one")
+		clockObj.advance(1.0)
+		resBy = emuObj.read(emuObj.in_waiting)
+		if not resBy.startswith((modelId + "\rOK\r").encode("ascii")) or resBy.count(b"OK\r") != 2:
+			raise TestFailedError("! unexpected replies %s" % str(resBy))
+		print("OK")
+		#
+		print("Reproducible: ", end="")
+		schedD = build_fault_schedule(3, 10, {EIS_FAULT_TRUNCATE: 0.3, EIS_FAULT_CORRUPT: 0.3, EIS_FAULT_EXTRA_CR: 0.3})
+		if _run_schedule(schedD, 7) != _run_schedule(schedD, 7):
+			raise TestFailedError("! different results")
+		print("OK")
+		#
+		print("MansonInstrument recovers: ", end="")
+		tmpMi = MansonInstrument()
+		tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+		try:
+			tmpMi.set_clock(VirtualClock())
+			tmpMi.set_io_policy(timeoutS=0.02, getRetries=2, backoffS=0.0)
+			expD = tmpMi.get_output_values()
+			tmpMi._pyserObj.set_fault_schedule({0: EIS_FAULT_DROP, 2: EIS_FAULT_TRUNCATE, 4: EIS_FAULT_DELAY}, delayS=0.05)
+			for _ in range(3):
+				if tmpMi.get_output_values() != expD:
+					raise TestFailedError("! unexpected output values")
+			# the first retry's reply is queued behind the delayed one and times out as well
+			ioStatsD = tmpMi.get_io_stats()
+			if ioStatsD["timeouts"] != 4 or ioStatsD["retries"] != 4 or ioStatsD["failures"] != 0:
+				raise TestFailedError("! unexpected io stats %s" % str(ioStatsD))
+			# a garbled GET response is retried like a timeout
+			tmpMi._pyserObj.set_fault_schedule({0: EIS_FAULT_EXTRA_CR}, seed=1)
+			if tmpMi.get_output_values() != expD:
+				raise TestFailedError("! unexpected output values")
+			newStatsD = tmpMi.get_io_stats()
+			if newStatsD["retries"] != ioStatsD["retries"] + 1 or newStatsD["resyncs"] <= ioStatsD["resyncs"] or \
+					newStatsD["failures"] != 0:
+				raise TestFailedError("! unexpected io stats %s" % str(newStatsD))
+		finally:
+			tmpMi.close_port()
+		print("OK")
+
+	def _ttype_footprint(self):
+		modelId = self._miCtrl.get_hw_model()
+		instCount = 1000
+		#
+		print("-" * 32)
+		print("Test Emulator Footprint:")
+		#
+		print("Shared model data: ", end="")
+		emuObjA = EmulatedInstrumentSerial(modelId)
+		emuObjB = EmulatedInstrumentSerial(modelId)
+		if hasattr(emuObjA, "__dict__"):
+			raise TestFailedError("! instance has __dict__")
+		if emuObjA._modelSpecs is not emuObjB._modelSpecs or emuObjA._szrObj is not emuObjB._szrObj:
+			raise TestFailedError("! model data not shared")
+		print("OK")
+		#
+		print("Independent state: ", end="")
+		tmpMi = MansonInstrument()
+		tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+		tmpMiB = MansonInstrument()
+		tmpMiB.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+		try:
+			expD = tmpMiB.get_output_values()
+			tmpMi.set_output_state(False)
+			if tmpMiB.get_output_state() != True or tmpMiB.get_output_values() != expD:
+				raise TestFailedError("! state of other instance changed")
+			if self._hwSpecs["realMemPresetLocations"] != 0:
+				expD = tmpMiB.load_memory_preset(0)
+				tmpMi.save_memory_preset(0, self._hwSpecs["minVolt"], self._hwSpecs["minCurr"])
+				if tmpMiB.load_memory_preset(0) != expD:
+					raise TestFailedError("! memory presets of other instance changed")
+		finally:
+			tmpMi.close_port()
+			tmpMiB.close_port()
+		print("OK")
+		#
+		print("Memory: ", end="")
+		gc.collect()
+		tracemalloc.start()
+		try:
+			startMem = tracemalloc.get_traced_memory()[0]
+			emuArr = [EmulatedInstrumentSerial(modelId) for _ in range(instCount)]
+			gc.collect()
+			instMem = (tracemalloc.get_traced_memory()[0] - startMem) / float(instCount)
+		finally:
+			tracemalloc.stop()
+		for emuObj in emuArr:
+			emuObj.write(b"GMOD\r")
+			if not emuObj.read_until(b"OK\r").endswith(b"\rOK\r"):
+				raise TestFailedError("! unexpected reply")
+		if instMem > 1500.0:
+			raise TestFailedError("! %.0f bytes per instance" % instMem)
+		print("OK (%.0f bytes per instance)" % instMem)
+
+	def _ttype_capture(self):
+		modelId = self._miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Wire Capture/Replay:")
+		#
+		def _run_commands(miObj):
+			resArr = [miObj.get_output_values()]
+			miObj.set_output_state(False)
+			resArr.append(miObj.get_output_state())
+			# the first response is dropped (see the capture below)
+			resArr.append(miObj.get_output_values())
+			return resArr
+
+		with tempfile.TemporaryDirectory() as tmpDir:
+			filePath = os.path.join(tmpDir, "test.mwc")
+			#
+			print("Capture: ", end="")
+			tmpMi = MansonInstrument()
+			tmpMi.start_capture(filePath)
+			tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+			try:
+				tmpMi.set_io_policy(timeoutS=0.02, getRetries=1, backoffS=0.0)
+				# replies: 0 GETD, 1 SOUT, 2 GOUT, 3 GETD
+				tmpMi._pyserObj.set_fault_schedule({3: EIS_FAULT_DROP})
+				expArr = _run_commands(tmpMi)
+				frameCnt = tmpMi.stop_capture()
+			finally:
+				tmpMi.close_port()
+			captD = read_wire_capture(filePath)
+			frameTypes = [x[0] for x in captD["frames"]]
+			# GMOD + 4 commands + 1 retry
+			if frameCnt != 12 or len(frameTypes) != 12 or frameTypes != [WCAP_FRAME_CMD, WCAP_FRAME_RESP] * 6:
+				raise TestFailedError("! unexpected frames %s" % str(captD["frames"]))
+			if captD["frames"][-3][2] != b"" or captD["frames"][-4][2] != captD["frames"][-2][2]:
+				raise TestFailedError("! retry not recorded")
+			print("OK (%d frames, %d bytes)" % (frameCnt, os.path.getsize(filePath)))
+			#
+			print("Replay: ", end="")
+			tmpMi = MansonInstrument()
+			tmpMi.open_port("replay://%s?timescale=0" % filePath)
+			try:
+				tmpMi.set_io_policy(timeoutS=0.02, getRetries=1, backoffS=0.0)
+				if tmpMi.get_hw_model() != modelId or _run_commands(tmpMi) != expArr:
+					raise TestFailedError("! unexpected results")
+				if tmpMi.get_io_stats()["timeouts"] != 1 or tmpMi._pyserObj.get_remaining_frames() != 0:
+					raise TestFailedError("! unexpected io stats %s" % str(tmpMi.get_io_stats()))
+			finally:
+				tmpMi.close_port()
+			print("OK")
+			#
+			print("Different commands: ", end="")
+			tmpMi = MansonInstrument()
+			tmpMi.open_port("replay://%s?timescale=0" % filePath)
+			try:
+				tmpMi.get_output_state()
+				raise TestFailedError("! no error")
+			except InvalidResponseError:
+				print("OK")
+			finally:
+				tmpMi.close_port()
+			#
+			print("Capture after open_port(): ", end="")
+			tmpMi = MansonInstrument()
+			tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+			try:
+				tmpMi._pyserObj.set_timing_model(build_timing_model(modelId))
+				tmpMi.start_capture(filePath)
+				expD = tmpMi.get_output_values()
+				tmpMi.stop_capture()
+			finally:
+				tmpMi.close_port()
+			tmpMi = MansonInstrument()
+			tmpMi.open_port("replay://" + filePath)
+			try:
+				if tmpMi.get_hw_model() != modelId or tmpMi.get_output_values() != expD:
+					raise TestFailedError("! unexpected results")
+			finally:
+				tmpMi.close_port()
+			print("OK")
+			#
+			print("Timing: ", end="")
+			captD = read_wire_capture(filePath)
+			recordedS = captD["frames"][1][1] - captD["frames"][0][1]
+			for timeScale in (1.0, 0.5):
+				clockObj = VirtualClock()
+				replObj = ReplaySerial(filePath, timeScale=timeScale, clockObj=clockObj)
+				replObj.write(captD["frames"][0][2])
+				if replObj.read_until(b"OK\r") != captD["frames"][1][2]:
+					raise TestFailedError("! unexpected response")
+				if abs(clockObj.time() - recordedS * timeScale) > 1e-6:
+					raise TestFailedError("! unexpected round-trip %.6fs" % clockObj.time())
+			print("OK (%.2fms recorded)" % (recordedS * 1000.0))
+
+	def _ttype_virtual_clock(self):
+		modelId = self._miCtrl.get_hw_model()
+		#
+		print("-" * 32)
+		print("Test Virtual Clock:")
+		#
+		clockObj = VirtualClock()
+		tmpMi = MansonInstrument(clockObj=clockObj)
+		tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, modelId)
+		emuObj = tmpMi._pyserObj
+		try:
+			if emuObj.get_clock() is not clockObj:
+				raise TestFailedError("! clock not passed on to the emulator")
+			emuObj.set_timing_model(build_timing_model(modelId))
+			#
+			print("Poll for 2 hours at 1Hz: ", end="")
+			count = 7200
+			wallStartT = time.monotonic()
+			startT = clockObj.time()
+			lastS = None
+			for entryS in tmpMi.stream(1.0, count=count):
+				lastS = entryS
+			wallS = time.monotonic() - wallStartT
+			if lastS["seq"] != count - 1 or lastS["missed"] != 0 or lastS["lateS"] != 0.0:
+				raise TestFailedError("! unexpected last sample %s" % str(lastS))
+			if abs(lastS["time"] - startT - (count - 1)) > 1e-6 or abs(lastS["rateHz"] - 1.0) > 1e-9:
+				raise TestFailedError("! unexpected timing %s" % str(lastS))
+			# the wire-timing model delays the responses in virtual time
+			if not tmpMi.get_io_stats()["lastRoundTripS"] > 0.0:
+				raise TestFailedError("! no round-trip time")
+			print("OK (%.0fs in %.2fs)" % (clockObj.time() - startT, wallS))
+			#
+			print("Voltage ramp with load: ", end="")
+			resD = tmpMi.get_output_values()
+			setVolt = resD["volt"]
+			setCurr = resD["curr"]
+			try:
+				tmpMi.set_overvoltage_protection_value(tmpMi.round_value(setVolt + 1.0, isVolt=True))
+			except FunctionNotSupportedForModelError:
+				pass
+			if not tmpMi.get_output_state():
+				tmpMi.set_output_state(True)
+			settlingTauS = 2.0
+			emuObj.set_load_model(ResistiveLoad(setVolt / (setCurr / 2.0)), settlingTauS=settlingTauS)
+			steps = 10
+			stepV = (setVolt - self._hwSpecs["minVolt"]) / steps
+			startT = clockObj.time()
+			try:
+				for x in range(steps):
+					tmpV = tmpMi.round_value(self._hwSpecs["minVolt"] + stepV * (x + 1), isVolt=True)
+					tmpMi.set_preset_voltage(tmpV)
+					# too early
+					resD = tmpMi.get_output_values()
+					if x > 0 and abs(resD["volt"] - tmpV) < stepV * 0.5:
+						raise TestFailedError("! output settled immediately (%.3fV)" % resD["volt"])
+					tmpMi.get_clock().sleep(settlingTauS * 10.0)  # give the load some time to adjust
+					resD = tmpMi.get_output_values()
+					if resD["mode"] != "CV" or abs(resD["volt"] - tmpV) > 0.05:
+						raise TestFailedError("! unexpected output values %s at %.3fV" % (str(resD), tmpV))
+				elapsedS = clockObj.time() - startT
+				if elapsedS < steps * settlingTauS * 10.0:
+					raise TestFailedError("! unexpected duration %.3fs" % elapsedS)
+				print("OK (%.1fs)" % elapsedS)
+			except FunctionNotSupportedForModelError:
+				print("(not supported)")
+			emuObj.set_load_model(None)
+			#
+			print("Timeout and retry backoff: ", end="")
+			timeoutS = 2.0
+			backoffS = 30.0
+			tmpMi.set_io_policy(timeoutS=timeoutS, getRetries=1, backoffS=backoffS)
+			emuObj.set_fault_schedule({0: EIS_FAULT_DROP})
+			startT = clockObj.time()
+			tmpMi.get_output_values()
+			elapsedS = clockObj.time() - startT
+			if not (timeoutS + backoffS <= elapsedS < timeoutS + backoffS + 1.0):
+				raise TestFailedError("! unexpected duration %.3fs" % elapsedS)
+			if tmpMi.get_io_stats()["retries"] != 1:
+				raise TestFailedError("! unexpected io stats")
+			print("OK (%.3fs)" % elapsedS)
+		finally:
+			tmpMi.close_port()
+		#
+		print("Switch clocks: ", end="")
+		emuObj = EmulatedInstrumentSerial(modelId)
+		emuObj.set_timing_model(build_timing_model(modelId), VirtualClock(100.0))
+		emuObj.write(b"GMOD\r")
+		pendCnt = emuObj.get_pending_count()
+		clockObj = VirtualClock()
+		emuObj.set_clock(clockObj)
+		if emuObj.in_waiting != 0 or emuObj.get_pending_count() != pendCnt:
+			raise TestFailedError("! pending reply lost")
+		if not emuObj.read_until(b"OK\r").endswith(b"OK\r") or not 0.0 < clockObj.time() < 1.0:
+			raise TestFailedError("! unexpected reply timing")
+		print("OK")
+
 	def _ttype_volt(self):
 		miCtrl = self._miCtrl
 		hwSpecsMinVolt = self._hwSpecs["minVolt"]
@@ -294,8 +2017,7 @@ class TestMansonInstrument(object):
 			#
 			try:
 				self._test_set_volt(tmpV)
-				if not self._isEmulated:
-					time.sleep(4)  # give power supply and load some time to adjust
+				self._clockObj.sleep(4.0)  # give power supply and load some time to adjust
 			except FunctionNotSupportedForModelError:
 				print("(not supported)")
 				return
@@ -317,8 +2039,7 @@ class TestMansonInstrument(object):
 			return
 		self._test_set_volt_ignunsupported(5.0)
 		self._test_set_curr(hwSpecsMinCurr)
-		if not self._isEmulated:
-			time.sleep(5)  # give power supply and load some time to adjust
+		self._clockObj.sleep(5.0)  # give power supply and load some time to adjust
 		#
 		self._test_set_curr_expfail(hwSpecsMinCurr - 0.1)
 		self._test_set_curr_expfail(hwSpecsMaxCurr + 0.1)
@@ -329,8 +2050,7 @@ class TestMansonInstrument(object):
 			tmpC = miCtrl.round_value(tmpC, isVolt=False)
 			#
 			self._test_set_curr(tmpC)
-			if not self._isEmulated:
-				time.sleep(5)  # give power supply and load some time to adjust
+			self._clockObj.sleep(5.0)  # give power supply and load some time to adjust
 			#
 			res = self._test_get_curr()
 			if res < tmpC - 0.1 or res > tmpC + 0.1:
@@ -379,8 +2099,7 @@ class TestMansonInstrument(object):
 		#
 		for psIx in range(hwSpecsMpl):
 			self._test_apply_mempreset(psIx)
-			if not self._isEmulated:
-				time.sleep(5)  # give power supply and load some time to adjust
+			self._clockObj.sleep(5.0)  # give power supply and load some time to adjust
 			try:
 				print("Selected preset << ", end="")
 				selIx = miCtrl.get_selected_preset()
@@ -400,6 +2119,60 @@ class TestMansonInstrument(object):
 		self._test_set_curr_ignunsupported(hwSpecsMinCurr + 0.1)
 		self._test_set_volt_ignunsupported(5.0)
 
+	def _ttype_sequence(self):
+		miCtrl = self._miCtrl
+		#
+		print("-" * 32)
+		print("Test Power Sequencer:")
+		#
+		rails = {"A": miCtrl}
+		extraMiList = []
+		if self._isEmulated:
+			# two more emulated rails of the same model
+			for railName in ["B", "C"]:
+				tmpMi = MansonInstrument()
+				tmpMi.open_port(VIRTUAL_SERIAL_DEVICE, miCtrl.get_hw_model())
+				extraMiList.append(tmpMi)
+				rails[railName] = tmpMi
+		try:
+			steps = []
+			for railName in sorted(rails.keys()):
+				steps.append(build_sequence_step(railName, SEQ_ACTION_OUTPUT, False))
+			# rail A on, wait 20ms, then all other rails on
+			steps.append(build_sequence_step("A", SEQ_ACTION_OUTPUT, True, delayMs=(0.0 if self._isEmulated else 500.0)))
+			for railName in sorted(rails.keys()):
+				if railName == "A":
+					continue
+				steps.append(build_sequence_step(railName, SEQ_ACTION_OUTPUT, True,
+						delayMs=(20.0 if railName == "B" else 0.0)))
+			#
+			seqObj = PowerSequencer(rails)
+			print("Load sequence (%d steps): " % len(steps), end="")
+			seqObj.load_sequence(steps)
+			print("OK")
+			print("Run sequence: ", end="")
+			report = seqObj.run()
+			print("OK")
+			print(format_timing_report(report))
+			for entryR in report:
+				if entryR["status"] != SEQ_STATUS_OK:
+					raise TestFailedError("! step #%d failed" % entryR["index"])
+			# no step may be executed before its planned start time
+			for entryR in report:
+				if entryR["startMs"] < entryR["plannedMs"]:
+					raise TestFailedError("! step #%d was executed too early" % entryR["index"])
+			print("Timing summary: %s" % str(seqObj.get_timing_summary()))
+			#
+			for railName in sorted(rails.keys()):
+				print("Output state %s < : " % railName, end="")
+				tmpB = rails[railName].get_output_state()
+				print("on" if tmpB else "off")
+				if not tmpB:
+					raise TestFailedError("! unexpected state")
+		finally:
+			for tmpMi in extraMiList:
+				tmpMi.close_port()
+
 	# --------------------------------------------------------------------------
 
 	def _test_set_outp_state(self, state, doTest=True):
@@ -408,8 +2181,7 @@ class TestMansonInstrument(object):
 		print("Output state  >  " + ("on" if state else "off") + ": ", end="")
 		miCtrl.set_output_state(state)
 		print("OK")
-		if not self._isEmulated:
-			time.sleep(1)
+		self._clockObj.sleep(1.0)
 		#
 		if not doTest:
 			return
@@ -0,0 +1,175 @@
+#
+# by TS, Dec 2020
+#
+
+from urllib.parse import parse_qs
+
+from serial import Serial as pyser_Serial, serial_for_url as pyser_serial_for_url
+from serial.serialutil import SerialException as pyser_SerialException
+
+try:
+	from .emulated_instrument_serial import EmulatedInstrumentSerial
+	from .exceptions import CouldNotConnectError, InvalidModelError, UnsupportedModelError
+	from .pty_emulator import PtyEmulatorServer
+	from .wire_capture import ReplaySerial, WCAP_DEFAULT_TIME_SCALE
+except (ModuleNotFoundError, ImportError):
+	from emulated_instrument_serial import EmulatedInstrumentSerial
+	from exceptions import CouldNotConnectError, InvalidModelError, UnsupportedModelError
+	from pty_emulator import PtyEmulatorServer
+	from wire_capture import ReplaySerial, WCAP_DEFAULT_TIME_SCALE
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# Transports are selected by the URL passed to MansonInstrument.open_port():
+#
+#   /dev/ttyUSB0, COM3               local serial port
+#   socket://HOST:PORT               raw TCP (e.g. serial-to-ethernet converters)
+#   rfc2217://HOST:PORT              Telnet COM Port Control (RFC 2217)
+#   emulated://MODEL                 EmulatedInstrumentSerial (e.g. "emulated://HCS-3202")
+#   pty://MODEL                      EmulatedInstrumentSerial behind a pseudo terminal (POSIX only),
+#                                    accessed like a real serial port through pySerial
+#   replay://PATH[?timescale=X]      ReplaySerial, replays a wire capture (see wire_capture.py),
+#                                    X=1 for the original timing (default), X=0 for no delays
+#
+# A transport object needs to offer the pySerial methods/attributes that
+# MansonInstrument uses: write(), read_until(), in_waiting, flushInput(),
+# flushOutput(), close() and timeout. Emulated transports additionally
+# need update_model_id(). The optional attribute enableMemPresetsCache
+# overrides whether MansonInstrument caches the memory presets
+# (default: only for transports that aren't emulated).
+
+TRANSPORT_SCHEME_SERIAL = ""
+TRANSPORT_SCHEME_SOCKET = "socket"
+TRANSPORT_SCHEME_RFC2217 = "rfc2217"
+TRANSPORT_SCHEME_EMULATED = "emulated"
+TRANSPORT_SCHEME_PTY = "pty"
+TRANSPORT_SCHEME_REPLAY = "replay"
+
+_TRANSPORTS = {}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def register_transport(scheme, factoryFunc, isEmulated=False):
+	""" Register a transport for a URL scheme
+
+	Parameters:
+		scheme (str): e.g. "socket" for "socket://..."
+		factoryFunc (callable): Function with the signature
+				factoryFunc(url, baudrate, timeoutS) that returns the opened transport
+				and raises CouldNotConnectError or pySerial's SerialException
+		isEmulated (bool): True if the transport doesn't need the pauses of real hardware
+	"""
+	assert isinstance(scheme, str), "scheme needs to be string"
+	assert callable(factoryFunc), "factoryFunc needs to be callable"
+	assert isEmulated == True or isEmulated == False, "isEmulated needs to be bool"
+	#
+	_TRANSPORTS[scheme] = {"factory": factoryFunc, "isEmulated": isEmulated}
+
+def get_transport_schemes():
+	""" Get the URL schemes of all registered transports
+
+	Returns:
+		list
+	"""
+	return sorted(_TRANSPORTS.keys())
+
+def split_transport_url(url):
+	""" Split a transport URL into scheme and the rest
+
+	Parameters:
+		url (str): e.g. "socket://10.0.0.5:4001" or "/dev/ttyUSB0"
+	Returns:
+		tuple: (scheme, rest), scheme is TRANSPORT_SCHEME_SERIAL for plain device paths
+	"""
+	assert isinstance(url, str), "url needs to be string"
+	#
+	if "://" not in url:
+		return (TRANSPORT_SCHEME_SERIAL, url)
+	tmpArr = url.split("://", 1)
+	return (tmpArr[0].lower(), tmpArr[1])
+
+def open_transport(url, baudrate, timeoutS):
+	""" Open the transport for a URL
+
+	Parameters:
+		url (str)
+		baudrate (int)
+		timeoutS (float)
+	Returns:
+		tuple: (transport, isEmulated)
+	Raises:
+		CouldNotConnectError
+	"""
+	scheme = split_transport_url(url)[0]
+	if scheme not in _TRANSPORTS:
+		raise CouldNotConnectError("url='%s' (unknown transport)" % url)
+	entryT = _TRANSPORTS[scheme]
+	try:
+		resObj = entryT["factory"](url, baudrate, timeoutS)
+	except (pyser_SerialException, ValueError) as err:
+		raise CouldNotConnectError("url='%s', baud=%d (%s)" % (url, baudrate, str(err)))
+	return (resObj, entryT["isEmulated"])
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def _open_serial(url, baudrate, timeoutS):
+	return pyser_Serial(url, baudrate=baudrate, bytesize=8, parity="N", stopbits=1, timeout=timeoutS)
+
+def _open_serial_for_url(url, baudrate, timeoutS):
+	return pyser_serial_for_url(url, baudrate=baudrate, bytesize=8, parity="N", stopbits=1, timeout=timeoutS)
+
+def _open_emulated(url, baudrate, timeoutS):
+	modelId = split_transport_url(url)[1]
+	if not modelId:
+		raise CouldNotConnectError("url='%s' (missing model)" % url)
+	return EmulatedInstrumentSerial(modelId)
+
+class _PtyEmulatorSerial(pyser_Serial):
+	""" Serial port of a PtyEmulatorServer that stops the server when being closed """
+	ptyServer = None
+
+	def close(self):
+		super().close()
+		if self.ptyServer is not None:
+			self.ptyServer.stop()
+			self.ptyServer = None
+
+def _open_pty_emulator(url, baudrate, timeoutS):
+	modelId = split_transport_url(url)[1]
+	if not modelId:
+		raise CouldNotConnectError("url='%s' (missing model)" % url)
+	try:
+		srvObj = PtyEmulatorServer([modelId])
+	except (InvalidModelError, UnsupportedModelError) as err:
+		raise CouldNotConnectError("url='%s' (%s)" % (url, str(err)))
+	srvObj.start()
+	try:
+		resObj = _PtyEmulatorSerial(srvObj.get_device_paths()[0], baudrate=baudrate, bytesize=8, parity="N", stopbits=1, timeout=timeoutS)
+	except (pyser_SerialException, ValueError):
+		srvObj.stop()
+		raise
+	resObj.ptyServer = srvObj
+	return resObj
+
+def _open_replay(url, baudrate, timeoutS):
+	filePath, _, queryStr = split_transport_url(url)[1].partition("?")
+	if not filePath:
+		raise CouldNotConnectError("url='%s' (missing path)" % url)
+	timeScale = float(parse_qs(queryStr).get("timescale", [WCAP_DEFAULT_TIME_SCALE])[0])
+	if timeScale < 0.0:
+		raise ValueError("timescale needs to be >= 0")
+	try:
+		resObj = ReplaySerial(filePath, timeScale=timeScale)
+	except OSError as err:
+		raise CouldNotConnectError("url='%s' (%s)" % (url, str(err)))
+	resObj.timeout = timeoutS
+	return resObj
+
+register_transport(TRANSPORT_SCHEME_SERIAL, _open_serial)
+register_transport(TRANSPORT_SCHEME_SOCKET, _open_serial_for_url)
+register_transport(TRANSPORT_SCHEME_RFC2217, _open_serial_for_url)
+register_transport(TRANSPORT_SCHEME_EMULATED, _open_emulated, isEmulated=True)
+register_transport(TRANSPORT_SCHEME_PTY, _open_pty_emulator)
+register_transport(TRANSPORT_SCHEME_REPLAY, _open_replay, isEmulated=True)
@@ -0,0 +1,292 @@
+#
+# by TS, Dec 2020
+#
+
+import struct
+
+try:
+	from .clock import MonotonicClock
+	from .exceptions import InvalidResponseError, NotConnectedError
+except (ModuleNotFoundError, ImportError):
+	from clock import MonotonicClock
+	from exceptions import InvalidResponseError, NotConnectedError
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# File format of wire captures (all values little-endian):
+#
+#   file header:  magic "MWCP", u16 version, u8 flags, u8 length of model ID, model ID (ASCII)
+#   frame:        u8 frame type, u32 microseconds since the previous frame, u16 length, data
+#
+# Commands are recorded when they are written, responses when they have been
+# read (complete or not, see MansonInstrument.start_capture()).
+
+WCAP_FILE_MAGIC = b"MWCP"
+WCAP_FILE_VERSION = 1
+
+WCAP_FLAG_MEMPRESETS_CACHE = 0x01  # MansonInstrument has cached the memory presets
+
+WCAP_FRAME_CMD = 0
+WCAP_FRAME_RESP = 1
+
+WCAP_DEFAULT_TIME_SCALE = 1.0
+
+_WCAP_FILE_HEADER = struct.Struct("<4sHBB")
+_WCAP_FRAME_HEADER = struct.Struct("<BIH")
+
+_WCAP_MAX_DELTA_US = 0xffffffff
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+def read_wire_capture(filePath):
+	""" Read a wire capture
+
+	A truncated frame at the end of the file (e.g. after a crash) is ignored.
+
+	Parameters:
+		filePath (str)
+	Returns:
+		dict: {"version": int, "model": str|None, "flags": int,
+				"frames": [(frameType, timeS, bytes), ...]} with timeS relative to the start of the capture
+	Raises:
+		ValueError
+	"""
+	with open(filePath, "rb") as fileObj:
+		tmpBy = fileObj.read(_WCAP_FILE_HEADER.size)
+		if len(tmpBy) < _WCAP_FILE_HEADER.size:
+			raise ValueError("invalid wire capture file header")
+		magic, version, flags, modelLen = _WCAP_FILE_HEADER.unpack(tmpBy)
+		if magic != WCAP_FILE_MAGIC or version != WCAP_FILE_VERSION:
+			raise ValueError("invalid wire capture file header")
+		modelId = fileObj.read(modelLen).decode("ascii", "replace")
+		#
+		frames = []
+		timeUs = 0
+		while True:
+			tmpBy = fileObj.read(_WCAP_FRAME_HEADER.size)
+			if len(tmpBy) < _WCAP_FRAME_HEADER.size:
+				break
+			frameType, deltaUs, dataLen = _WCAP_FRAME_HEADER.unpack(tmpBy)
+			dataBy = fileObj.read(dataLen)
+			if len(dataBy) < dataLen:
+				break
+			if frameType != WCAP_FRAME_CMD and frameType != WCAP_FRAME_RESP:
+				raise ValueError("invalid frame in wire capture file '%s'" % filePath)
+			timeUs += deltaUs
+			frames.append((frameType, timeUs / 1e6, dataBy))
+	return {"version": version, "model": (modelId if modelId else None), "flags": flags, "frames": frames}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class WireCaptureWriter(object):
+	def __init__(self, filePath, modelId=None, flags=0, clockObj=None):
+		""" Constructor
+
+		Creates (or overwrites) a wire capture file.
+
+		Parameters:
+			filePath (str)
+			modelId (str|None): Model of the instrument (None if unknown yet)
+			flags (int): WCAP_FLAG_*
+			clockObj (MonotonicClock|VirtualClock|None): None for MonotonicClock
+		"""
+		assert isinstance(filePath, str), "filePath needs to be string"
+		assert modelId is None or isinstance(modelId, str), "modelId needs to be None or string"
+		assert isinstance(flags, int) and 0 <= flags <= 0xff, "flags needs to be int 0..255"
+		#
+		modelBy = (modelId.encode("ascii") if modelId is not None else b"")
+		self._clockObj = (clockObj if clockObj is not None else MonotonicClock())
+		self._fileObj = open(filePath, "wb")
+		self._fileObj.write(_WCAP_FILE_HEADER.pack(WCAP_FILE_MAGIC, WCAP_FILE_VERSION, flags, len(modelBy)) + modelBy)
+		self._lastUs = int(self._clockObj.time() * 1e6)
+		self._frameCount = 0
+
+	def write_frame(self, frameType, dataBy):
+		""" Append a frame with the current time
+
+		Parameters:
+			frameType (int): WCAP_FRAME_CMD or WCAP_FRAME_RESP
+			dataBy (bytes)
+		"""
+		assert frameType == WCAP_FRAME_CMD or frameType == WCAP_FRAME_RESP, "invalid frameType"
+		#
+		if self._fileObj is None:
+			raise ValueError("writer has been closed")
+		nowUs = int(self._clockObj.time() * 1e6)
+		deltaUs = min(max(0, nowUs - self._lastUs), _WCAP_MAX_DELTA_US)
+		self._lastUs = nowUs
+		self._fileObj.write(_WCAP_FRAME_HEADER.pack(frameType, deltaUs, len(dataBy)) + bytes(dataBy))
+		self._frameCount += 1
+
+	def get_frame_count(self):
+		""" Get the amount of frames that have been written
+
+		Returns:
+			int
+		"""
+		return self._frameCount
+
+	def close(self):
+		if self._fileObj is None:
+			return
+		self._fileObj.close()
+		self._fileObj = None
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+
+class ReplaySerial(object):
+	def __init__(self, filePath, timeScale=WCAP_DEFAULT_TIME_SCALE, clockObj=None):
+		""" Constructor
+
+		Transport that answers the commands of a wire capture with the
+		recorded responses (see transports.py, "replay://PATH").
+		The commands need to be sent in the recorded order. The responses
+		arrive after the recorded round-trip time multiplied by timeScale.
+		If the capture has been started after the port had been opened,
+		the model query of open_port() is answered from the file header.
+
+		Parameters:
+			filePath (str)
+			timeScale (float): 1.0 for the original timing, 0.0 for no delays
+			clockObj (MonotonicClock|VirtualClock|None): None for MonotonicClock
+		Raises:
+			ValueError
+		"""
+		assert isinstance(timeScale, (int, float)) and timeScale >= 0.0, "timeScale needs to be >= 0"
+		#
+		captD = read_wire_capture(filePath)
+		self.timeout = None
+		self.enableMemPresetsCache = ((captD["flags"] & WCAP_FLAG_MEMPRESETS_CACHE) != 0)
+		self._modelId = captD["model"]
+		self._frames = captD["frames"]
+		self._frameIx = 0
+		self._timeScale = float(timeScale)
+		self._clockObj = (clockObj if clockObj is not None else MonotonicClock())
+		self._isopen = True
+		self._bufferOut = bytearray()
+		self._pendingOut = []  # [bytes, time at which the bytes arrive]
+
+	# --------------------------------------------------------------------------
+
+	def get_remaining_frames(self):
+		""" Get the amount of frames that haven't been replayed yet
+
+		Returns:
+			int
+		"""
+		return len(self._frames) - self._frameIx
+
+	def set_clock(self, clockObj):
+		""" Set the clock for the recorded delays (responses that are still
+		delayed arrive relative to the new clock's current time)
+
+		Parameters:
+			clockObj (MonotonicClock|VirtualClock)
+		"""
+		assert clockObj is not None, "clockObj may not be None"
+		#
+		shiftS = clockObj.time() - self._clockObj.time()
+		for entryT in self._pendingOut:
+			entryT[1] += shiftS
+		self._clockObj = clockObj
+
+	def update_model_id(self, modelId):
+		pass  # the responses come from the file
+
+	@property
+	def in_waiting(self):
+		self._release_output()
+		return len(self._bufferOut)
+
+	def flushInput(self):
+		# responses that are still delayed arrive later
+		self._release_output()
+		self._bufferOut.clear()
+
+	def flushOutput(self):
+		pass
+
+	def close(self):
+		self._isopen = False
+
+	def write(self, data):
+		""" Replay the responses to a command
+
+		After the end of the capture commands aren't answered anymore.
+
+		Returns:
+			int: Amount of bytes written
+		Raises:
+			InvalidResponseError, NotConnectedError
+		"""
+		if not self._isopen:
+			raise NotConnectedError()
+		data = bytes(data)
+		nowT = self._clockObj.time()
+		if self._frameIx >= len(self._frames):
+			return len(data)
+		frameType, cmdT, dataBy = self._frames[self._frameIx]
+		if frameType != WCAP_FRAME_CMD or dataBy != data:
+			if data.startswith(b"GMOD") and self._modelId is not None:
+				self._bufferOut += self._modelId.encode("ascii") + b"\rOK\r"
+				return len(data)
+			raise InvalidResponseError("replay expected %s, got %s (frame %d)" % (str(dataBy), str(data), self._frameIx))
+		self._frameIx += 1
+		while self._frameIx < len(self._frames) and self._frames[self._frameIx][0] == WCAP_FRAME_RESP:
+			_, respT, dataBy = self._frames[self._frameIx]
+			self._pendingOut.append([dataBy, nowT + (respT - cmdT) * self._timeScale])
+			self._frameIx += 1
+		return len(data)
+
+	def read(self, size=1):
+		""" Read up to size bytes of the responses
+
+		Returns:
+			bytes
+		Raises:
+			NotConnectedError
+		"""
+		if not self._isopen:
+			raise NotConnectedError()
+		self._wait_for_output(lambda: len(self._bufferOut) >= size)
+		resBy = bytes(self._bufferOut[:size])
+		del self._bufferOut[:size]
+		return resBy
+
+	def read_until(self, expected=b"\n", size=None):
+		if not self._isopen:
+			raise NotConnectedError()
+		self._wait_for_output(lambda: self._bufferOut.find(expected) >= 0 or \
+				(size is not None and len(self._bufferOut) >= size))
+		tmpIx = self._bufferOut.find(expected)
+		endIx = (len(self._bufferOut) if tmpIx < 0 else tmpIx + len(expected))
+		if size is not None:
+			endIx = min(endIx, size)
+		resBy = bytes(self._bufferOut[:endIx])
+		del self._bufferOut[:endIx]
+		return resBy
+
+	# --------------------------------------------------------------------------
+	# --------------------------------------------------------------------------
+
+	def _release_output(self):
+		nowT = self._clockObj.time()
+		while self._pendingOut and self._pendingOut[0][1] <= nowT:
+			self._bufferOut += self._pendingOut.pop(0)[0]
+
+	def _wait_for_output(self, isDoneFnc):
+		""" Wait until isDoneFnc() returns True, the timeout has passed
+		or all responses of the last command have arrived """
+		endT = (self._clockObj.time() + self.timeout if self.timeout is not None else None)
+		while True:
+			self._release_output()
+			if isDoneFnc() or not self._pendingOut:
+				return
+			nowT = self._clockObj.time()
+			if endT is not None and nowT >= endT:
+				return
+			nextT = self._pendingOut[0][1]
+			self._clockObj.sleep((min(nextT, endT) if endT is not None else nextT) - nowT)